@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of overlapping log downloads with parsing in the asyncio server.
+
+Processes a dataset of copies of a test log using
+`platypus.io.async_db.process`, on an in-memory `mongomock` stand-in whose
+GridFS reads take a simulated network latency for each chunk.  The latency
+is simulated either by blocking the event loop, which serializes the
+downloads as in the blocking server, or by awaiting it, which lets several
+logs be streamed at once while the chunks that have arrived are parsed.
+
+Usage: python benchmarks/async_processing.py [--logs N] [--latency MS]
+"""
+import argparse
+import asyncio
+import gridfs
+import mongomock
+import mongomock.gridfs
+import os
+import platypus.io.async_db
+import time
+
+TEST_LOG_FILENAME = os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'platypus', 'io',
+    'platypus_20160519_013623.txt')
+
+
+class Cursor(object):
+    """ Returns in-memory documents as an asynchronous cursor. """
+    def __init__(self, documents):
+        self.documents = list(documents)
+
+    async def to_list(self, length):
+        return self.documents
+
+
+class Collection(object):
+    """ Wraps an in-memory collection with the coroutines of motor. """
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        return Cursor(self.collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class Database(object):
+    """ Wraps an in-memory database with the collections of motor. """
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, name):
+        return Collection(self.db[name])
+
+
+class GridOut(object):
+    """ Wraps a GridFS file, adding a latency to reading it. """
+    def __init__(self, grid_out, latency, blocking):
+        self.grid_out = grid_out
+        self._id = grid_out._id
+        self.length = grid_out.length
+        self.latency = latency
+        self.blocking = blocking
+
+    async def read(self, size=-1):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return self.grid_out.read(size)
+
+
+class Bucket(object):
+    """ Wraps an in-memory GridFS store with the bucket of motor. """
+    def __init__(self, db, latency, blocking):
+        self.fs = gridfs.GridFS(db, 'cfs_gridfs.logs_gridfs')
+        self.latency = latency
+        self.blocking = blocking
+
+    def find(self, spec):
+        return Cursor(GridOut(grid_out, self.latency, self.blocking)
+                      for grid_out in self.fs.find(spec))
+
+
+def make_dataset(db, count):
+    """ Stores a dataset of copies of the test log in a database. """
+    fs = gridfs.GridFS(db, 'cfs_gridfs.logs_gridfs')
+    with open(TEST_LOG_FILENAME, 'rb') as log_file:
+        content = log_file.read()
+    log_ids = []
+    for i in range(count):
+        key = fs.put(content)
+        log_ids.append(db['cfs.logs.filerecord'].insert_one({
+            'copies': {'logs_gridfs': {'key': str(key)}},
+            'original': {'name': os.path.basename(TEST_LOG_FILENAME)},
+        }).inserted_id)
+    return db['datasets'].insert_one({'logs': log_ids}).inserted_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logs', type=int, default=20,
+                        help='number of logs in the dataset')
+    parser.add_argument('--latency', type=float, default=50.0,
+                        help='simulated milliseconds to download each chunk')
+    args = parser.parse_args()
+
+    mongomock.gridfs.enable_gridfs_integration()
+    db = mongomock.MongoClient().meteor
+    dataset_id = make_dataset(db, args.logs)
+
+    for name, blocking in (('blocking reads', True), ('async reads', False)):
+        fs = Bucket(db, args.latency / 1000, blocking)
+        start = time.time()
+        asyncio.run(platypus.io.async_db.process(
+            Database(db), fs, dataset_id, force=True))
+        print("{:d} logs: {:s} {:.2f}s".format(
+            args.logs, name, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of UTM to Lat/Long conversion of pose dataframes.
+
+Compares the original per-row `DataFrame.apply` conversion against the batched
+conversion in `platypus.util.conversions.add_ll_to_pose_dataframe`, on a
+synthetic pose dataframe spanning two UTM zones.
+
+Usage: python benchmarks/conversions.py [--rows N]
+"""
+import argparse
+import numpy
+import pandas
+import platypus.util.conversions
+import time
+import utm
+
+
+def make_poses(rows):
+    """ Creates a synthetic pose dataframe with the specified size. """
+    rng = numpy.random.RandomState(0)
+    return pandas.DataFrame({
+        'easting': rng.uniform(300000, 700000, rows),
+        'northing': rng.uniform(4400000, 4500000, rows),
+        'altitude': numpy.zeros(rows),
+        'zone': rng.choice([17, 18], rows),
+        'hemi': numpy.ones(rows, dtype=bool),
+    }, columns=('easting', 'northing', 'altitude', 'zone', 'hemi'))
+
+
+def add_ll_per_row(df):
+    """ Reference implementation that converts one row at a time. """
+    def utm_to_ll(utm_row):
+        return utm.to_latlon(utm_row['easting'], utm_row['northing'],
+                             int(utm_row['zone']),
+                             northern=bool(utm_row['hemi']))
+
+    df['latitude'], df['longitude'] = zip(*df.apply(utm_to_ll, axis=1))
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='number of synthetic poses to convert')
+    args = parser.parse_args()
+    poses = make_poses(args.rows)
+
+    start = time.time()
+    expected = add_ll_per_row(poses.copy())
+    per_row = time.time() - start
+
+    start = time.time()
+    actual = platypus.util.conversions.add_ll_to_pose_dataframe(poses.copy())
+    batched = time.time() - start
+
+    assert numpy.allclose(expected[['latitude', 'longitude']].values,
+                          actual[['latitude', 'longitude']].values)
+    print("{:d} poses: per-row {:.3f}s, batched {:.3f}s ({:.1f}x)"
+          .format(args.rows, per_row, batched, per_row / batched))
+
+
+if __name__ == '__main__':
+    main()
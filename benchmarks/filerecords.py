@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of opening the logs of a dataset from MongoDB.
+
+Compares looking up the filerecord and GridFS file of each log one at a time
+against `platypus.io.db._fetch_logs`, which looks them up in one query each.
+A dataset of small logs is stored in an in-memory `mongomock` stand-in,
+which adds a simulated network latency to each request, and the number of
+requests is reported alongside the time taken.
+
+Usage: python benchmarks/filerecords.py [--logs N] [--latency MS]
+"""
+import argparse
+import bson
+import collections
+import gridfs
+import mongomock
+import mongomock.gridfs
+import platypus.io.connection
+import platypus.io.db
+import time
+
+
+class LatencyWrapper(object):
+    """ Wraps an object to count and add a fixed latency to each call. """
+    def __init__(self, wrapped, latency, counts):
+        self.wrapped = wrapped
+        self.latency = latency
+        self.counts = counts
+
+    def __getattr__(self, name):
+        method = getattr(self.wrapped, name)
+
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            self.counts[name] += 1
+            return method(*args, **kwargs)
+        return call
+
+
+class LatencyConnectionManager(platypus.io.connection.ConnectionManager):
+    """ Adds a fixed latency to each query of an in-memory database. """
+    def __init__(self, db, latency):
+        super(LatencyConnectionManager, self).__init__(
+            database=db.name, client_factory=lambda **kwargs: db.client)
+        self.latency = latency
+        self.counts = collections.Counter()
+
+    def __getitem__(self, name):
+        return LatencyWrapper(
+            super(LatencyConnectionManager, self).__getitem__(name),
+            self.latency, self.counts)
+
+    def gridfs(self, collection='fs'):
+        return LatencyWrapper(
+            super(LatencyConnectionManager, self).gridfs(collection),
+            self.latency, self.counts)
+
+
+def make_dataset(db, count):
+    """ Stores a dataset of small logs in a database. """
+    fs = gridfs.GridFS(db, 'cfs_gridfs.logs_gridfs')
+    log_ids = []
+    for i in range(count):
+        key = fs.put(b'log content')
+        log_ids.append(db['cfs.logs.filerecord'].insert_one({
+            'copies': {'logs_gridfs': {'key': str(key)}},
+            'original': {'name': 'log_{:d}.txt'.format(i)},
+        }).inserted_id)
+    return {'_id': bson.ObjectId(), 'logs': log_ids}
+
+
+def fetch_logs_serial(db, dataset):
+    """ Opens each log using one filerecord and one GridFS query per log. """
+    fs = db.gridfs('cfs_gridfs.logs_gridfs')
+    for log_id in dataset['logs']:
+        log_record = db['cfs.logs.filerecord'].find_one(log_id)
+        log_file = fs.find_one(
+            bson.ObjectId(log_record['copies']['logs_gridfs']['key']))
+        yield log_file, log_record['original']['name']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logs', type=int, default=200,
+                        help='number of logs in the dataset')
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help='simulated milliseconds per request to mongomock')
+    args = parser.parse_args()
+
+    mongomock.gridfs.enable_gridfs_integration()
+    db = mongomock.MongoClient().meteor
+    dataset = make_dataset(db, args.logs)
+
+    for name, fetch in (('one at a time', fetch_logs_serial),
+                        ('batched', platypus.io.db._fetch_logs)):
+        manager = LatencyConnectionManager(db, args.latency / 1000)
+        start = time.time()
+        count = sum(1 for _ in fetch(manager, dataset))
+        elapsed = time.time() - start
+        print("{:d} logs: {:s} {:.3f}s, {:d} requests".format(
+            count, name, elapsed, sum(manager.counts.values())))
+
+
+if __name__ == '__main__':
+    main()
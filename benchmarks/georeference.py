@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of locating sensor readings using the poses of a log.
+
+Compares looking up the poses around each sensor reading one at a time
+against `platypus.util.conversions.add_pose_to_sensor_dataframe`, which
+locates every reading with a single sorted search, on synthetic pose and
+sensor dataframes with independent time indices.  The per-reading lookup is
+only timed on a subset of the readings and extrapolated.
+
+Usage: python benchmarks/georeference.py [--rows N] [--lookup-rows N]
+"""
+import argparse
+import numpy
+import pandas
+import platypus.util.conversions
+import time
+
+
+def make_data(rows):
+    """ Creates synthetic pose and sensor dataframes of a given size. """
+    rng = numpy.random.RandomState(0)
+    start = pandas.Timestamp('2016-05-19')
+    pose_time = start + pandas.to_timedelta(
+        numpy.cumsum(rng.uniform(0.0, 2.0, rows)), unit='s')
+    sensor_time = start + pandas.to_timedelta(
+        numpy.cumsum(rng.uniform(0.0, 2.0, rows)), unit='s')
+
+    pose = pandas.DataFrame({
+        'easting': 592300 + numpy.cumsum(rng.normal(0, 1, rows)),
+        'northing': 4481760 + numpy.cumsum(rng.normal(0, 1, rows)),
+        'zone': numpy.full(rows, 17),
+        'latitude': 40.4 + numpy.cumsum(rng.normal(0, 1e-5, rows)),
+        'longitude': -79.9 + numpy.cumsum(rng.normal(0, 1e-5, rows)),
+    }, index=pose_time)
+    sensor = pandas.DataFrame({'ec': rng.uniform(0, 100, rows)},
+                              index=sensor_time)
+    return pose, sensor
+
+
+def add_pose_lookup(df, pose, max_gap):
+    """ Locates sensor readings by looking up the poses of each reading. """
+    max_gap = pandas.Timedelta(seconds=max_gap)
+    positions = []
+    for time in df.index:
+        before = pose[:time]
+        after = pose[time:]
+        if (len(before) == 0 or len(after) == 0 or
+                time - before.index[-1] > max_gap or
+                after.index[0] - time > max_gap):
+            positions.append((numpy.nan, numpy.nan))
+            continue
+        span = (after.index[0] - before.index[-1]).total_seconds()
+        weight = ((time - before.index[-1]).total_seconds() / span
+                  if span > 0 else 0.0)
+        positions.append(tuple(
+            before[column].iloc[-1] + weight *
+            (after[column].iloc[0] - before[column].iloc[-1])
+            for column in ('easting', 'northing')))
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='number of synthetic poses and readings')
+    parser.add_argument('--lookup-rows', type=int, default=1000,
+                        help='number of readings to locate one at a time')
+    args = parser.parse_args()
+    pose, sensor = make_data(args.rows)
+
+    start = time.time()
+    expected = add_pose_lookup(sensor[:args.lookup_rows], pose,
+                               platypus.util.conversions.SENSOR_MAX_GAP)
+    lookup = (time.time() - start) * args.rows / args.lookup_rows
+
+    start = time.time()
+    platypus.util.conversions.add_pose_to_sensor_dataframe(sensor, pose)
+    vectorized = time.time() - start
+
+    print("{:d} readings: lookup ~{:.1f}s (extrapolated), "
+          "vectorized {:.3f}s, {:s}".format(
+              args.rows, lookup, vectorized,
+              'identical' if numpy.allclose(
+                  sensor[['easting', 'northing']].values[:args.lookup_rows],
+                  expected, equal_nan=True) else 'different'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of the peak memory used to parse logs stored in GridFS.
+
+Compares reading a whole log from GridFS and splitting it into lines before
+parsing it against streaming the log a chunk at a time using
+`platypus.io.db._iter_lines`.  A synthetic log is created by repeating a
+test log, and is stored in an in-memory GridFS stand-in from `mongomock`.
+Each mode is run in a fresh child process, which reports the growth of its
+peak resident set size (Linux only).
+
+Usage: python benchmarks/gridfs_streaming.py [--size MB]
+"""
+import argparse
+import gridfs
+import mongomock
+import mongomock.gridfs
+import multiprocessing
+import os
+import platypus.io.db
+import platypus.io.logs
+import time
+
+TEST_LOG_FILENAME = os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'platypus', 'io',
+    'platypus_20160519_013623.txt')
+
+
+def _memory_status(field):
+    """ Reads a memory statistic of this process in megabytes. """
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024.0
+
+
+def _reset_peak_memory():
+    """ Resets the peak resident set size of this process, if possible. """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except (IOError, OSError):
+        pass
+
+
+def _parse(fs, file_id, streaming, queue):
+    """ Parses a log from GridFS, then reports memory use and timing. """
+    _reset_peak_memory()
+    start_rss = _memory_status('VmRSS')
+    start = time.time()
+
+    log_file = fs.get(file_id)
+    if streaming:
+        data = platypus.io.logs.read(platypus.io.db._iter_lines(log_file))
+    else:
+        data = platypus.io.logs.read(
+            log_file.read().decode('utf-8').splitlines())
+
+    queue.put((time.time() - start,
+               _memory_status('VmHWM') - start_rss,
+               len(data['pose'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=1024,
+                        help='approximate size of the synthetic log in MB')
+    args = parser.parse_args()
+
+    # Store a synthetic log in an in-memory GridFS.
+    mongomock.gridfs.enable_gridfs_integration()
+    fs = gridfs.GridFS(mongomock.MongoClient().meteor,
+                       'cfs_gridfs.logs_gridfs')
+    with open(TEST_LOG_FILENAME, 'rb') as log_file:
+        content = log_file.read()
+    grid_in = fs.new_file()
+    for _ in range(args.size * 2 ** 20 // len(content) + 1):
+        grid_in.write(content)
+    grid_in.close()
+    del content
+
+    for streaming in (False, True):
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_parse, args=(fs, grid_in._id, streaming, queue))
+        process.start()
+        elapsed, peak, poses = queue.get()
+        process.join()
+        print("{:d} MB log: {:s} {:.1f}s, peak memory +{:.0f} MB "
+              "({:d} poses)".format(
+                  args.size, 'streaming' if streaming else 'read',
+                  elapsed, peak, poses))
+
+
+if __name__ == '__main__':
+    main()
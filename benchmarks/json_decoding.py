@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of JSON decoding when reading v4.2.0 logs.
+
+Compares decoding every log message with the standard library `json` module
+against `platypus.io.logs.read_v4_2_0`, which skips unused messages by their
+prefix and decodes the remainder with the fastest available JSON decoder, on
+the bundled v4.2.0 test log repeated to a larger size.
+
+Usage: python benchmarks/json_decoding.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import platypus.io.logs
+import time
+
+TEST_LOG_V4_2_0_FILENAME = os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'platypus', 'io',
+    'platypus_20160519_013623.txt')
+
+
+def make_log(repeat):
+    """ Creates a v4.2.0 log by repeating the bundled test log. """
+    with open(TEST_LOG_V4_2_0_FILENAME) as log_file:
+        lines = log_file.readlines()
+    return lines * repeat
+
+
+def decode_all(lines):
+    """ Reference implementation that decodes every log message. """
+    for line in lines:
+        time_offset_ms, level, message = line.split('\t', 2)
+        entry = json.loads(message)
+        for record in platypus.io.logs._records_json(
+                entry, int(time_offset_ms)):
+            pass
+
+
+def decode_filtered(lines):
+    """ Decodes only the log messages that would be used. """
+    for record in platypus.io.logs._records_v4_2_0(lines):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=500,
+                        help='number of times to repeat the test log')
+    args = parser.parse_args()
+    lines = make_log(args.repeat)
+
+    start = time.time()
+    decode_all(lines)
+    decode_all_time = time.time() - start
+
+    start = time.time()
+    decode_filtered(lines)
+    decode_filtered_time = time.time() - start
+
+    print("{:d} lines ({:s}): all {:.3f}s, filtered {:.3f}s ({:.1f}x)"
+          .format(len(lines), platypus.io.logs._json_loads.__module__,
+                  decode_all_time, decode_filtered_time,
+                  decode_all_time / decode_filtered_time))
+
+
+if __name__ == '__main__':
+    main()
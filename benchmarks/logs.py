@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of accumulating parsed log records into pandas DataFrames.
+
+Compares building DataFrames from lists of per-record Python lists against the
+typed columnar record buffers used by `platypus.io.logs`, on the bundled
+v4.2.0 test log repeated to a larger size.  Reports the time and the peak
+memory allocated (via `tracemalloc`) by each accumulation strategy.
+
+Usage: python benchmarks/logs.py [--repeat N]
+"""
+import argparse
+import collections
+import datetime
+import os
+import pandas
+import platypus.io.logs
+import time
+import tracemalloc
+
+TEST_LOG_V4_2_0_FILENAME = os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'platypus', 'io',
+    'platypus_20160519_013623.txt')
+
+
+def make_log(repeat):
+    """ Creates a v4.2.0 log by repeating the bundled test log. """
+    with open(TEST_LOG_V4_2_0_FILENAME) as log_file:
+        lines = log_file.readlines()
+    return lines * repeat
+
+
+def accumulate_lists(records):
+    """ Reference implementation that accumulates lists of records. """
+    raw_data = collections.defaultdict(list)
+    for k, timestamp, values in records:
+        raw_data[k].append(
+            [datetime.datetime.utcfromtimestamp(timestamp / 1000.)] + values)
+
+    return {k: pandas.DataFrame(v).rename(columns={0: 'time'})
+                                  .set_index('time')
+            for k, v in raw_data.items()}
+
+
+def accumulate_buffers(records):
+    """ Accumulates records into typed columnar record buffers. """
+    buffers = {}
+    for k, timestamp, values in records:
+        if k not in buffers:
+            buffers[k] = platypus.io.logs._new_buffer(k)
+        buffers[k].append(timestamp, values)
+
+    return {k: v.to_dataframe() for k, v in buffers.items()}
+
+
+def measure(accumulate, records):
+    """ Measures the time and peak memory used by an accumulator. """
+    tracemalloc.start()
+    start = time.time()
+    accumulate(records)
+    duration = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=200,
+                        help='number of times to repeat the test log')
+    args = parser.parse_args()
+
+    # Parse the records up front so only accumulation is measured.
+    records = list(platypus.io.logs._records_v4_2_0(make_log(args.repeat)))
+    print("{:d} records:".format(len(records)))
+
+    for name, accumulate in (('lists', accumulate_lists),
+                             ('buffers', accumulate_buffers)):
+        duration, peak = measure(accumulate, records)
+        print("  {:8s} {:.3f}s, peak {:.1f} MB"
+              .format(name, duration, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
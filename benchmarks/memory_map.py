@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of loading large logs using a memory-mapped scan.
+
+Compares the throughput of `platypus.io.logs.load` when iterating over the
+lines of a logfile against scanning a memory-mapped logfile for relevant
+records, on the bundled v4.0.0 and v4.2.0 test logs repeated to a larger size.
+The speedup depends on the fraction of lines that contain relevant records.
+
+Usage: python benchmarks/memory_map.py [--repeat N]
+"""
+import argparse
+import os
+import platypus.io.logs
+import shutil
+import tempfile
+import time
+
+TEST_LOG_DIRECTORY = os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'platypus', 'io')
+
+TEST_LOG_FILENAMES = ('airboat_20130807_063622.txt',
+                      'platypus_20160519_013623.txt')
+
+
+def make_log(filename, test_log_filename, repeat):
+    """ Creates a logfile by repeating one of the bundled test logs. """
+    with open(os.path.join(TEST_LOG_DIRECTORY, test_log_filename)) as f:
+        content = f.read()
+    with open(filename, 'w') as log_file:
+        for _ in range(repeat):
+            log_file.write(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=500,
+                        help='number of times to repeat the test log')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        for test_log_filename in TEST_LOG_FILENAMES:
+            filename = os.path.join(directory, test_log_filename)
+            make_log(filename, test_log_filename, args.repeat)
+            size_mb = os.path.getsize(filename) / 1e6
+            print("{:s} ({:.1f} MB):".format(test_log_filename, size_mb))
+
+            for name, memory_map in (('lines', False), ('memory_map', True)):
+                start = time.time()
+                platypus.io.logs.load(filename, cache=False,
+                                      memory_map=memory_map)
+                duration = time.time() - start
+                print("  {:12s} {:.3f}s ({:.1f} MB/s)"
+                      .format(name, duration, size_mb / duration))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of merging the data from many logs into a single dataset.
+
+Compares repeatedly concatenating each log onto the accumulated data against
+`platypus.io.logs.merge`, which concatenates each type once, sorts it by time
+and removes records duplicated between overlapping logs.  The logs are
+synthetic, with consecutive logs overlapping in time.
+
+Usage: python benchmarks/merge.py [--logs N] [--rows N]
+"""
+import argparse
+import numpy
+import pandas
+import platypus.io.logs
+import time
+
+
+def make_logs(num_logs, rows):
+    """ Creates synthetic logs where consecutive logs overlap by 10%. """
+    rng = numpy.random.RandomState(0)
+    times = pandas.date_range('2016-05-19', periods=num_logs * rows,
+                              freq='100ms', name='time')
+    values = rng.uniform(size=(len(times), 3))
+
+    logs = []
+    for i in range(num_logs):
+        start = max(0, i * rows - rows // 10)
+        end = (i + 1) * rows
+        logs.append({
+            'pose': pandas.DataFrame(values[start:end],
+                                     index=times[start:end],
+                                     columns=('easting', 'northing',
+                                              'altitude')),
+            'BATTERY': pandas.DataFrame(values[start:end:10],
+                                        index=times[start:end:10],
+                                        columns=('voltage', 'm0_current',
+                                                 'm1_current')),
+        })
+    return logs
+
+
+def merge_pairwise(logs):
+    """ Reference implementation that concatenates one log at a time. """
+    data = {}
+    for log in logs:
+        for k, v in log.items():
+            if k in data:
+                data[k] = pandas.concat([data[k], v]).sort_index()
+            else:
+                data[k] = v
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logs', type=int, default=200,
+                        help='number of synthetic logs to merge')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='number of poses in each synthetic log')
+    args = parser.parse_args()
+    logs = make_logs(args.logs, args.rows)
+
+    start = time.time()
+    merge_pairwise(logs)
+    pairwise = time.time() - start
+
+    start = time.time()
+    merged = platypus.io.logs.merge(logs)
+    once = time.time() - start
+
+    assert len(merged['pose']) == args.logs * args.rows
+    print("{:d} logs: pairwise {:.3f}s, merge {:.3f}s ({:.1f}x)"
+          .format(args.logs, pairwise, once, pairwise / once))
+
+
+if __name__ == '__main__':
+    main()
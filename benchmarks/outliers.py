@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of removing outlier poses from large pose dataframes.
+
+Compares removing outliers using the global median of all poses against the
+streaming `platypus.util.conversions.PoseOutlierFilter`, which approximates
+the median incrementally over chunks, on a synthetic pose dataframe where
+the first poses of each chunk are GPS initialization errors.
+
+Usage: python benchmarks/outliers.py [--rows N] [--chunk-rows N]
+"""
+import argparse
+import numpy
+import pandas
+import platypus.util.conversions
+import time
+
+
+def make_poses(rows, chunk_rows):
+    """ Creates a synthetic pose dataframe with the specified size. """
+    rng = numpy.random.RandomState(0)
+    easting = rng.normal(592300, 100, rows)
+    northing = rng.normal(4481760, 100, rows)
+
+    # Add a burst of GPS initialization errors at the start of each chunk.
+    for start in range(0, rows, chunk_rows):
+        easting[start:start + 10] = 476608.34
+        northing[start:start + 10] = 4671214.4
+
+    return pandas.DataFrame({'easting': easting, 'northing': northing},
+                            columns=('easting', 'northing'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10000000,
+                        help='number of synthetic poses to filter')
+    parser.add_argument('--chunk-rows', type=int, default=100000,
+                        help='number of poses in each streamed chunk')
+    args = parser.parse_args()
+    poses = make_poses(args.rows, args.chunk_rows)
+
+    start = time.time()
+    expected = platypus.util.conversions \
+        .remove_outliers_from_pose_dataframe(poses)
+    global_median = time.time() - start
+
+    start = time.time()
+    outlier_filter = platypus.util.conversions.PoseOutlierFilter()
+    actual = pandas.concat([outlier_filter(poses[i:i + args.chunk_rows])
+                            for i in range(0, args.rows, args.chunk_rows)])
+    streaming = time.time() - start
+
+    print("{:d} poses: global {:.3f}s, streaming {:.3f}s, "
+          "{:d} poses differ".format(
+              args.rows, global_median, streaming,
+              len(expected.index.symmetric_difference(actual.index))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of parsing a single large log with several worker processes.
+
+Compares `platypus.io.logs.load` with a single process against splitting the
+logfile into byte ranges that are parsed by increasing numbers of workers, on
+the bundled v4.2.0 test log repeated to a larger size.
+
+Usage: python benchmarks/parallel.py [--repeat N] [--workers N [N ...]]
+"""
+import argparse
+import os
+import platypus.io.logs
+import shutil
+import tempfile
+import time
+
+TEST_LOG_V4_2_0_FILENAME = os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'platypus', 'io',
+    'platypus_20160519_013623.txt')
+
+
+def make_log(filename, repeat):
+    """ Creates a v4.2.0 logfile by repeating the bundled test log. """
+    with open(TEST_LOG_V4_2_0_FILENAME) as log_file:
+        content = log_file.read()
+    with open(filename, 'w') as log_file:
+        for _ in range(repeat):
+            log_file.write(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=500,
+                        help='number of times to repeat the test log')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8],
+                        help='numbers of worker processes to compare')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'platypus.txt')
+        make_log(filename, args.repeat)
+        size_mb = os.path.getsize(filename) / 1e6
+
+        start = time.time()
+        platypus.io.logs.load(filename, cache=False)
+        serial = time.time() - start
+        print("{:.1f} MB, 1 worker: {:.3f}s".format(size_mb, serial))
+
+        for workers in args.workers:
+            start = time.time()
+            platypus.io.logs.load(filename, cache=False, workers=workers)
+            duration = time.time() - start
+            print("{:.1f} MB, {:d} workers: {:.3f}s ({:.1f}x)"
+                  .format(size_mb, workers, duration, serial / duration))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
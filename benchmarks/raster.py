@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of interpolating sensor readings into raster maps.
+
+Times `platypus.util.raster.interpolate_raster` with each interpolation
+method on synthetic georeferenced readings of a smooth field, and reports
+the largest error against the field at the center of each grid cell.
+
+Usage: python benchmarks/raster.py [--rows N] [--size N] [--workers N]
+"""
+import argparse
+import numpy
+import pandas
+import platypus.util.raster
+import time
+
+
+def make_readings(rows):
+    """ Creates synthetic georeferenced readings of the specified size. """
+    rng = numpy.random.RandomState(0)
+    easting = rng.uniform(0, 1000, rows)
+    northing = rng.uniform(0, 1000, rows)
+    return pandas.DataFrame({
+        'easting': easting,
+        'northing': northing,
+        'ec': numpy.sin(easting / 100) + numpy.cos(northing / 100),
+    }, columns=('easting', 'northing', 'ec'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='number of synthetic readings')
+    parser.add_argument('--size', type=int, default=1000,
+                        help='number of rows and columns of the raster')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes')
+    args = parser.parse_args()
+    readings = make_readings(args.rows)
+
+    for method in platypus.util.raster.RASTER_METHODS:
+        start = time.time()
+        raster, bounds = platypus.util.raster.interpolate_raster(
+            readings, 'ec', (args.size, args.size), method=method,
+            workers=args.workers)
+        elapsed = time.time() - start
+
+        x = bounds[0] + (numpy.arange(args.size) + 0.5) * \
+            (bounds[2] - bounds[0]) / args.size
+        y = bounds[1] + (numpy.arange(args.size) + 0.5) * \
+            (bounds[3] - bounds[1]) / args.size
+        x, y = numpy.meshgrid(x, y)
+        error = numpy.nanmax(numpy.abs(
+            raster - numpy.sin(x / 100) - numpy.cos(y / 100)))
+        print("{:d} readings, {:d}x{:d} raster: {:s} {:.3f}s, "
+              "max error {:.4f}".format(args.rows, args.size, args.size,
+                                        method, elapsed, error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of computing the bounding region of large pose dataframes.
+
+Compares computing the convex hull of every position with
+`scipy.spatial.ConvexHull` against `platypus.util.conversions.
+region_from_points`, which discards interior points and snaps the rest
+outward to the corners of a grid first, on a synthetic track where the boat
+idles at a few locations.  The area by which the region exceeds the exact
+hull is also reported.
+
+Usage: python benchmarks/region.py [--rows N]
+"""
+import argparse
+import numpy
+import pandas
+import platypus.util.conversions
+import scipy.spatial
+import time
+
+
+def make_poses(rows):
+    """ Creates a synthetic pose dataframe with the specified size. """
+    rng = numpy.random.RandomState(0)
+    steps = rng.normal(0, 1e-6, (rows, 2))
+
+    # Make the boat idle in place for most of the track.
+    steps[rng.uniform(size=rows) < 0.9] = 0.0
+    positions = numpy.cumsum(steps, axis=0) + [-79.9, 40.4]
+    return pandas.DataFrame(positions, columns=('longitude', 'latitude'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10000000,
+                        help='number of synthetic poses to bound')
+    args = parser.parse_args()
+    poses = make_poses(args.rows)
+
+    start = time.time()
+    hull = scipy.spatial.ConvexHull(poses[['longitude', 'latitude']].values)
+    direct = time.time() - start
+
+    start = time.time()
+    region = platypus.util.conversions.region_from_points(poses)
+    thinned = time.time() - start
+
+    print("{:d} poses: direct {:.3f}s ({:d} vertices), "
+          "thinned {:.3f}s ({:d} vertices), area increase {:.2%}".format(
+              args.rows, direct, len(hull.vertices), thinned,
+              len(region['coordinates'][0]) - 1,
+              scipy.spatial.ConvexHull(
+                  region['coordinates'][0]).volume / hull.volume - 1))
+
+
+if __name__ == '__main__':
+    main()
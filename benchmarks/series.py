@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of storing the time series of a dataset in MongoDB.
+
+Compares inserting time-bucketed documents one at a time against
+`platypus.io.db.store_series`, which inserts them in unordered batches, on
+a synthetic pose time series.  By default the documents are stored in an
+in-memory `mongomock` stand-in, which adds a simulated network latency to
+each request; pass `--host` to measure round-trips to a real MongoDB server.
+
+Usage: python benchmarks/series.py [--rows N] [--latency MS] [--host URI]
+"""
+import argparse
+import bson
+import numpy
+import pandas
+import platypus.io.db
+import pymongo
+import time
+
+
+def make_data(rows):
+    """ Creates synthetic dataset time series of the specified size. """
+    rng = numpy.random.RandomState(0)
+    return {
+        'pose': pandas.DataFrame({
+            'easting': 592300 + numpy.cumsum(rng.normal(0, 1, rows)),
+            'northing': 4481760 + numpy.cumsum(rng.normal(0, 1, rows)),
+            'altitude': numpy.zeros(rows),
+        }, index=pandas.date_range('2016-05-19', periods=rows, freq='100ms')),
+    }
+
+
+class LatencyDatabase(object):
+    """ Wraps a database to add a fixed latency to each collection call. """
+    def __init__(self, db, latency):
+        self.db = db
+        self.latency = latency
+
+    def __getitem__(self, name):
+        return LatencyCollection(self.db[name], self.latency)
+
+
+class LatencyCollection(object):
+    """ Wraps a collection to add a fixed latency to each call. """
+    def __init__(self, collection, latency):
+        self.collection = collection
+        self.latency = latency
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            return method(*args, **kwargs)
+        return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='number of synthetic samples to store')
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help='simulated milliseconds per request to mongomock')
+    parser.add_argument('--host', type=str, default=None,
+                        help='a mongodb:// URI of a database to use')
+    args = parser.parse_args()
+    data = make_data(args.rows)
+    dataset_id = bson.ObjectId()
+
+    if args.host:
+        client = pymongo.MongoClient(args.host)
+        db = client.platypus_benchmark
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+        db = LatencyDatabase(client.platypus_benchmark, args.latency / 1000)
+    series = db[platypus.io.db.SERIES_COLLECTION]
+
+    try:
+        start = time.time()
+        documents = list(platypus.io.db._series_documents(
+            dataset_id, 'pose', data['pose']))
+        print("{:d} samples: {:d} documents built in {:.2f}s".format(
+            args.rows, len(documents), time.time() - start))
+
+        series.delete_many({})
+        start = time.time()
+        count = 0
+        for document in platypus.io.db._series_documents(
+                dataset_id, 'pose', data['pose']):
+            series.insert_one(document)
+            count += 1
+        elapsed = time.time() - start
+        print("{:d} samples: one at a time {:.2f}s, {:.0f} documents/s"
+              .format(args.rows, elapsed, count / elapsed))
+
+        for batch_size in (100, platypus.io.db.SERIES_BATCH_SIZE, 2000):
+            series.delete_many({})
+            start = time.time()
+            count = platypus.io.db.store_series(db, dataset_id, data,
+                                                batch_size=batch_size)
+            elapsed = time.time() - start
+            print("{:d} samples: batches of {:d} {:.2f}s, "
+                  "{:.0f} documents/s".format(
+                      args.rows, batch_size, elapsed, count / elapsed))
+    finally:
+        client.drop_database('platypus_benchmark')
+
+
+if __name__ == '__main__':
+    main()
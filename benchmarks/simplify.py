@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of simplifying long dataset paths.
+
+Compares a recursive Douglas-Peucker simplification that processes one
+segment at a time against `platypus.util.trajectory.simplify_path_levels`,
+which processes every segment at each depth of the recursion together, on a
+synthetic random-walk path.
+
+Usage: python benchmarks/simplify.py [--rows N] [--tolerance M]
+"""
+import argparse
+import numpy
+import pandas
+import platypus.util.trajectory
+import time
+
+
+def make_poses(rows):
+    """ Creates a synthetic pose dataframe with the specified size. """
+    rng = numpy.random.RandomState(0)
+    return pandas.DataFrame({
+        'latitude': 40.4 + numpy.cumsum(rng.normal(0, 1e-5, rows)),
+        'longitude': -79.9 + numpy.cumsum(rng.normal(0, 1e-5, rows)),
+    }, columns=('latitude', 'longitude'))
+
+
+def simplify_path_segments(df, tolerance):
+    """ Simplifies a path by splitting one segment at a time. """
+    latitude = numpy.radians(df['latitude'].values)
+    longitude = numpy.radians(df['longitude'].values)
+    x = (platypus.util.trajectory.EARTH_RADIUS *
+         numpy.cos(numpy.mean(latitude)) * longitude)
+    y = platypus.util.trajectory.EARTH_RADIUS * latitude
+
+    keep = numpy.zeros(len(df), dtype=bool)
+    keep[[0, -1]] = True
+    segments = [(0, len(df) - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        t = numpy.clip((px * dx + py * dy) /
+                       max(dx * dx + dy * dy, numpy.finfo(float).tiny),
+                       0.0, 1.0)
+        distance = numpy.hypot(px - t * dx, py - t * dy)
+        split = start + 1 + numpy.argmax(distance)
+        if distance[split - start - 1] > tolerance:
+            keep[split] = True
+            segments += [(start, split), (split, end)]
+    return df[keep]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='number of synthetic poses in the path')
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help='finest tolerance of the simplified path')
+    args = parser.parse_args()
+    poses = make_poses(args.rows)
+    tolerances = [args.tolerance * 10 ** i for i in range(3)]
+
+    start = time.time()
+    expected = simplify_path_segments(poses, args.tolerance)
+    segments = time.time() - start
+
+    start = time.time()
+    levels = platypus.util.trajectory.simplify_path_levels(poses, tolerances)
+    vectorized = time.time() - start
+
+    print("{:d} poses: segments {:.3f}s, vectorized {:.3f}s "
+          "(levels {:s} vertices), {:s}".format(
+              args.rows, segments, vectorized,
+              '/'.join(str(len(level)) for level in levels),
+              'identical' if levels[0].index.equals(expected.index)
+              else 'different'))
+
+
+if __name__ == '__main__':
+    main()
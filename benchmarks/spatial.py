@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of region queries over large pose dataframes.
+
+Compares finding the poses within many small bounding boxes by filtering
+the whole pose dataframe for each box against querying a
+`platypus.util.spatial.PoseIndex`, on synthetic poses spread over a 20km
+square.
+
+Usage: python benchmarks/spatial.py [--rows N] [--queries N]
+"""
+import argparse
+import numpy
+import pandas
+import platypus.util.spatial
+import time
+
+
+def make_poses(rows):
+    """ Creates a synthetic pose dataframe with the specified size. """
+    rng = numpy.random.RandomState(0)
+    return pandas.DataFrame({
+        'easting': rng.uniform(580000, 600000, rows),
+        'northing': rng.uniform(4470000, 4490000, rows),
+        'zone': numpy.full(rows, 17),
+        'hemi': numpy.full(rows, True),
+    }, columns=('easting', 'northing', 'zone', 'hemi'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10000000,
+                        help='number of synthetic poses to index')
+    parser.add_argument('--queries', type=int, default=100,
+                        help='number of 200m bounding boxes to query')
+    args = parser.parse_args()
+    poses = make_poses(args.rows)
+    rng = numpy.random.RandomState(1)
+    boxes = [(e, n, e + 200, n + 200) for e, n in zip(
+        rng.uniform(580000, 599800, args.queries),
+        rng.uniform(4470000, 4489800, args.queries))]
+
+    start = time.time()
+    easting = poses['easting'].values
+    northing = poses['northing'].values
+    expected = [numpy.flatnonzero(
+        (easting >= min_e) & (easting <= max_e) &
+        (northing >= min_n) & (northing <= max_n))
+        for min_e, min_n, max_e, max_n in boxes]
+    scan = time.time() - start
+
+    start = time.time()
+    index = platypus.util.spatial.PoseIndex(poses)
+    build = time.time() - start
+
+    start = time.time()
+    actual = [index.query_bbox(*box) for box in boxes]
+    query = time.time() - start
+
+    print("{:d} poses, {:d} queries: scan {:.3f}s, index {:.3f}s "
+          "(build {:.3f}s), {:s}".format(
+              args.rows, args.queries, scan, query, build,
+              'identical' if all(numpy.array_equal(a, b)
+                                 for a, b in zip(expected, actual))
+              else 'different'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of computing trajectory metrics for large pose dataframes.
+
+Compares computing per-segment distances and total path length by iterating
+over the rows of a pose dataframe against the vectorized
+`platypus.util.trajectory` module, on a synthetic random-walk trajectory.
+
+Usage: python benchmarks/trajectory.py [--rows N]
+"""
+import argparse
+import math
+import numpy
+import pandas
+import platypus.util.trajectory
+import time
+
+
+def make_poses(rows):
+    """ Creates a synthetic pose dataframe with the specified size. """
+    rng = numpy.random.RandomState(0)
+    return pandas.DataFrame({
+        'easting': 592300 + numpy.cumsum(rng.normal(0, 1, rows)),
+        'northing': 4481760 + numpy.cumsum(rng.normal(0, 1, rows)),
+        'zone': numpy.full(rows, 18),
+        'hemi': numpy.full(rows, True),
+    }, columns=('easting', 'northing', 'zone', 'hemi'),
+        index=pandas.date_range('2016-05-19', periods=rows, freq='s'))
+
+
+def path_length_rows(df):
+    """ Computes the path length of a pose dataframe row by row. """
+    length = 0.0
+    previous = None
+    for _, row in df.iterrows():
+        if previous is not None:
+            length += math.hypot(row['easting'] - previous['easting'],
+                                 row['northing'] - previous['northing'])
+        previous = row
+    return length
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='number of synthetic poses to measure')
+    args = parser.parse_args()
+    poses = make_poses(args.rows)
+
+    start = time.time()
+    expected = path_length_rows(poses)
+    rows = time.time() - start
+
+    start = time.time()
+    actual = platypus.util.trajectory.path_length(poses)
+    vectorized = time.time() - start
+
+    start = time.time()
+    platypus.util.trajectory.add_trajectory_to_pose_dataframe(poses)
+    metrics = time.time() - start
+
+    print("{:d} poses: rows {:.3f}s, vectorized {:.3f}s "
+          "(all metrics {:.3f}s), difference {:.3g}m".format(
+              args.rows, rows, vectorized, metrics, abs(expected - actual)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of parsing v4.0.0 logs for each type of log record.
+
+Compares matching every log record against each of the v4.0.0 regular
+expressions in turn against the token-based dispatch in
+`platypus.io.logs.read_v4_0_0`, on synthetic v4.0.0 logs consisting of a
+single type of record.
+
+Usage: python benchmarks/v4_0_0.py [--lines N]
+"""
+import argparse
+import platypus.io.logs
+import time
+
+FILENAME = 'airboat_20130807_063622.txt'
+
+RECORDS = {
+    'POSE': 'POSE: {476608.34, 4671214.4, 172.35, Q[0.0,0.0,0.0]} @ 17North',
+    'ES2': 'ES2: [e, 9.0, 10.0]',
+    'SENSOR': 'SENSOR1: {"data":"7.78","type":"atlas_do"}',
+    'VEL': 'VEL: Twist[0.0, 0.0, 0.0, 0.0, 0.0, 0.0]',
+    'CMD': 'CMD: {"m1":{"v":0},"m0":{"v":0}}',
+}
+
+
+def make_log(record, lines):
+    """ Creates a synthetic v4.0.0 log containing one type of record. """
+    return ['{:d} 18:36:22,335 {:s}\n'.format(i, record)
+            for i in range(lines)]
+
+
+def read_cascade(logfile):
+    """ Reference implementation that tries each regex on every record. """
+    logs = platypus.io.logs
+    buffers = {}
+
+    def append(record_type, timestamp, values):
+        if record_type not in buffers:
+            buffers[record_type] = logs._new_buffer(record_type)
+        buffers[record_type].append(timestamp, values)
+
+    for line in logfile:
+        m = logs._REGEX_LOGRECORD_V4_0_0.match(line)
+        if not m:
+            continue
+        timestamp = int(m.group('timestamp'))
+        message = m.group('message')
+
+        m_pose = logs._REGEX_POSE_V4_0_0.match(message)
+        if m_pose:
+            append('pose', timestamp, [float(m_pose.group('easting')),
+                                       float(m_pose.group('northing')),
+                                       float(m_pose.group('altitude')),
+                                       int(m_pose.group('zone')),
+                                       m_pose.group('hemi') == "North"])
+            continue
+
+        m_es2 = logs._REGEX_ES2_V4_0_0.match(message)
+        if m_es2:
+            append('es2', timestamp, [float(m_es2.group('ec')),
+                                      float(m_es2.group('temp'))])
+            continue
+
+        m_sensor = logs._REGEX_SENSOR_V4_0_0.match(message)
+        if m_sensor:
+            append(m_sensor.group('type'), timestamp,
+                   [float(datum)
+                    for datum in m_sensor.group('data').split(" ")])
+            continue
+
+    return {k: v.to_dataframe() for k, v in buffers.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--lines', type=int, default=1000000,
+                        help='number of lines in each synthetic log')
+    args = parser.parse_args()
+
+    for name, record in sorted(RECORDS.items()):
+        logfile = make_log(record, args.lines)
+
+        start = time.time()
+        read_cascade(logfile)
+        cascade = time.time() - start
+
+        start = time.time()
+        platypus.io.logs._parse_v4_0_0(logfile, FILENAME)
+        dispatch = time.time() - start
+
+        print("{:8s} cascade {:.3f}s, dispatch {:.3f}s ({:.1f}x)"
+              .format(name, cascade, dispatch, cascade / dispatch))
+
+
+if __name__ == '__main__':
+    main()
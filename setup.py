@@ -25,7 +25,9 @@ setup(
         'License :: OSI Approved :: BSD License',
         'Intended Audience :: Science/Research',
         'Topic :: Scientific/Engineering',
+        'Programming Language :: Python :: 3',
     ],
+    python_requires='>=3.7',
     packages=find_packages('src'),
     package_dir={'': 'src'},
     include_package_data=True,
@@ -35,11 +37,19 @@ setup(
         ]
     },
     install_requires=[
+        'numpy',
         'pandas',
         'pymongo',
         'pyserial',
+        'scipy',
         'six',
         'utm'
     ],
+    extras_require={
+        'async': ['motor'],
+    },
+    tests_require=[
+        'mongomock',
+    ],
     test_suite="tests",
 )
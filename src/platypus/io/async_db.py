@@ -0,0 +1,529 @@
+#!/usr/bin/env python
+"""
+Module for processing datasets using asynchronous database access.
+
+This is a variant of the processing server in `platypus.io.db` built on
+`asyncio`.  Tailing the oplog and querying the database are asynchronous,
+using the collection and GridFS bucket interfaces of `motor`, while logs are
+streamed and parsed in an executor, so that waiting on the network overlaps
+with parsing.  The datasets that are produced are identical to those of
+`platypus.io.db.process()`, including their fingerprints, so the two
+servers can be used interchangeably on the same database.
+
+Requires the `motor` package to run the server.
+
+Copyright 2016. Platypus LLC. All rights reserved.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import pymongo
+from . import connection, logs
+from .db import (
+    COALESCE_WINDOW, DEFAULT_JOBS, RETRY_DELAY, RETRY_MAX_DELAY,
+    SERIES_BATCH_SIZE, SERIES_COLLECTION, SERIES_INTERVAL, STATE_COLLECTION,
+    _FILERECORD_FIELDS, _LOGS_GRIDFS, _POLL_INTERVAL, _READ_CHUNK_SIZE,
+    _SERIES_INDEX, _dataset_geometry, _fingerprint, _gridfs_keys,
+    _init_worker, _iter_lines, _match_logs, _series_batches, _stream_log,
+)
+from bson.timestamp import Timestamp
+from pymongo.cursor import CursorType
+
+logger = logging.getLogger(__name__)
+
+CONCURRENT_READS = 4
+"""
+Defines the maximum number of logs of a dataset that are read from the
+database at the same time.
+"""
+
+
+class _ChunkReader(object):
+    """
+    Reads an asynchronous GridFS file a chunk at a time from another thread,
+    by running each read on the event loop.
+    """
+    def __init__(self, log_file, loop):
+        """
+        Creates a reader of a file that is opened on an event loop.
+
+        :param log_file: the file to read
+        :type  log_file: motor.motor_asyncio.AsyncIOMotorGridOut
+        :param loop: the running event loop of the file
+        :type  loop: asyncio.AbstractEventLoop
+        """
+        self.log_file = log_file
+        self.loop = loop
+
+    def read(self, size):
+        """
+        Reads up to the specified number of bytes from the file.
+
+        :param size: the maximum number of bytes to read
+        :type  size: int
+        :rtype: bytes
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.log_file.read(size), self.loop).result()
+
+
+def _read_chunks(log_file, filename, loop):
+    """
+    Parses a log that is streamed from an asynchronous GridFS file, in a
+    thread other than that of the event loop.
+
+    :param log_file: the file of the log
+    :type  log_file: motor.motor_asyncio.AsyncIOMotorGridOut
+    :param filename: the original name of the logfile
+    :type  filename: str
+    :param loop: the running event loop of the file
+    :type  loop: asyncio.AbstractEventLoop
+    :returns: a dict containing the data from this logfile
+    :rtype: {str: pandas.DataFrame}
+    """
+    return logs.read(_iter_lines(_ChunkReader(log_file, loop),
+                                 _READ_CHUNK_SIZE), filename=filename)
+
+
+def worker_executor(manager, workers=None):
+    """
+    Creates an executor of worker processes that stream and parse logs.
+
+    Each worker streams logs from GridFS using its own client of the
+    connection manager, as the workers of `platypus.io.db.worker_pool()` do.
+
+    :param manager: connection manager of the database containing the logs
+    :type  manager: connection.ConnectionManager
+    :param workers: number of worker processes, or None to use the number
+                    of CPUs
+    :type  workers: int
+    :returns: an executor, which must be shut down when it is no longer
+              needed
+    :rtype: concurrent.futures.ProcessPoolExecutor
+    """
+    return concurrent.futures.ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(manager,))
+
+
+async def _fetch_logs(db, fs, dataset):
+    """
+    Opens each log in a dataset from the database.
+
+    :param db: asynchronous connection to the database to use
+    :type  db: motor.motor_asyncio.AsyncIOMotorDatabase
+    :param fs: the GridFS bucket containing the logs
+    :type  fs: motor.motor_asyncio.AsyncIOMotorGridFSBucket
+    :param dataset: the dataset document containing the log references
+    :type  dataset: dict
+    :returns: the (file, filename) of each log, where the file is read
+              asynchronously from the database
+    :rtype: [(motor.motor_asyncio.AsyncIOMotorGridOut, str)]
+    """
+    cursor = db['cfs.logs.filerecord'].find(
+        {'_id': {'$in': list(dataset['logs'])}}, _FILERECORD_FIELDS)
+    records = {record['_id']: record
+               for record in await cursor.to_list(None)}
+    keys = _gridfs_keys(records)
+
+    log_files = []
+    if keys:
+        log_files = await fs.find(
+            {'_id': {'$in': list(keys.values())}}).to_list(None)
+
+    return _match_logs(dataset, records, keys, log_files)
+
+
+async def process(db, fs, dataset_id, executor=None, force=False):
+    """
+    Processes a dataset and uploads the processed data to a MongoDB database.
+
+    Up to `CONCURRENT_READS` logs are streamed from the database at a time,
+    and each log is parsed a chunk at a time while it is read, so memory use
+    does not depend on the size of the logs.  Logs are streamed and parsed
+    by the workers of the executor, or otherwise in the default executor of
+    the event loop, reading each chunk asynchronously.  The bounds and path
+    of the dataset are computed in the default executor of the event loop.
+
+    :param db: asynchronous connection to the database to use
+    :type  db: motor.motor_asyncio.AsyncIOMotorDatabase
+    :param fs: the GridFS bucket containing the logs
+    :type  fs: motor.motor_asyncio.AsyncIOMotorGridFSBucket
+    :param dataset_id: reference to the dataset that should be processed
+    :type  dataset_id: str (MongoDB ObjectID)
+    :param executor: (optional) an executor from `worker_executor()` whose
+                     workers stream and parse logs
+    :type  executor: concurrent.futures.ProcessPoolExecutor
+    :param force: whether to process the dataset even if it is unchanged
+    :type  force: bool
+    :returns: whether the dataset was processed
+    :rtype: bool
+    """
+    loop = asyncio.get_running_loop()
+
+    # Retrieve the dataset document from MongoDB.
+    datasets = db['datasets']
+    dataset = await datasets.find_one(dataset_id)
+    if dataset is None:
+        raise ValueError("Invalid or unknown dataset ID '{:s}'."
+                         .format(str(dataset_id)))
+
+    # Skip this dataset if its logs have not changed since it was processed.
+    log_files = await _fetch_logs(db, fs, dataset)
+    dataset_fingerprint = _fingerprint(dataset, log_files)
+    if (not force and dataset.get('processed') == 1.0 and
+            dataset.get('fingerprint') == dataset_fingerprint):
+        logger.info("Skipping unchanged dataset '{:s}'"
+                    .format(str(dataset['_id'])))
+        return False
+
+    # Parse each log while it is streamed, while other logs are streamed.
+    reads = asyncio.Semaphore(CONCURRENT_READS)
+
+    async def read_log(log_file, filename):
+        async with reads:
+            if executor is None:
+                return await loop.run_in_executor(
+                    None, _read_chunks, log_file, filename, loop)
+            return await loop.run_in_executor(
+                executor, _stream_log, _LOGS_GRIDFS, log_file._id, filename)
+
+    data = logs.merge(await asyncio.gather(
+        *[read_log(log_file, filename) for log_file, filename in log_files]))
+
+    # Compute the bounding region and path of this dataset.
+    dataset_bounds, dataset_path = await loop.run_in_executor(
+        None, _dataset_geometry, data)
+
+    # Store the time series of this dataset.
+    await store_series(db, dataset['_id'], data)
+
+    # Mark processing as complete and save results.
+    await datasets.update_one(
+        {'_id': dataset['_id']},
+        {
+            '$set': {
+                'processed': 1.0,
+                'bounds': dataset_bounds,
+                'path': dataset_path,
+                'fingerprint': dataset_fingerprint,
+            }
+        }
+    )
+    return True
+
+
+async def store_series(db, dataset_id, data,
+                       batch_size=SERIES_BATCH_SIZE,
+                       interval=SERIES_INTERVAL):
+    """
+    Stores the time series of a dataset as time-bucketed documents.
+
+    This stores the same documents as `platypus.io.db.store_series()`.
+    Each batch of documents is built in the default executor of the event
+    loop.
+
+    :param db: asynchronous connection to the database to use
+    :type  db: motor.motor_asyncio.AsyncIOMotorDatabase
+    :param dataset_id: the dataset that the time series belong to
+    :type  dataset_id: bson.ObjectId
+    :param data: a dict containing the data from the dataset
+    :type  data: {str: pandas.DataFrame}
+    :param batch_size: the number of documents inserted at a time
+    :type  batch_size: int
+    :param interval: the duration in seconds of each time bucket
+    :type  interval: float
+    :returns: the number of documents that were stored
+    :rtype: int
+    """
+    loop = asyncio.get_running_loop()
+    series = db[SERIES_COLLECTION]
+    await series.create_index(_SERIES_INDEX)
+    await series.delete_many({'dataset': dataset_id})
+
+    count = 0
+    batches = _series_batches(dataset_id, data, batch_size, interval)
+    while True:
+        batch = await loop.run_in_executor(None, next, batches, None)
+        if batch is None:
+            return count
+        await series.insert_many(batch, ordered=False)
+        count += len(batch)
+
+
+class AsyncDatasetConsumer(object):
+    """
+    Processes datasets in response to update events from the oplog.
+
+    This behaves like `platypus.io.db.DatasetConsumer`, and shares its
+    persisted state, but runs its jobs as tasks of an event loop.  Updates
+    that arrive within a short window of each other are coalesced into one
+    job, at most `jobs` datasets are processed at once, datasets that fail
+    to process are retried after a delay, and the timestamp before which
+    every event has been processed is persisted in the `STATE_COLLECTION`.
+    """
+    def __init__(self, db, fs, jobs=DEFAULT_JOBS,
+                 window=COALESCE_WINDOW, executor=None, handler=None,
+                 retry_delay=RETRY_DELAY):
+        """
+        Creates a consumer, which loads its persisted state when it is run.
+
+        :param db: asynchronous connection to the database to use
+        :type  db: motor.motor_asyncio.AsyncIOMotorDatabase
+        :param fs: the GridFS bucket containing the logs
+        :type  fs: motor.motor_asyncio.AsyncIOMotorGridFSBucket
+        :param jobs: the maximum number of datasets processed concurrently
+        :type  jobs: int
+        :param window: the time in seconds to wait for further updates to a
+                       dataset before processing it
+        :type  window: float
+        :param executor: (optional) an executor from `worker_executor()`
+                         whose workers stream and parse logs
+        :type  executor: concurrent.futures.ProcessPoolExecutor
+        :param handler: (optional) a coroutine function that processes a
+                        dataset ID, which defaults to calling `process()`
+        :type  handler: function
+        :param retry_delay: the time in seconds before a dataset that failed
+                            to process is first retried
+        :type  retry_delay: float
+        """
+        self.db = db
+        self.jobs = jobs
+        self.window = window
+        self.retry_delay = retry_delay
+        self.handler = handler or (
+            lambda dataset_id: process(db, fs, dataset_id,
+                                       executor=executor))
+        self.resume_ts = None
+
+        # Events are [timestamp, dataset ID, processed] in oplog order.
+        self._events = collections.deque()
+        self._pending = collections.OrderedDict()
+        self._running = {}
+        self._retries = {}
+        self._failures = collections.Counter()
+
+    def submit(self, event):
+        """
+        Schedules processing of the dataset updated by an oplog event.
+
+        :param event: an update event from the oplog
+        :type  event: dict
+        """
+        dataset_id = event['o2']['_id']
+        self._events.append([event['ts'], dataset_id, False])
+        if dataset_id not in self._pending:
+            self._pending[dataset_id] = asyncio.get_running_loop().time()
+
+    async def poll(self):
+        """
+        Collects finished jobs, starts jobs for datasets whose coalescing
+        window has passed, and persists the resume timestamp.
+
+        :returns: the number of datasets that are waiting or being processed
+        :rtype: int
+        """
+        now = asyncio.get_running_loop().time()
+        for dataset_id, (task, events) in list(self._running.items()):
+            if not task.done():
+                continue
+            del self._running[dataset_id]
+            if task.cancelled() or task.exception() is not None:
+                self._retry(dataset_id, now, task)
+                continue
+            del self._failures[dataset_id]
+            for event in events:
+                event[2] = True
+
+        # Schedule failed datasets again once their retry delay has passed.
+        for dataset_id, retry_time in list(self._retries.items()):
+            if now >= retry_time:
+                del self._retries[dataset_id]
+                self._pending.setdefault(dataset_id, now - self.window)
+
+        for dataset_id, first_update in list(self._pending.items()):
+            if len(self._running) >= self.jobs:
+                break
+            if dataset_id in self._running or now - first_update < self.window:
+                continue
+            logger.info("Processing dataset '{:s}'".format(str(dataset_id)))
+            del self._pending[dataset_id]
+            self._retries.pop(dataset_id, None)
+            events = [event for event in self._events
+                      if event[1] == dataset_id and not event[2]]
+            self._running[dataset_id] = (
+                asyncio.ensure_future(self.handler(dataset_id)), events)
+
+        # Advance the resume timestamp past every processed event.
+        resume_ts = self.resume_ts
+        while self._events and self._events[0][2]:
+            resume_ts = self._events.popleft()[0]
+        if resume_ts != self.resume_ts:
+            await self._checkpoint(resume_ts)
+
+        return len(self._pending) + len(self._running)
+
+    def _retry(self, dataset_id, now, task):
+        """
+        Schedules a dataset that failed to process to be retried.
+
+        The events of the dataset are left unprocessed, so that the resume
+        timestamp is not advanced past them until the dataset is processed.
+
+        :param dataset_id: the dataset that failed to process
+        :type  dataset_id: str (MongoDB ObjectID)
+        :param now: the current time of the event loop
+        :type  now: float
+        :param task: the failed processing task
+        :type  task: asyncio.Task
+        """
+        self._failures[dataset_id] += 1
+        delay = min(self.retry_delay * 2 ** (self._failures[dataset_id] - 1),
+                    RETRY_MAX_DELAY)
+        logger.error("Failed to process dataset '{:s}', retrying in {:.0f}s"
+                     .format(str(dataset_id), delay),
+                     exc_info=None if task.cancelled() else task.exception())
+        self._retries[dataset_id] = now + delay
+
+    async def _checkpoint(self, ts):
+        """
+        Persists the timestamp before which every event has been processed.
+
+        :param ts: the timestamp of the last processed event
+        :type  ts: bson.timestamp.Timestamp
+        """
+        self.resume_ts = ts
+        await self.db[STATE_COLLECTION].replace_one(
+            {'_id': 'oplog'}, {'_id': 'oplog', 'ts': ts}, upsert=True)
+
+    async def _dispatch(self):
+        """
+        Polls for finished and ready jobs until cancelled.
+        """
+        while True:
+            await self.poll()
+            await asyncio.sleep(_POLL_INTERVAL)
+
+    async def run(self, oplog, ns, follow=True):
+        """
+        Processes datasets updated in the oplog, starting after the
+        persisted resume timestamp, or from now if there is none.
+
+        :param oplog: the oplog collection of the database server
+        :type  oplog: motor.motor_asyncio.AsyncIOMotorCollection
+        :param ns: the namespace of the datasets collection
+        :type  ns: str
+        :param follow: whether to wait for new events instead of returning
+                       once existing events are processed, leaving any
+                       datasets that failed to process for the next run
+        :type  follow: bool
+        """
+        if self.resume_ts is None:
+            state = await self.db[STATE_COLLECTION].find_one(
+                {'_id': 'oplog'})
+            if state is not None:
+                self.resume_ts = state['ts']
+            else:
+                latest = await oplog.find_one(
+                    sort=[('$natural', pymongo.DESCENDING)])
+                await self._checkpoint(
+                    latest['ts'] if latest else Timestamp(0, 0))
+        ts = self.resume_ts
+
+        # Jobs are dispatched while waiting for events from the oplog.
+        dispatcher = asyncio.ensure_future(self._dispatch())
+        try:
+            while True:
+                # Find 'update' events in the namespace newer than timestamp.
+                # TODO: handle insert events as well.
+                cursor = oplog.find({'ts': {'$gt': ts}, 'ns': ns, 'op': 'u'},
+                                    cursor_type=CursorType.TAILABLE_AWAIT,
+                                    oplog_replay=True)
+                while cursor.alive:
+                    async for event in cursor:
+                        self.submit(event)
+                        ts = event['ts']
+
+                if not follow:
+                    break
+                await asyncio.sleep(_POLL_INTERVAL)
+        finally:
+            dispatcher.cancel()
+            try:
+                await dispatcher
+            except asyncio.CancelledError:
+                pass
+
+        while await self.poll():
+            await asyncio.sleep(_POLL_INTERVAL)
+
+    async def close(self):
+        """
+        Cancels any running jobs.
+        """
+        tasks = [task for task, _ in self._running.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._running.clear()
+
+
+def server(host=connection.DEFAULT_HOST, database='meteor',
+           workers=None, jobs=DEFAULT_JOBS, window=COALESCE_WINDOW,
+           max_pool_size=connection.DEFAULT_POOL_SIZE,
+           timeout=connection.DEFAULT_TIMEOUT):
+    """
+    Asynchronous database processing server that processes unprocessed logs.
+
+    This takes the same arguments as `platypus.io.db.server()`.
+
+    :param host: a mongodb:// URI for the database server
+    :type  host: str
+    :param database: the name of the database to use within the server
+    :type  database: str
+    :param workers: number of worker processes used to parse logs
+    :type  workers: int
+    :param jobs: the maximum number of datasets processed concurrently
+    :type  jobs: int
+    :param window: the time in seconds to wait for further updates to a
+                   dataset before processing it
+    :type  window: float
+    :param max_pool_size: the maximum number of pooled database connections
+    :type  max_pool_size: int
+    :param timeout: the time in milliseconds to wait for the database server
+                    or for a pooled connection
+    :type  timeout: int
+    """
+    try:
+        import motor.motor_asyncio
+    except ImportError:
+        raise ImportError("The asynchronous server requires 'motor'.")
+
+    # Stream and parse logs in worker processes, each with its own client,
+    # leaving the event loop free for I/O.
+    manager = connection.ConnectionManager(
+        host, database, max_pool_size=max_pool_size, timeout=timeout)
+    executor = worker_executor(manager, workers)
+
+    async def serve():
+        client = motor.motor_asyncio.AsyncIOMotorClient(
+            host, maxPoolSize=max_pool_size,
+            serverSelectionTimeoutMS=timeout, waitQueueTimeoutMS=timeout)
+        db = client[database]
+        fs = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db, _LOGS_GRIDFS)
+        ns = '{:s}.datasets'.format(database)
+
+        consumer = AsyncDatasetConsumer(db, fs, jobs=jobs, window=window,
+                                        executor=executor)
+        logger.info("Asynchronous dataset processing server started.")
+        try:
+            await consumer.run(client.local.oplog.rs, ns)
+        finally:
+            await consumer.close()
+            client.close()
+
+    try:
+        asyncio.run(serve())
+    finally:
+        executor.shutdown()
+        manager.close()
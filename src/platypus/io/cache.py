@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Module for caching parsed logfiles on disk.
+
+Parsed data is stored in a cache directory as one file per logfile, keyed by
+a hash of the name and content of the logfile and the version of the parser.
+The name is part of the key because some logfile versions take their start
+time from their name.  When the cache grows beyond its maximum size, the
+least recently used entries are removed.
+
+The cache is only used when it is requested, such as by passing `cache=True`
+to `platypus.io.logs.load()`.
+
+The cache directory defaults to `~/.cache/platypus`, and can be changed by
+setting the `PLATYPUS_CACHE_DIR` environment variable.
+
+Copyright 2016. Platypus LLC. All rights reserved.
+"""
+import errno
+import hashlib
+import logging
+import os
+import tempfile
+from six.moves import cPickle as pickle
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 2 ** 30
+"""
+Defines the default maximum total size of the cache in bytes.
+"""
+
+_CACHE_SUFFIX = '.pkl'
+"""
+Defines the filename suffix of entries in the cache directory.
+"""
+
+_HASH_BLOCK_SIZE = 2 ** 20
+"""
+Defines the number of bytes of a logfile that are hashed at a time.
+"""
+
+
+def directory():
+    """
+    Gets the directory in which cache entries are stored.
+
+    :returns: path to the cache directory
+    :rtype: str
+    """
+    return os.environ.get(
+        'PLATYPUS_CACHE_DIR',
+        os.path.join(os.path.expanduser('~'), '.cache', 'platypus'))
+
+
+def key(filename, version):
+    """
+    Computes the cache key for the name and content of a logfile.
+
+    :param filename: path to a log file
+    :type  filename: str
+    :param version: the version of the parser used to read the logfile
+    :type  version: str
+    :returns: a key that identifies the parsed content of this logfile
+    :rtype: str
+    """
+    content_hash = hashlib.sha1(
+        os.path.basename(filename).encode('utf-8') + b'\0')
+    with open(filename, 'rb') as logfile:
+        for block in iter(lambda: logfile.read(_HASH_BLOCK_SIZE), b''):
+            content_hash.update(block)
+    return '{:s}-{:s}'.format(content_hash.hexdigest(), version)
+
+
+def get(cache_key, cache_dir=None):
+    """
+    Retrieves parsed log data from the cache.
+
+    :param cache_key: the key of the parsed logfile
+    :type  cache_key: str
+    :param cache_dir: (optional) the cache directory to use
+    :type  cache_dir: str
+    :returns: the cached data, or None if it is not in the cache
+    :rtype: {str: pandas.DataFrame}
+    """
+    path = os.path.join(cache_dir or directory(), cache_key + _CACHE_SUFFIX)
+    try:
+        with open(path, 'rb') as cache_file:
+            data = pickle.load(cache_file)
+    except (IOError, OSError):
+        return None
+    except Exception as e:
+        # Discard entries that cannot be read, e.g. from other pandas versions.
+        logger.warning("Removing unreadable cache entry '{:s}': {:s}"
+                       .format(path, str(e)))
+        _remove(path)
+        return None
+
+    # Mark this entry as recently used.
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return data
+
+
+def put(cache_key, data, cache_dir=None, max_size=DEFAULT_MAX_SIZE):
+    """
+    Stores parsed log data in the cache.
+
+    The entry is written atomically, and the least recently used entries are
+    removed afterwards if the cache exceeds its maximum size.
+
+    :param cache_key: the key of the parsed logfile
+    :type  cache_key: str
+    :param data: the parsed data from the logfile
+    :type  data: {str: pandas.DataFrame}
+    :param cache_dir: (optional) the cache directory to use
+    :type  cache_dir: str
+    :param max_size: the maximum total size of the cache in bytes
+    :type  max_size: int
+    """
+    cache_dir = cache_dir or directory()
+    try:
+        os.makedirs(cache_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    # Write to a temporary file, then move it into place.
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as cache_file:
+            pickle.dump(data, cache_file, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp_path,
+                  os.path.join(cache_dir, cache_key + _CACHE_SUFFIX))
+    except Exception:
+        _remove(temp_path)
+        raise
+
+    evict(cache_dir, max_size)
+
+
+def evict(cache_dir=None, max_size=DEFAULT_MAX_SIZE):
+    """
+    Removes the least recently used cache entries until the cache fits
+    within its maximum size.
+
+    :param cache_dir: (optional) the cache directory to use
+    :type  cache_dir: str
+    :param max_size: the maximum total size of the cache in bytes
+    :type  max_size: int
+    """
+    cache_dir = cache_dir or directory()
+    if not os.path.isdir(cache_dir):
+        return
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(_CACHE_SUFFIX):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    # Remove entries starting from the least recently used.
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        _remove(path)
+        total_size -= size
+
+
+def clear(cache_dir=None):
+    """
+    Removes all entries from the cache.
+
+    :param cache_dir: (optional) the cache directory to use
+    :type  cache_dir: str
+    """
+    evict(cache_dir, max_size=0)
+
+
+def _remove(path):
+    """
+    Removes a file, ignoring files that no longer exist.
+
+    :param path: path to the file to remove
+    :type  path: str
+    """
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""
+Module for sharing MongoDB connections between processing jobs.
+
+A `ConnectionManager` owns a single pooled `pymongo.MongoClient` per process,
+which is shared by every thread of the process, and caches the collection
+and GridFS handles that are created from it.  MongoDB clients and locks
+must not be used across a fork, so a manager that is inherited by a worker
+process is given a new lock in the child, and transparently opens a new
+client on first use.
+
+Each manager also counts the commands that its clients send to the server,
+which is the number of round-trips made to the database.
+
+Copyright 2016. Platypus LLC. All rights reserved.
+"""
+import collections
+import gridfs
+import os
+import pymongo
+import pymongo.monitoring
+import threading
+import weakref
+
+DEFAULT_HOST = 'mongodb://localhost:27017'
+"""
+Defines the default mongodb:// URI of the database server.
+"""
+
+DEFAULT_POOL_SIZE = 100
+"""
+Defines the default maximum number of pooled connections to the server.
+"""
+
+DEFAULT_TIMEOUT = 30000
+"""
+Defines the default time in milliseconds to wait for a server or a pooled
+connection to become available.
+"""
+
+_managers = weakref.WeakSet()
+"""
+Holds every connection manager of this process, so that their locks can be
+replaced in a forked child process.
+"""
+
+
+def _after_fork_in_child():
+    """
+    Replaces the state of every connection manager that a forked child
+    process inherited, as other threads of the parent may have held their
+    locks during the fork.
+    """
+    for manager in list(_managers):
+        manager._reset()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class CommandCounter(pymongo.monitoring.CommandListener):
+    """
+    Counts the commands sent to the database server, by command name.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = collections.Counter()
+
+    def __getstate__(self):
+        with self._lock:
+            return {'counts': self.counts.copy()}
+
+    def __setstate__(self, state):
+        self._lock = threading.Lock()
+        self.counts = state['counts']
+
+    @property
+    def total(self):
+        """
+        Gets the total number of commands that have been sent.
+
+        :rtype: int
+        """
+        with self._lock:
+            return sum(self.counts.values())
+
+    def started(self, event):
+        with self._lock:
+            self.counts[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        """
+        Clears the counts of commands.
+        """
+        with self._lock:
+            self.counts.clear()
+
+
+class ConnectionManager(object):
+    """
+    Provides cached handles to a database using a per-process client.
+
+    Collections are accessed using `manager[name]`, as with a
+    `pymongo.database.Database`, so a manager can be used in place of a
+    database by the functions in `platypus.io.db`.  The commands sent by the
+    clients of a manager are counted in `manager.commands`.
+    """
+    def __init__(self, host=DEFAULT_HOST, database='meteor',
+                 max_pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 client_factory=pymongo.MongoClient):
+        """
+        Creates a manager that connects to the database on first use.
+
+        :param host: a mongodb:// URI for the database server
+        :type  host: str
+        :param database: the name of the database to use within the server
+        :type  database: str
+        :param max_pool_size: the maximum number of pooled connections
+        :type  max_pool_size: int
+        :param timeout: the time in milliseconds to wait for the server or
+                        for a pooled connection
+        :type  timeout: int
+        :param client_factory: (optional) the function used to create clients
+        :type  client_factory: function
+        """
+        self.host = host
+        self.database = database
+        self.max_pool_size = max_pool_size
+        self.timeout = timeout
+        self.client_factory = client_factory
+        self._reset()
+        _managers.add(self)
+
+    def _reset(self):
+        """
+        Discards the client, handles, command counts and lock of this manager.
+        """
+        self.commands = CommandCounter()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._client = None
+        self._collections = {}
+        self._gridfs = {}
+
+    def __getstate__(self):
+        """
+        Gets the settings of this manager, without its client, handles or
+        command counts, so that it can be sent to a worker process.
+        """
+        state = self.__dict__.copy()
+        for name in ('commands', '_lock', '_pid', '_client', '_collections',
+                     '_gridfs'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+        _managers.add(self)
+
+    def _connect(self):
+        """
+        Opens a client for this process if it does not already have one.
+
+        Must be called with the lock held.
+        """
+        if self._pid == os.getpid():
+            return
+
+        # Discard any client and handles inherited from a parent process.
+        self._client = self.client_factory(
+            host=self.host, maxPoolSize=self.max_pool_size,
+            serverSelectionTimeoutMS=self.timeout,
+            waitQueueTimeoutMS=self.timeout,
+            event_listeners=[self.commands])
+        self._collections = {}
+        self._gridfs = {}
+        self._pid = os.getpid()
+
+    @property
+    def client(self):
+        """
+        Gets the client of this process.
+
+        :rtype: pymongo.MongoClient
+        """
+        with self._lock:
+            self._connect()
+            return self._client
+
+    @property
+    def db(self):
+        """
+        Gets the database of this process.
+
+        :rtype: pymongo.database.Database
+        """
+        return self.client[self.database]
+
+    def __getitem__(self, name):
+        """
+        Gets a cached handle to a collection of the database.
+
+        :param name: the name of the collection
+        :type  name: str
+        :rtype: pymongo.collection.Collection
+        """
+        with self._lock:
+            self._connect()
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self._client[self.database][name]
+                self._collections[name] = collection
+            return collection
+
+    def gridfs(self, collection='fs'):
+        """
+        Gets a cached handle to a GridFS store in the database.
+
+        :param collection: the root collection of the GridFS store
+        :type  collection: str
+        :rtype: gridfs.GridFS
+        """
+        with self._lock:
+            self._connect()
+            fs = self._gridfs.get(collection)
+            if fs is None:
+                fs = gridfs.GridFS(self._client[self.database], collection)
+                self._gridfs[collection] = fs
+            return fs
+
+    def close(self):
+        """
+        Closes the client of this process.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                self._client.close()
+            self._pid = None
+            self._client = None
+            self._collections = {}
+            self._gridfs = {}
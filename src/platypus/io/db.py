@@ -4,106 +4,842 @@ Module for handling database interactions.
 Copyright 2015. Platypus LLC. All rights reserved.
 """
 import argparse
+import collections
 import gridfs
+import hashlib
 import logging
-import mongoengine
+import multiprocessing
+import multiprocessing.pool
+import numpy
 import pandas
 import pymongo
-import scipy
-from . import logs
+import six
+import time
+from . import connection, logs
+from ..util import conversions, trajectory
 from bson.objectid import ObjectId
+from bson.timestamp import Timestamp
 from pymongo.cursor import CursorType
 
 logger = logging.getLogger(__name__)
 
+PATH_TOLERANCES = (1.0, 10.0, 100.0)
+"""
+Defines the tolerances in meters of the levels of detail at which dataset
+paths are stored, from the finest to the coarsest.
+"""
+
+PATH_MAX_VERTICES = 10000
+"""
+Defines the maximum number of vertices in each level of a stored dataset
+path, which keeps dataset documents well below the MongoDB size limit.
+"""
+
+SERIES_COLLECTION = 'series'
+"""
+Defines the collection in which the time series of datasets are stored.
+"""
+
+SERIES_INTERVAL = 600
+"""
+Defines the default duration in seconds of the time bucket of each stored
+time series document.
+"""
+
+SERIES_MAX_SAMPLES = 1000
+"""
+Defines the maximum number of samples in each stored time series document,
+which keeps documents well below the MongoDB size limit.
+"""
+
+SERIES_BATCH_SIZE = 500
+"""
+Defines the default number of time series documents inserted at a time.
+"""
+
+DEFAULT_JOBS = 2
+"""
+Defines the default number of datasets that are processed concurrently.
+"""
+
+COALESCE_WINDOW = 1.0
+"""
+Defines the default time in seconds to wait for further updates to a
+dataset before processing it.
+"""
+
+RETRY_DELAY = 10.0
+"""
+Defines the default time in seconds before a dataset that failed to process
+is retried, which doubles after each consecutive failure.
+"""
+
+RETRY_MAX_DELAY = 3600.0
+"""
+Defines the maximum time in seconds before a dataset that failed to process
+is retried.
+"""
+
+STATE_COLLECTION = 'platypus.state'
+"""
+Defines the collection in which the processing server persists its state.
+"""
+
+_SERIES_INDEX = [('dataset', pymongo.ASCENDING),
+                 ('type', pymongo.ASCENDING),
+                 ('start', pymongo.ASCENDING)]
+"""
+Defines the index of the stored time series documents.
+"""
+
+_FILERECORD_FIELDS = {'copies': 1, 'original.name': 1}
+"""
+Defines the fields of log filerecords that are retrieved from the database.
+"""
+
+_LOGS_GRIDFS = 'cfs_gridfs.logs_gridfs'
+"""
+Defines the root collection of the GridFS store containing logs.
+"""
+
+_READ_CHUNK_SIZE = 2 ** 20
+"""
+Defines the number of bytes of a log that are read from GridFS at a time.
+"""
+
+_POLL_INTERVAL = 0.1
+"""
+Defines the time in seconds between checks for finished processing jobs.
+"""
+
+_manager = None
+"""
+Holds the connection manager of a worker process that parses logs.
+"""
+
 
-def process(db, dataset_id):
+def _decode_line(line):
     """
-    Processes a dataset and uploads the processed data to a MongoDB database.
+    Decodes a line of a log, without its line ending.
 
-    :param db: connection to the database to use
-    :type  db: pymongo.Database
-    :param dataset_id: reference to the dataset that should be processed
-    :type  dataset_id: str (MongoDB ObjectID)
+    :param line: the raw line, which may end in a carriage return
+    :type  line: bytes
+    :returns: the decoded line
+    :rtype: str
     """
-    # Open GridFS connection to the Meteor cfs-gridfs collection.
-    fs = gridfs.GridFS(db, 'cfs_gridfs.logs_gridfs')
+    if line.endswith(b'\r'):
+        line = line[:-1]
+    return line.decode('utf-8')
 
-    # Retrieve the dataset document from MongoDB.
-    datasets = db['datasets']
-    dataset = datasets.find_one(dataset_id)
-    if dataset is None:
-        raise ValueError("Invalid or unknown dataset ID '{:s}'."
-                         .format(dataset_id))
 
-    # Load the data from the logs in this dataset.
-    data = {}
-    for log_id in dataset['logs']:
+def _iter_lines(log_file, chunk_size=_READ_CHUNK_SIZE):
+    """
+    Iterates over the decoded lines of a binary file, reading a chunk of
+    the file at a time.
+
+    Lines are only split at newlines, before they are decoded, so that any
+    other unicode line separators within records are kept.
+
+    :param log_file: a binary file-like object, such as a GridFS file
+    :type  log_file: gridfs.GridOut
+    :param chunk_size: the number of bytes to read at a time
+    :type  chunk_size: int
+    :returns: an iterator over the lines of the file
+    :rtype: iterator of str
+    """
+    remainder = b''
+    while True:
+        chunk = log_file.read(chunk_size)
+        if not chunk:
+            break
+
+        # Keep the incomplete last line until the next chunk is read.
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            yield _decode_line(line)
+
+    if remainder:
+        yield _decode_line(remainder)
 
-        # Get the filerecord for this log from the DB.
-        log_record = db['cfs.logs.filerecord'].find_one(log_id)
 
-        # Attempt to load the log content from any available sources.
-        log_content = None
-        if 'logs_gridfs' in log_record['copies']:
-            # Retrieve the data from GridFS.
-            log_id = ObjectId(log_record['copies']['logs_gridfs']['key'])
-            log_cursor = fs.find_one(log_id)
-            log_content = log_cursor.read().splitlines()
+def _init_worker(manager):
+    """
+    Stores the connection manager of a worker process that parses logs.
+
+    This is a module-level function so that it can be run in a worker process.
+
+    :param manager: the connection manager, which opens a new client in the
+                    worker process on first use
+    :type  manager: connection.ConnectionManager
+    """
+    global _manager
+    _manager = manager
+
+
+def _stream_log(collection, file_id, filename):
+    """
+    Parses a log that is streamed from GridFS by a worker process.
 
-        elif 'logs_s3' in log_record['copies']:
+    This is a module-level function so that it can be run in a worker process.
+
+    :param collection: the root collection of the GridFS store
+    :type  collection: str
+    :param file_id: the ID of the GridFS file of the log
+    :type  file_id: bson.ObjectId
+    :param filename: the original name of the logfile
+    :type  filename: str
+    :returns: a dict containing the data from this logfile
+    :rtype: {str: pandas.DataFrame}
+    """
+    log_file = _manager.gridfs(collection).get(file_id)
+    return logs.read(_iter_lines(log_file), filename=filename)
+
+
+def _gridfs(db, collection):
+    """
+    Gets a GridFS store, reusing the cached handle of a connection manager.
+
+    :param db: connection to the database to use
+    :type  db: pymongo.Database or connection.ConnectionManager
+    :param collection: the root collection of the GridFS store
+    :type  collection: str
+    :rtype: gridfs.GridFS
+    """
+    if isinstance(db, connection.ConnectionManager):
+        return db.gridfs(collection)
+    return gridfs.GridFS(db, collection)
+
+
+def _gridfs_keys(records):
+    """
+    Finds the GridFS file of each log that has a copy in GridFS.
+
+    :param records: the filerecords of logs, by ID
+    :type  records: {bson.ObjectId: dict}
+    :returns: the ID of the GridFS file of each log that has one, by log ID
+    :rtype: {bson.ObjectId: bson.ObjectId}
+    """
+    keys = {}
+    for log_id, record in six.iteritems(records):
+        copies = record.get('copies', {})
+        if 'logs_gridfs' in copies:
+            # Open the data from GridFS.
+            keys[log_id] = ObjectId(copies['logs_gridfs']['key'])
+
+        elif 'logs_s3' in copies:
             # Retrieve the log file from Amazon S3.
             # TODO: implement this.
             pass
+    return keys
+
+
+def _match_logs(dataset, records, keys, log_files):
+    """
+    Pairs each log of a dataset with its opened file, in dataset order.
+
+    :param dataset: the dataset document containing the log references
+    :type  dataset: dict
+    :param records: the filerecords of the logs, by ID
+    :type  records: {bson.ObjectId: dict}
+    :param keys: the ID of the GridFS file of each log, by log ID
+    :type  keys: {bson.ObjectId: bson.ObjectId}
+    :param log_files: the opened GridFS files
+    :type  log_files: [gridfs.GridOut]
+    :returns: the (file, filename) of each log
+    :rtype: [(gridfs.GridOut, str)]
+    """
+    log_files = {log_file._id: log_file for log_file in log_files}
+
+    matched = []
+    for log_id in dataset['logs']:
+        record = records.get(log_id)
+        log_file = log_files.get(keys.get(log_id))
 
         # Fail if none of the data sources were interpretable.
-        if not log_content:
+        if record is None or log_file is None or log_file.length == 0:
             raise ValueError("Invalid or unknown logfile sources for '{:s}'."
-                             .format(dataset_id))
+                             .format(str(dataset['_id'])))
 
-        # Append the data from all of the logs together.
-        log_data = logs.read(log_content,
-                             filename=log_record['original']['name'])
-        for k, v in log_data.iteritems():
-            if k in data:
-                data[k] = pandas.concat(data[k], v)
-            else:
-                data[k] = v
+        matched.append((log_file, record['original']['name']))
+    return matched
 
-    # Compute the bounding region for this dataset.
-    hull = scipy.spatial.ConvexHull(data['pose'][['longitude', 'latitude']])
-    path = data['pose'][['longitude', 'latitude']]
 
-    dataset_bounds = {
-        'geo': {
-            'type': 'Polygon',
-            'coordinates': hull.tolist()
+def _fetch_logs(db, dataset):
+    """
+    Opens each log in a dataset from the database.
+
+    The filerecords of all of the logs are retrieved in a single query, and
+    their GridFS files in a second query, rather than one query per log.
+
+    :param db: connection to the database to use
+    :type  db: pymongo.Database or connection.ConnectionManager
+    :param dataset: the dataset document containing the log references
+    :type  dataset: dict
+    :returns: the (file, filename) of each log, where the file is read
+              lazily from the database
+    :rtype: [(gridfs.GridOut, str)]
+    """
+    # Get the filerecords for all of the logs from the DB.
+    records = {
+        record['_id']: record
+        for record in db['cfs.logs.filerecord'].find(
+            {'_id': {'$in': list(dataset['logs'])}}, _FILERECORD_FIELDS)
+    }
+    keys = _gridfs_keys(records)
+
+    # Open the GridFS files of all of the logs, without reading their chunks.
+    log_files = []
+    if keys:
+        fs = _gridfs(db, _LOGS_GRIDFS)
+        log_files = list(fs.find({'_id': {'$in': list(keys.values())}}))
+
+    return _match_logs(dataset, records, keys, log_files)
+
+
+def worker_pool(db, workers=None):
+    """
+    Creates a pool of worker processes that parse logs from a database.
+
+    Each worker streams logs using its own client of the connection manager.
+    The pool can be passed to `load()` and `process()`, so that the same
+    workers are reused to parse the logs of many datasets.  It should be
+    created before starting any other threads, as it forks this process.
+
+    :param db: connection to the database containing the logs
+    :type  db: connection.ConnectionManager
+    :param workers: number of worker processes, or None to use the number
+                    of CPUs
+    :type  workers: int
+    :returns: a pool of worker processes, which must be terminated when it
+              is no longer needed
+    :rtype: multiprocessing.pool.Pool
+    """
+    return multiprocessing.Pool(workers, initializer=_init_worker,
+                                initargs=(db,))
+
+
+def load(db, dataset, workers=None, pool=None):
+    """
+    Loads and merges the data from all of the logs in a dataset.
+
+    Each log is streamed from the database a chunk at a time while it is
+    parsed, so memory use does not depend on the size of the logs.  The
+    data from each log is then merged in time order for each type, and
+    records that are duplicated between logs are removed.
+
+    Logs can only be parsed by a pool of worker processes when using a
+    `connection.ConnectionManager`, as each worker streams logs using its
+    own client.  A `pymongo.Database` cannot be shared with worker
+    processes, so its logs are parsed one at a time in this process, and a
+    warning is logged if more than one worker was requested.
+
+    :param db: connection to the database to use
+    :type  db: pymongo.Database or connection.ConnectionManager
+    :param dataset: the dataset document containing the log references
+    :type  dataset: dict
+    :param workers: number of worker processes used to parse logs, or None
+                    to use the number of CPUs, or 1 to parse in this process
+    :type  workers: int
+    :param pool: (optional) a pool of workers from `worker_pool()` that is
+                 used instead of starting new worker processes
+    :type  pool: multiprocessing.pool.Pool
+    :returns: a dict containing the merged data from all logs
+    :rtype: {str: pandas.DataFrame}
+    """
+    return _parse_logs(db, _fetch_logs(db, dataset), workers=workers,
+                       pool=pool)
+
+
+def _parse_logs(db, log_files, workers=None, pool=None):
+    """
+    Parses and merges the data from opened logs.
+
+    :param db: connection to the database containing the logs
+    :type  db: pymongo.Database or connection.ConnectionManager
+    :param log_files: the (file, filename) of each log
+    :type  log_files: [(gridfs.GridOut, str)]
+    :param workers: number of worker processes used to parse logs, or None
+                    to use the number of CPUs, or 1 to parse in this process
+    :type  workers: int
+    :param pool: (optional) a pool of workers from `worker_pool()`
+    :type  pool: multiprocessing.pool.Pool
+    :returns: a dict containing the merged data from all logs
+    :rtype: {str: pandas.DataFrame}
+    """
+    if pool is None and workers != 1 and not isinstance(
+            db, connection.ConnectionManager):
+        if workers is not None:
+            logger.warning("Parsing logs in this process, as {:d} workers "
+                           "require a ConnectionManager.".format(workers))
+        workers = 1
+
+    if pool is None and workers == 1:
+        log_data = [logs.read(_iter_lines(log_file), filename=filename)
+                    for log_file, filename in log_files]
+    else:
+        owned = pool is None
+        if owned:
+            pool = worker_pool(db, workers)
+        try:
+            results = [
+                pool.apply_async(_stream_log,
+                                 (_LOGS_GRIDFS, log_file._id, filename))
+                for log_file, filename in log_files]
+            log_data = [result.get() for result in results]
+        finally:
+            if owned:
+                pool.terminate()
+                pool.join()
+
+    # Merge the data from all of the logs together in time order.
+    return logs.merge(log_data)
+
+
+def _fingerprint(dataset, log_files):
+    """
+    Computes a fingerprint of the inputs to the processing of a dataset.
+
+    The fingerprint changes whenever logs are added to or removed from the
+    dataset, whenever the content of a log changes size, and whenever the
+    version of the log parser changes.
+
+    :param dataset: the dataset document containing the log references
+    :type  dataset: dict
+    :param log_files: the (file, filename) of each log in the dataset
+    :type  log_files: [(gridfs.GridOut, str)]
+    :returns: a hexadecimal digest of the log IDs and sizes of the dataset
+    :rtype: str
+    """
+    digest = hashlib.sha1(logs.PARSER_VERSION.encode('utf-8'))
+    for log_id, (log_file, _) in zip(dataset['logs'], log_files):
+        digest.update('\n{:s}:{:s}:{:d}'.format(
+            str(log_id), str(log_file._id), log_file.length).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _series_documents(dataset_id, name, df, interval=SERIES_INTERVAL,
+                      max_samples=SERIES_MAX_SAMPLES):
+    """
+    Splits a time series into documents that each hold the samples within a
+    time bucket.
+
+    Each document contains the `start` and `end` times of its samples, the
+    `time` of each sample in milliseconds after `start`, and the values of
+    each column of the samples in `values`.
+
+    :param dataset_id: the dataset that the time series belongs to
+    :type  dataset_id: bson.ObjectId
+    :param name: the type of the data, such as 'pose'
+    :type  name: str
+    :param df: a dataframe with a sorted time index
+    :type  df: pandas.DataFrame
+    :param interval: the duration in seconds of each time bucket
+    :type  interval: float
+    :param max_samples: the maximum number of samples in each document
+    :type  max_samples: int
+    :returns: an iterator over the time series documents
+    :rtype: iterator of dict
+    """
+    time_ns = df.index.values.astype('datetime64[ns]').astype(numpy.int64)
+    if len(time_ns) == 0:
+        return
+
+    # Split the samples where the bucket changes or a document is full.
+    bucket = time_ns // int(interval * 1e9)
+    starts = numpy.flatnonzero(numpy.diff(bucket)) + 1
+    starts = numpy.concatenate(([0], starts, [len(time_ns)]))
+    starts = numpy.unique(numpy.concatenate(
+        [numpy.arange(start, end, max_samples)
+         for start, end in zip(starts[:-1], starts[1:])] + [starts[-1:]]))
+
+    time_ms = time_ns // 1000000
+    columns = [(str(column), df[column].values) for column in df.columns]
+    for start, end in zip(starts[:-1], starts[1:]):
+        yield {
+            'dataset': dataset_id,
+            'type': name,
+            'start': pandas.Timestamp(time_ns[start]).to_pydatetime(),
+            'end': pandas.Timestamp(time_ns[end - 1]).to_pydatetime(),
+            'count': int(end - start),
+            'time': (time_ms[start:end] - time_ms[start]).tolist(),
+            'values': {column: values[start:end].tolist()
+                       for column, values in columns},
         }
+
+
+def _series_batches(dataset_id, data, batch_size=SERIES_BATCH_SIZE,
+                    interval=SERIES_INTERVAL):
+    """
+    Splits the time series of a dataset into batches of documents.
+
+    :param dataset_id: the dataset that the time series belong to
+    :type  dataset_id: bson.ObjectId
+    :param data: a dict containing the data from the dataset
+    :type  data: {str: pandas.DataFrame}
+    :param batch_size: the number of documents in each batch
+    :type  batch_size: int
+    :param interval: the duration in seconds of each time bucket
+    :type  interval: float
+    :returns: an iterator over the batches of documents
+    :rtype: iterator of [dict]
+    """
+    batch = []
+    for name, df in sorted(six.viewitems(data)):
+        for document in _series_documents(dataset_id, name, df, interval):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def store_series(db, dataset_id, data, batch_size=SERIES_BATCH_SIZE,
+                 interval=SERIES_INTERVAL):
+    """
+    Stores the time series of a dataset as time-bucketed documents.
+
+    Any previously stored time series of the dataset are replaced.
+    Documents are inserted in unordered batches, so that each batch takes a
+    single round-trip to the database.
+
+    :param db: connection to the database to use
+    :type  db: pymongo.Database or connection.ConnectionManager
+    :param dataset_id: the dataset that the time series belong to
+    :type  dataset_id: bson.ObjectId
+    :param data: a dict containing the data from the dataset
+    :type  data: {str: pandas.DataFrame}
+    :param batch_size: the number of documents inserted at a time
+    :type  batch_size: int
+    :param interval: the duration in seconds of each time bucket
+    :type  interval: float
+    :returns: the number of documents that were stored
+    :rtype: int
+    """
+    series = db[SERIES_COLLECTION]
+    series.create_index(_SERIES_INDEX)
+    series.delete_many({'dataset': dataset_id})
+
+    count = 0
+    for batch in _series_batches(dataset_id, data, batch_size, interval):
+        series.insert_many(batch, ordered=False)
+        count += len(batch)
+    return count
+
+
+def _dataset_geometry(data):
+    """
+    Computes the bounding region and the simplified path of a dataset.
+
+    :param data: a dict containing the data from the dataset
+    :type  data: {str: pandas.DataFrame}
+    :returns: the bounds and path fields of the processed dataset
+    :rtype: (dict, dict)
+    """
+    # Compute the bounding region for this dataset.
+    dataset_bounds = {
+        'geo': conversions.region_from_points(data['pose'])
     }
 
-    dataset_path = {
-        'geo': {
-            'type': 'Polygon',
-            'coordinates': path.tolist()
+    # Simplify the path of this dataset at each level of detail.
+    paths = trajectory.simplify_path_levels(
+        data['pose'], PATH_TOLERANCES, max_vertices=PATH_MAX_VERTICES)
+    levels = [
+        {
+            'tolerance': tolerance,
+            'geo': {
+                'type': 'LineString',
+                'coordinates': path[['longitude', 'latitude']].values.tolist()
+            }
         }
+        for tolerance, path in zip(PATH_TOLERANCES, paths)
+    ]
+    dataset_path = {
+        'geo': levels[0]['geo'],
+        'levels': levels
     }
+    return dataset_bounds, dataset_path
+
+
+def process(db, dataset_id, workers=None, force=False, pool=None):
+    """
+    Processes a dataset and uploads the processed data to a MongoDB database.
+
+    The fingerprint of the logs of the dataset is stored along with the
+    processed data, and datasets whose fingerprint has not changed since
+    they were last processed are skipped.  Processing is idempotent, so a
+    dataset that was interrupted while being processed can be processed
+    again from the start.
+
+    :param db: connection to the database to use
+    :type  db: pymongo.Database or connection.ConnectionManager
+    :param dataset_id: reference to the dataset that should be processed
+    :type  dataset_id: str (MongoDB ObjectID)
+    :param workers: number of worker processes used to parse logs, which
+                    requires a `connection.ConnectionManager` as for `load()`
+    :type  workers: int
+    :param force: whether to process the dataset even if it is unchanged
+    :type  force: bool
+    :param pool: (optional) a pool of workers from `worker_pool()` that is
+                 used instead of starting new worker processes
+    :type  pool: multiprocessing.pool.Pool
+    :returns: whether the dataset was processed
+    :rtype: bool
+    """
+    # Retrieve the dataset document from MongoDB.
+    datasets = db['datasets']
+    dataset = datasets.find_one(dataset_id)
+    if dataset is None:
+        raise ValueError("Invalid or unknown dataset ID '{:s}'."
+                         .format(dataset_id))
+
+    # Skip this dataset if its logs have not changed since it was processed.
+    log_files = _fetch_logs(db, dataset)
+    dataset_fingerprint = _fingerprint(dataset, log_files)
+    if (not force and dataset.get('processed') == 1.0 and
+            dataset.get('fingerprint') == dataset_fingerprint):
+        logger.info("Skipping unchanged dataset '{:s}'"
+                    .format(str(dataset['_id'])))
+        return False
+
+    # Load the data from the logs in this dataset.
+    data = _parse_logs(db, log_files, workers=workers, pool=pool)
+
+    # Compute the bounding region and path of this dataset.
+    dataset_bounds, dataset_path = _dataset_geometry(data)
+
+    # Store the time series of this dataset.
+    store_series(db, dataset['_id'], data)
 
     # Mark processing as complete and save results.
     # TODO: check result
     datasets.update_one(
-        {"name": "Juni"},
+        {'_id': dataset['_id']},
         {
             '$set': {
                 'processed': 1.0,
                 'bounds': dataset_bounds,
-                'bounds': dataset_path,
+                'path': dataset_path,
+                'fingerprint': dataset_fingerprint,
             }
         }
     )
+    return True
+
+
+class DatasetConsumer(object):
+    """
+    Processes datasets in response to update events from the oplog.
 
+    Updates to the same dataset that arrive within a short window of each
+    other are coalesced into a single processing job, and jobs are run by a
+    bounded pool of threads.  When using a `connection.ConnectionManager`,
+    the jobs parse logs using a single pool of worker processes, which is
+    started before any job threads so that no thread forks the process.
+    A dataset that is updated while it is being processed is
+    processed again once the current job finishes.  A dataset that fails to
+    process is retried after a delay, which doubles after each consecutive
+    failure.
 
-def server(host='mongodb://localhost:27017',
-           database='meteor'):
+    The oplog timestamp before which every event has been processed is
+    persisted in the `STATE_COLLECTION`, so that a restarted consumer
+    resumes from the oldest unprocessed event, including the events of
+    datasets that failed to process.  Datasets whose logs are
+    unchanged since they were last processed are skipped by `process()`,
+    including the updates that it makes to the datasets itself.
+    """
+    def __init__(self, db, jobs=DEFAULT_JOBS, window=COALESCE_WINDOW,
+                 workers=None, handler=None, retry_delay=RETRY_DELAY):
+        """
+        Creates a consumer that resumes from its persisted state.
+
+        :param db: connection to the database to use
+        :type  db: pymongo.Database or connection.ConnectionManager
+        :param jobs: the maximum number of datasets processed concurrently
+        :type  jobs: int
+        :param window: the time in seconds to wait for further updates to a
+                       dataset before processing it
+        :type  window: float
+        :param workers: number of worker processes used to parse logs
+        :type  workers: int
+        :param handler: (optional) a function that processes a dataset ID,
+                        which defaults to calling `process()`
+        :type  handler: function
+        :param retry_delay: the time in seconds before a dataset that failed
+                            to process is first retried
+        :type  retry_delay: float
+        """
+        self.db = db
+        self.jobs = jobs
+        self.window = window
+        self.retry_delay = retry_delay
+
+        self._workers = None
+        if handler is None and workers != 1 and isinstance(
+                db, connection.ConnectionManager):
+            self._workers = worker_pool(db, workers)
+        self.handler = handler or (
+            lambda dataset_id: process(db, dataset_id, workers=workers,
+                                       pool=self._workers))
+
+        state = db[STATE_COLLECTION].find_one({'_id': 'oplog'})
+        self.resume_ts = state['ts'] if state else None
+
+        # Events are [timestamp, dataset ID, processed] in oplog order.
+        self._events = collections.deque()
+        self._pending = collections.OrderedDict()
+        self._running = {}
+        self._retries = {}
+        self._failures = collections.Counter()
+        self._pool = multiprocessing.pool.ThreadPool(jobs)
+
+    def submit(self, event):
+        """
+        Schedules processing of the dataset updated by an oplog event.
+
+        :param event: an update event from the oplog
+        :type  event: dict
+        """
+        dataset_id = event['o2']['_id']
+        self._events.append([event['ts'], dataset_id, False])
+        if dataset_id not in self._pending:
+            self._pending[dataset_id] = time.time()
+
+    def poll(self):
+        """
+        Collects finished jobs, starts jobs for datasets whose coalescing
+        window has passed, and persists the resume timestamp.
+
+        :returns: the number of datasets that are waiting or being processed
+        :rtype: int
+        """
+        now = time.time()
+        for dataset_id, (result, events) in list(self._running.items()):
+            if not result.ready():
+                continue
+            del self._running[dataset_id]
+            try:
+                result.get()
+            except Exception:
+                self._retry(dataset_id, now)
+                continue
+            del self._failures[dataset_id]
+            for event in events:
+                event[2] = True
+
+        # Schedule failed datasets again once their retry delay has passed.
+        for dataset_id, retry_time in list(self._retries.items()):
+            if now >= retry_time:
+                del self._retries[dataset_id]
+                self._pending.setdefault(dataset_id, now - self.window)
+
+        for dataset_id, first_update in list(self._pending.items()):
+            if len(self._running) >= self.jobs:
+                break
+            if dataset_id in self._running or now - first_update < self.window:
+                continue
+            logger.info("Processing dataset '{:s}'".format(str(dataset_id)))
+            del self._pending[dataset_id]
+            self._retries.pop(dataset_id, None)
+            events = [event for event in self._events
+                      if event[1] == dataset_id and not event[2]]
+            self._running[dataset_id] = (
+                self._pool.apply_async(self.handler, (dataset_id,)), events)
+
+        # Advance the resume timestamp past every processed event.
+        resume_ts = self.resume_ts
+        while self._events and self._events[0][2]:
+            resume_ts = self._events.popleft()[0]
+        if resume_ts != self.resume_ts:
+            self._checkpoint(resume_ts)
+
+        return len(self._pending) + len(self._running)
+
+    def _retry(self, dataset_id, now):
+        """
+        Schedules a dataset that failed to process to be retried.
+
+        The events of the dataset are left unprocessed, so that the resume
+        timestamp is not advanced past them until the dataset is processed.
+
+        :param dataset_id: the dataset that failed to process
+        :type  dataset_id: str (MongoDB ObjectID)
+        :param now: the current time in seconds
+        :type  now: float
+        """
+        self._failures[dataset_id] += 1
+        delay = min(self.retry_delay * 2 ** (self._failures[dataset_id] - 1),
+                    RETRY_MAX_DELAY)
+        logger.exception("Failed to process dataset '{:s}', retrying in "
+                         "{:.0f}s".format(str(dataset_id), delay))
+        self._retries[dataset_id] = now + delay
+
+    def _checkpoint(self, ts):
+        """
+        Persists the timestamp before which every event has been processed.
+
+        :param ts: the timestamp of the last processed event
+        :type  ts: bson.timestamp.Timestamp
+        """
+        self.resume_ts = ts
+        self.db[STATE_COLLECTION].replace_one(
+            {'_id': 'oplog'}, {'_id': 'oplog', 'ts': ts}, upsert=True)
+
+    def run(self, oplog, ns, follow=True):
+        """
+        Processes datasets updated in the oplog, starting after the
+        persisted resume timestamp, or from now if there is none.
+
+        :param oplog: the oplog collection of the database server
+        :type  oplog: pymongo.Collection
+        :param ns: the namespace of the datasets collection
+        :type  ns: str
+        :param follow: whether to wait for new events instead of returning
+                       once existing events are processed, leaving any
+                       datasets that failed to process for the next run
+        :type  follow: bool
+        """
+        # Persist the starting timestamp, so that events which arrive while
+        # a newly started consumer is down are not skipped.
+        if self.resume_ts is None:
+            latest = oplog.find_one(sort=[('$natural', pymongo.DESCENDING)])
+            self._checkpoint(latest['ts'] if latest else Timestamp(0, 0))
+        ts = self.resume_ts
+
+        while True:
+            # Find 'update' events in the namespace newer than timestamp.
+            # TODO: handle insert events as well.
+            cursor = oplog.find({'ts': {'$gt': ts}, 'ns': ns, 'op': 'u'},
+                                cursor_type=CursorType.TAILABLE_AWAIT,
+                                oplog_replay=True)
+            while cursor.alive:
+                for event in cursor:
+                    self.submit(event)
+                    ts = event['ts']
+                    self.poll()
+                self.poll()
+
+            if not follow:
+                while self.poll():
+                    time.sleep(_POLL_INTERVAL)
+                return
+
+    def close(self):
+        """
+        Stops any running jobs.
+        """
+        self._pool.terminate()
+        self._pool.join()
+        if self._workers is not None:
+            self._workers.terminate()
+            self._workers.join()
+
+
+def server(host=connection.DEFAULT_HOST, database='meteor',
+           workers=None, jobs=DEFAULT_JOBS, window=COALESCE_WINDOW,
+           max_pool_size=connection.DEFAULT_POOL_SIZE,
+           timeout=connection.DEFAULT_TIMEOUT):
     """
     Database processing server that processes unprocessed logs.
 
@@ -111,38 +847,34 @@ def server(host='mongodb://localhost:27017',
     :type  host: str
     :param database: the name of the database to use within the server
     :type  database: str
+    :param workers: number of worker processes used to parse logs
+    :type  workers: int
+    :param jobs: the maximum number of datasets processed concurrently
+    :type  jobs: int
+    :param window: the time in seconds to wait for further updates to a
+                   dataset before processing it
+    :type  window: float
+    :param max_pool_size: the maximum number of pooled database connections
+    :type  max_pool_size: int
+    :param timeout: the time in milliseconds to wait for the database server
+                    or for a pooled connection
+    :type  timeout: int
     """
 
-    # Create a connection to the database.
-    c = pymongo.MongoClient(host=host)
-    mongoengine.connect(database, host=host)
+    # Create a connection to the database that is shared by every job.
+    manager = connection.ConnectionManager(
+        host, database, max_pool_size=max_pool_size, timeout=timeout)
     ns = '{:s}.datasets'.format(database)
 
     # Tail oplog to get updates.
-    oplog = c.local.oplog.rs
+    consumer = DatasetConsumer(manager, jobs=jobs, window=window,
+                               workers=workers)
     logger.info("Dataset processing server started.")
-
-    # Find current timestamp in oplog.
-    first = next(oplog.find().sort('$natural', pymongo.DESCENDING).limit(-1))
-    ts = first['ts']
-
-    # Stream remaining elements in oplog.
-    while True:
-        # Find 'update' events in the specified namespace newer than timestamp.
-        # TODO: handle insert events as well.
-        cursor = oplog.find({'ts': {'$gt': ts}, 'ns': ns, 'op': 'u'},
-                            cursor_type=CursorType.TAILABLE_AWAIT,
-                            oplog_replay=True)
-        while cursor.alive:
-            for doc in cursor:
-                logger.info("Processing dataset '{:s}'"
-                            .format(doc['o2']['_id']))
-
-                # Process dataset and put results in MongoDB.
-                process(c[database], doc['o2']['_id'])
-
-                # Update latest oplog timestamp.
-                ts = doc['ts']
+    try:
+        consumer.run(manager.client.local.oplog.rs, ns)
+    finally:
+        consumer.close()
+        manager.close()
 
 
 def server_script():
@@ -153,13 +885,37 @@ def server_script():
     """
     parser = argparse.ArgumentParser(
         description='Process datasets and upload results to MongoDB.')
-    parser.add_argument('-h', '--host', type=str,
-                        default='mongodb://localhost:27017',
+    parser.add_argument('-H', '--host', type=str,
+                        default=connection.DEFAULT_HOST,
                         help='a mongodb:// URI for the database')
     parser.add_argument('-d', '--database', type=str,
                         default='meteor',
                         help='the MongoDB database name to monitor')
+    parser.add_argument('-w', '--workers', type=int,
+                        default=None,
+                        help='the number of worker processes to parse logs')
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=DEFAULT_JOBS,
+                        help='the number of datasets to process concurrently')
+    parser.add_argument('--window', type=float,
+                        default=COALESCE_WINDOW,
+                        help='the seconds to wait for further dataset updates')
+    parser.add_argument('--pool-size', type=int,
+                        default=connection.DEFAULT_POOL_SIZE,
+                        help='the maximum number of database connections')
+    parser.add_argument('--timeout', type=int,
+                        default=connection.DEFAULT_TIMEOUT,
+                        help='the milliseconds to wait for a connection')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='use the asyncio server (requires motor)')
     args = parser.parse_args()
 
     # Call the internal server method with these arguments.
-    server(host=args.host, database=args.database)
+    if args.asyncio:
+        from . import async_db
+        run_server = async_db.server
+    else:
+        run_server = server
+    run_server(host=args.host, database=args.database, workers=args.workers,
+               jobs=args.jobs, window=args.window,
+               max_pool_size=args.pool_size, timeout=args.timeout)
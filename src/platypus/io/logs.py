@@ -3,21 +3,48 @@
 Module for handling the import of various logfiles into numpy arrays.
 Copyright 2015. Platypus LLC. All rights reserved.
 """
+import array
+import calendar
 import collections
-import datetime
 import logging
 import itertools
 import json
+import mmap
+import multiprocessing
+import numpy
+import os
 import pandas
 import re
 import six
+from . import cache as _cache
 from ..util.conversions import (
+    PoseOutlierFilter,
     add_ll_to_pose_dataframe,
     remove_outliers_from_pose_dataframe,
 )
 
 logger = logging.getLogger(__name__)
 
+# Use the fastest available JSON decoder for parsing log messages.
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    try:
+        from ujson import loads as _json_loads
+    except ImportError:
+        from json import loads as _json_loads
+
+PARSER_VERSION = '2'
+"""
+Defines the version of the parsed output of these readers.  This must be
+changed whenever the parsed output changes, to invalidate cached logs.
+"""
+
+_NAN = float('nan')
+"""
+Defines the value used to fill missing fields of a record.
+"""
+
 _REGEX_FLOAT = r"[-+]?[0-9]*\.?[0-9]+"
 """
 Defines the regex string for a floating point decimal number.
@@ -44,6 +71,16 @@ Defines a regular expression that represents a log record of the form:
 format is used in v4.0.0 vehicle log entries.
 """
 
+_REGEX_TIME_V4_0_0 = re.compile(
+    r"^(?P<hour>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2}),"
+    r"(?P<millis>\d+)$")
+"""
+Defines a regular expression that represents the time field of a log record
+of the form: 'HH:MM:SS,FFF'.  The time is not used, as records are timed by
+their timestamp, but records with an invalid time are rejected as malformed.
+This format is used in v4.0.0 vehicle log entries.
+"""
+
 _REGEX_POSE_V4_0_0 = re.compile(
     r"^POSE: \{{"
     r"(?P<easting>{number}), (?P<northing>{number}), (?P<altitude>{number}), "
@@ -74,6 +111,45 @@ Defines a regular expression that represents generic sensor record of the form:
 This format is used in v4.2.0 vehicle log entries.
 """
 
+_JSON_PREFIXES_v4_1_0 = ('{"pose":', '{"sensor":')
+"""
+Defines the prefixes of the JSON log messages that are parsed from v4.1.0
+logfiles.  Messages with other prefixes are skipped without being decoded.
+"""
+
+_JSON_PREFIXES_v4_2_0 = ('{"pose":', '{"sensor":', '{"date":', '{"time":')
+"""
+Defines the prefixes of the JSON log messages that are parsed from v4.2.0
+logfiles.  Messages with other prefixes are skipped without being decoded.
+"""
+
+_SCAN_PATTERNS = {
+    version: re.compile(b'|'.join(re.escape(p.encode('utf-8'))
+                                  for p in prefixes))
+    for version, prefixes in six.viewitems({
+        '4.0.0': (' POSE: ', ' ES2: ', ' SENSOR'),
+        '4.1.0': _JSON_PREFIXES_v4_1_0,
+        '4.2.0': _JSON_PREFIXES_v4_2_0,
+    })
+}
+"""
+Defines patterns matching the records that are parsed from each version of
+logfile.  When scanning memory-mapped logfiles, only lines that contain one
+of these patterns are decoded and passed to the parser.
+"""
+
+_SCAN_PATTERN_DATE_v4_2_0 = re.compile(b'\\{"date":|\\{"time":')
+"""
+Defines a pattern matching the date records in v4.2.0 logfiles.
+"""
+
+_DATA_FIELDS_v4_0_0 = {
+    'es2': ('ec', 'temperature'),
+}
+"""
+Defines dataframe field names for known data types in v4.0.0 logfiles.
+"""
+
 _DATA_FIELDS_v4_1_0 = {
     'BATTERY': ('voltage', 'm0_current', 'm1_current'),
     'ES2': ('ec', 'temp'),
@@ -95,89 +171,332 @@ Defines dataframe field names for known data types in v4.2.0 logfiles.
 """
 
 
-def read_v4_2_0(logfile):
+_POSE_FIELDS = ('easting', 'northing', 'altitude', 'zone', 'hemi')
+"""
+Defines dataframe field names for vehicle poses in all logfiles.
+"""
+
+_POSE_DTYPES = ('f8', 'f8', 'f8', 'i8', '?')
+"""
+Defines the numpy dtypes of the vehicle pose fields in all logfiles.
+"""
+
+try:
+    array.array('q')
+    _TYPECODE_INT64 = 'q'
+except ValueError:
+    # Python 2 does not support 'long long' arrays, but 'long' is 64-bit.
+    _TYPECODE_INT64 = 'l'
+
+_TYPECODES = {
+    'f8': 'd',
+    'i8': _TYPECODE_INT64,
+    '?': 'B',
+}
+"""
+Defines the array typecodes used to store columns of each numpy dtype.
+"""
+
+
+class _RecordBuffer(object):
     """
-    Reads text logs from a Platypus vehicle server logfile.
+    Accumulates timestamped records of a single type as typed columns.
+
+    Each field is stored in a growable `array.array` rather than as a boxed
+    Python object per value, and the timestamps are stored as integer
+    milliseconds since the epoch.  Records with additional values add new
+    floating point columns, and missing values are filled with NaN.  If a
+    value cannot be stored in its column's type, that column falls back to
+    a list of Python objects.
+    """
+    def __init__(self, dtypes=()):
+        self.times = array.array(_TYPECODE_INT64)
+        self.dtypes = list(dtypes)
+        self.columns = [array.array(_TYPECODES[dtype]) for dtype in dtypes]
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, time_ms, values):
+        """
+        Appends a record to the buffer.
+
+        :param time_ms: timestamp of the record in milliseconds since epoch
+        :type  time_ms: int
+        :param values: the values of each field of the record
+        :type  values: list
+        """
+        # Add new columns for any values beyond the existing fields.
+        for _ in range(len(self.columns), len(values)):
+            self.dtypes.append('f8')
+            self.columns.append(array.array('d', [_NAN]) * len(self.times))
+
+        self.times.append(time_ms)
+        for i, column in enumerate(self.columns):
+            value = values[i] if i < len(values) else _NAN
+            try:
+                column.append(value)
+            except (TypeError, OverflowError):
+                self.dtypes[i] = 'O'
+                self.columns[i] = list(column)
+                self.columns[i].append(value)
+
+    def to_dataframe(self, fields=None):
+        """
+        Converts the accumulated records to a time-indexed pandas DataFrame.
+
+        :param fields: (optional) names of the fields of each record,
+                       otherwise fields are numbered starting from 1
+        :type  fields: [str]
+        :returns: a DataFrame with a `time` index and a column per field
+        :rtype: pandas.DataFrame
+        """
+        if fields is None:
+            fields = range(1, len(self.columns) + 1)
+        elif len(fields) != len(self.columns):
+            raise ValueError("Expected {:d} fields, but records have {:d}."
+                             .format(len(fields), len(self.columns)))
+
+        # Times are stored in milliseconds, but are indexed in nanoseconds so
+        # that the index has the same unit regardless of the pandas version.
+        index = pandas.DatetimeIndex(
+            numpy.frombuffer(self.times, dtype=self.times.typecode)
+                 .astype('datetime64[ms]').astype('datetime64[ns]'),
+            name='time')
+
+        values = collections.OrderedDict()
+        for field, dtype, column in zip(fields, self.dtypes, self.columns):
+            if dtype == 'O':
+                values[field] = column
+            else:
+                values[field] = (numpy.frombuffer(column,
+                                                  dtype=column.typecode)
+                                      .view(dtype))
+        return pandas.DataFrame(values, index=index, columns=list(fields))
+
+
+def _new_buffer(record_type):
+    """
+    Creates an empty record buffer for the specified record type.
+
+    :param record_type: the type of record that will be stored
+    :type  record_type: str
+    :returns: a record buffer with appropriately typed columns
+    :rtype: _RecordBuffer
+    """
+    if record_type == 'pose':
+        return _RecordBuffer(_POSE_DTYPES)
+    else:
+        return _RecordBuffer()
+
+
+def _to_dataframes(buffers, data_fields):
+    """
+    Converts buffers of parsed records into labelled pandas DataFrames.
+
+    Pose data is labelled, but is not cleaned up or converted to Lat/Long.
+
+    :param buffers: buffers of parsed records for each type
+    :type  buffers: {str: _RecordBuffer}
+    :param data_fields: dataframe field names for known data types
+    :type  data_fields: {str: (str)}
+    :returns: a dict containing a DataFrame for each type
+    :rtype: {str: pandas.DataFrame}
+    """
+    # For known types, label the data.
+    data = {}
+
+    for k, v in six.viewitems(buffers):
+        if k == 'pose':
+            data['pose'] = v.to_dataframe(_POSE_FIELDS)
+        elif k in data_fields:
+            data[k] = v.to_dataframe(data_fields[k])
+        else:
+            # For sensor types that we don't know how to handle,
+            # provide an unlabeled data frame.
+            data[k] = v.to_dataframe()
+
+    return data
+
+
+def _decode_json(message):
+    """
+    Decodes a JSON log message from a v4.1.0 or v4.2.0 logfile.
+
+    :param message: the JSON log message
+    :type  message: str
+    :returns: the decoded JSON log entry
+    :rtype: dict
+    """
+    try:
+        return _json_loads(message)
+    except ValueError as e:
+        raise ValueError(
+            "Aborted after invalid JSON log message '{:s}': {:s}"
+            .format(message, str(e)))
+
+
+def _records_json(entry, timestamp):
+    """
+    Extracts records from a JSON log entry of a v4.1.0 or v4.2.0 logfile.
+
+    :param entry: the decoded JSON log entry
+    :type  entry: dict
+    :param timestamp: timestamp of the entry in milliseconds since epoch
+    :type  timestamp: int
+    :returns: an iterator over (type, timestamp, [values...]) tuples
+    :rtype: iterator of (str, int, list)
+    """
+    for k, v in six.viewitems(entry):
+        if k == 'pose':
+            zone = int(v['zone'][:-5])
+            hemi = v['zone'].endswith('North')
+            yield k, timestamp, [
+                v['p'][0],
+                v['p'][1],
+                v['p'][2],
+                zone, hemi
+            ]
+        elif k == 'sensor':
+            yield v['type'], timestamp, v['data']
+        else:
+            pass
+
+
+def _records_v4_2_0(logfile, start_time=0):
+    """
+    Parses records from a Platypus vehicle server v4.2.0 logfile.
+
+    The active start time is tracked across the whole logfile, so records are
+    correctly timestamped regardless of how the generator is consumed.
 
     :param logfile: the logfile as an iterable
     :type  logfile: python file-like
-    :returns: a dict containing the data from this logfile
-    :rtype: {str: pandas.DataFrame}
+    :param start_time: the start time in milliseconds since epoch that is
+                       active at the beginning of the logfile
+    :type  start_time: int
+    :returns: an iterator over (type, timestamp, [values...]) tuples,
+              where timestamps are in milliseconds since epoch
+    :rtype: iterator of (str, int, list)
     """
-    raw_data = collections.defaultdict(list)
-    start_time = datetime.datetime.utcfromtimestamp(0)
 
     for line in logfile:
         # Extract each line fron the logfile and convert the timestamp.
         time_offset_ms, level, message = line.split('\t', 2)
 
+        # Skip log entries that would not be used without decoding them.
+        if not message.startswith(_JSON_PREFIXES_v4_2_0):
+            continue
+
         # Compute the timestamp for each log entry.
-        time_offset = datetime.timedelta(milliseconds=int(time_offset_ms))
+        time_offset = int(time_offset_ms)
         timestamp = start_time + time_offset
 
         # Try to parse the log as a JSON object.
-        try:
-            entry = json.loads(message)
-        except ValueError as e:
-            raise ValueError(
-                "Aborted after invalid JSON log message '{:s}': {:s}"
-                .format(message, e))
+        entry = _decode_json(message)
 
         # If the line is a datetime, compute subsequent timestamps from this.
         # We assume that "date" and "time" are always together in the entry.
         if 'date' in entry:
-            timestamp = datetime.datetime.utcfromtimestamp(
-                entry['time'] / 1000.)
+            timestamp = int(entry['time'])
             start_time = timestamp - time_offset
 
         # Extract appropriate data from each entry.
-        for k, v in six.viewitems(entry):
-            if k == 'pose':
-                zone = int(v['zone'][:-5])
-                hemi = v['zone'].endswith('North')
-                raw_data[k].append([
-                    timestamp,
-                    v['p'][0],
-                    v['p'][1],
-                    v['p'][2],
-                    zone, hemi
-                ])
-            elif k == 'sensor':
-                raw_data[v['type']].append(
-                    [timestamp] + v['data']
-                )
-            else:
-                pass
+        for record in _records_json(entry, timestamp):
+            yield record
 
-    # Convert the list data to pandas DataFrames and return them.
-    # For known types, clean up and label the data.
-    data = {}
 
-    for k, v in six.viewitems(raw_data):
-        if k == 'pose':
-            data['pose'] = add_ll_to_pose_dataframe(
-                remove_outliers_from_pose_dataframe(
-                    pandas.DataFrame(v, columns=('time',
-                                                 'easting', 'northing',
-                                                 'altitude', 'zone', 'hemi'))
-                          .set_index('time')
-                )
-            )
-        elif k in _DATA_FIELDS_v4_2_0:
-            data[k] = (pandas.DataFrame(
-                v, columns=('time',) + _DATA_FIELDS_v4_2_0[k])
-                .set_index('time'))
-        else:
-            # For sensor types that we don't know how to handle,
-            # provide an unlabeled data frame.
-            data[k] = (pandas.DataFrame(v)
-                       .rename(columns={0: 'time'}, copy=False)
-                       .set_index('time'))
+def iter_v4_2_0(logfile, chunk_rows=100000, remove_outliers=False):
+    """
+    Iteratively reads text logs from a Platypus vehicle server logfile.
+
+    Records are yielded in chunks of at most `chunk_rows` records in total,
+    so that arbitrarily long logfiles can be processed in bounded memory.
+    Pose data in each chunk has Lat/Long added.  Since the median pose of the
+    whole logfile is unknown, outliers are only removed if requested, using
+    a running approximation of the median pose (see `PoseOutlierFilter`).
+
+    :param logfile: the logfile as an iterable
+    :type  logfile: python file-like
+    :param chunk_rows: the maximum number of records in each chunk
+    :type  chunk_rows: int
+    :param remove_outliers: whether to remove outliers from pose data
+    :type  remove_outliers: bool
+    :returns: an iterator over dicts containing data from this logfile
+    :rtype: iterator of {str: pandas.DataFrame}
+    """
+    if chunk_rows < 1:
+        raise ValueError("Chunks must contain at least one record.")
+    outlier_filter = PoseOutlierFilter() if remove_outliers else None
+
+    def to_chunk(buffers):
+        data = _to_dataframes(buffers, _DATA_FIELDS_v4_2_0)
+        if 'pose' in data:
+            if outlier_filter is not None:
+                data['pose'] = outlier_filter(data['pose'])
+            data['pose'] = add_ll_to_pose_dataframe(data['pose'])
+        return data
+
+    buffers = {}
+    num_rows = 0
+
+    for k, timestamp, values in _records_v4_2_0(logfile):
+        if k not in buffers:
+            buffers[k] = _new_buffer(k)
+        buffers[k].append(timestamp, values)
+        num_rows += 1
+
+        if num_rows >= chunk_rows:
+            yield to_chunk(buffers)
+            buffers = {}
+            num_rows = 0
+
+    # Return any remaining records as a final partial chunk.
+    if num_rows > 0:
+        yield to_chunk(buffers)
+
+
+def _clean(data):
+    """
+    Cleans up the pose data parsed from a logfile.
 
+    Outliers are removed from the poses, and Lat/Long are added to them.
+
+    :param data: a dict containing the data parsed from a logfile
+    :type  data: {str: pandas.DataFrame}
+    :returns: the same dict, containing the cleaned up pose data
+    :rtype: {str: pandas.DataFrame}
+    """
+    if 'pose' in data:
+        data['pose'] = add_ll_to_pose_dataframe(
+            remove_outliers_from_pose_dataframe(data['pose']))
     return data
 
 
-def read_v4_1_0(logfile):
+def _parse_v4_2_0(logfile, start_time=0):
+    """
+    Parses text logs from a Platypus vehicle server v4.2.0 logfile.
+
+    :param logfile: the logfile as an iterable
+    :type  logfile: python file-like
+    :param start_time: the start time in milliseconds since epoch that is
+                       active at the beginning of the logfile
+    :type  start_time: int
+    :returns: a dict containing the uncleaned data from this logfile
+    :rtype: {str: pandas.DataFrame}
+    """
+    buffers = {}
+    for k, timestamp, values in _records_v4_2_0(logfile, start_time):
+        if k not in buffers:
+            buffers[k] = _new_buffer(k)
+        buffers[k].append(timestamp, values)
+
+    # Convert the buffered data to pandas DataFrames and return them.
+    # For known types, label the data.
+    return _to_dataframes(buffers, _DATA_FIELDS_v4_2_0)
+
+
+def read_v4_2_0(logfile):
     """
     Reads text logs from a Platypus vehicle server logfile.
 
@@ -186,84 +505,129 @@ def read_v4_1_0(logfile):
     :returns: a dict containing the data from this logfile
     :rtype: {str: pandas.DataFrame}
     """
-    raw_data = collections.defaultdict(list)
-    start_time = datetime.datetime.utcfromtimestamp(0)
+    return _clean(_parse_v4_2_0(logfile))
+
+
+def _parse_v4_1_0(logfile):
+    """
+    Parses text logs from a Platypus vehicle server v4.1.0 logfile.
+
+    :param logfile: the logfile as an iterable
+    :type  logfile: python file-like
+    :returns: a dict containing the uncleaned data from this logfile
+    :rtype: {str: pandas.DataFrame}
+    """
+    buffers = {}
 
     for line in logfile:
         # Extract each line fron the logfile and convert the timestamp.
         time_offset_ms, date, message = line.split(' ', 2)
 
+        # Skip log entries that would not be used without decoding them.
+        if not message.startswith(_JSON_PREFIXES_v4_1_0):
+            continue
+
         # Compute the timestamp for each log entry.
-        time_offset = datetime.timedelta(milliseconds=int(time_offset_ms))
-        timestamp = start_time + time_offset
+        timestamp = int(time_offset_ms)
 
         # Try to parse the log as a JSON object.
-        try:
-            entry = json.loads(message)
-        except ValueError as e:
-            raise ValueError(
-                "Aborted after invalid JSON log message '{:s}': {:s}"
-                .format(message, e))
+        entry = _decode_json(message)
 
         # Extract appropriate data from each entry.
-        for k, v in six.viewitems(entry):
-            if k == 'pose':
-                zone = int(v['zone'][:-5])
-                hemi = v['zone'].endswith('North')
-                raw_data[k].append([
-                    timestamp,
-                    v['p'][0],
-                    v['p'][1],
-                    v['p'][2],
-                    zone, hemi
-                ])
-            elif k == 'sensor':
-                raw_data[v['type']].append(
-                    [timestamp] + v['data']
-                )
-            else:
-                pass
+        for k, timestamp, values in _records_json(entry, timestamp):
+            if k not in buffers:
+                buffers[k] = _new_buffer(k)
+            buffers[k].append(timestamp, values)
 
-    # Convert the list data to pandas DataFrames and return them.
-    # For known types, clean up and label the data.
-    data = {}
+    # Convert the buffered data to pandas DataFrames and return them.
+    # For known types, label the data.
+    return _to_dataframes(buffers, _DATA_FIELDS_v4_1_0)
 
-    for k, v in six.viewitems(raw_data):
-        if k == 'pose':
-            data['pose'] = add_ll_to_pose_dataframe(
-                remove_outliers_from_pose_dataframe(
-                    pandas.DataFrame(v, columns=('time',
-                                                 'easting', 'northing',
-                                                 'altitude', 'zone', 'hemi'))
-                          .set_index('time')
-                )
-            )
-        elif k in _DATA_FIELDS_v4_1_0:
-            data[k] = (pandas.DataFrame(
-                v, columns=('time',) + _DATA_FIELDS_v4_1_0[k])
-                .set_index('time'))
-        else:
-            # For sensor types that we don't know how to handle,
-            # provide an unlabeled data frame.
-            data[k] = (pandas.DataFrame(v)
-                       .rename(columns={0: 'time'}, copy=False)
-                       .set_index('time'))
 
-    return data
+def read_v4_1_0(logfile):
+    """
+    Reads text logs from a Platypus vehicle server logfile.
+
+    :param logfile: the logfile as an iterable
+    :type  logfile: python file-like
+    :returns: a dict containing the data from this logfile
+    :rtype: {str: pandas.DataFrame}
+    """
+    return _clean(_parse_v4_1_0(logfile))
 
 
-def read_v4_0_0(logfile, filename):
+def _parse_pose_v4_0_0(message):
     """
-    Reads text logs from a Platypus vehicle server logfile.
+    Parses a POSE message from a v4.0.0 logfile.
+
+    :param message: the message of the log record
+    :type  message: str
+    :returns: the record type and values, or None if the message is invalid
+    :rtype: (str, list)
+    """
+    m_pose = _REGEX_POSE_V4_0_0.match(message)
+    if m_pose:
+        return 'pose', [float(m_pose.group('easting')),
+                        float(m_pose.group('northing')),
+                        float(m_pose.group('altitude')),
+                        int(m_pose.group('zone')),
+                        m_pose.group('hemi') == "North"]
+
+
+def _parse_es2_v4_0_0(message):
+    """
+    Parses an ES2 message from a v4.0.0 logfile.
+
+    :param message: the message of the log record
+    :type  message: str
+    :returns: the record type and values, or None if the message is invalid
+    :rtype: (str, list)
+    """
+    m_es2 = _REGEX_ES2_V4_0_0.match(message)
+    if m_es2:
+        return 'es2', [float(m_es2.group('ec')),
+                       float(m_es2.group('temp'))]
+
+
+def _parse_sensor_v4_0_0(message):
+    """
+    Parses a generic SENSOR<n> message from a v4.0.0 logfile.
+
+    :param message: the message of the log record
+    :type  message: str
+    :returns: the record type and values, or None if the message is invalid
+    :rtype: (str, list)
+    """
+    m_sensor = _REGEX_SENSOR_V4_0_0.match(message)
+    if m_sensor:
+        # Extract the sensor type and the data.
+        return m_sensor.group('type'), [
+            float(datum) for datum in m_sensor.group('data').split(" ")]
+
+
+_MESSAGE_PARSERS_V4_0_0 = {
+    'POSE:': _parse_pose_v4_0_0,
+    'ES2:': _parse_es2_v4_0_0,
+    'SENSOR': _parse_sensor_v4_0_0,
+}
+"""
+Defines the parsers of v4.0.0 log messages, keyed by their leading token.
+All generic sensor tokens of the form 'SENSOR<n>:' are keyed as 'SENSOR'.
+"""
+
+
+def _parse_v4_0_0(logfile, filename):
+    """
+    Parses text logs from a Platypus vehicle server v4.0.0 logfile.
 
     :param logfile: the logfile as an iterable
     :type  logfile: python file-like
     :param filename: the name of the logfile containing the start time.
     :type  filename: str
-    :returns: a dict containing the data from this logfile
+    :returns: a dict containing the uncleaned data from this logfile
     :rtype: {str: pandas.DataFrame}
     """
-    data_pose = []
+    data_pose = _new_buffer('pose')
     data_sensors = {}
 
     # In v4.0.0 files, extract start time from the filename.
@@ -271,97 +635,72 @@ def read_v4_0_0(logfile, filename):
     if not m:
         raise ValueError(
             "v4.0.0 log files must be named 'airboat_<date>_<time>.txt'.")
-    start = datetime.datetime(int(m.group('year')),
-                              int(m.group('month')),
-                              int(m.group('day')),
-                              int(m.group('hour')),
-                              int(m.group('minute')),
-                              int(m.group('second')))
+    start = calendar.timegm((int(m.group('year')),
+                             int(m.group('month')),
+                             int(m.group('day')),
+                             int(m.group('hour')),
+                             int(m.group('minute')),
+                             int(m.group('second')))) * 1000
 
     for line in logfile:
-        # First, parse out the timestamp:
-        m = _REGEX_LOGRECORD_V4_0_0.match(line)
-        if not m:
+        # Split out the timestamp, time and message of the log record.
+        components = line.split(' ', 2)
+        if (len(components) < 3 or not components[0].isdigit() or
+                not _REGEX_TIME_V4_0_0.match(components[1])):
             logger.warning("Failed to parse log record: {:s}"
                            .format(line))
             continue
-
-        # Construct log record timestamp from start time and offset.
-        offset = datetime.timedelta(milliseconds=int(m.group('timestamp')))
-        timestamp = start + offset
-        message = m.group('message')
-
-        # Check if this is a POSE message.
-        m_pose = _REGEX_POSE_V4_0_0.match(message)
-        if m_pose:
-            data_pose.append([timestamp,
-                              float(m_pose.group('easting')),
-                              float(m_pose.group('northing')),
-                              float(m_pose.group('altitude')),
-                              int(m_pose.group('zone')),
-                              m_pose.group('hemi') == "North"])
+        message = components[2]
+
+        # Find the leading token of the message, and skip unknown messages
+        # without parsing them any further.
+        token = message.partition(' ')[0]
+        if token.startswith('SENSOR'):
+            token = 'SENSOR'
+        parse_message = _MESSAGE_PARSERS_V4_0_0.get(token)
+        if parse_message is None:
             continue
 
-        # Check if this is an ES2 message.
-        m_es2 = _REGEX_ES2_V4_0_0.match(message)
-        if m_es2:
-            if 'es2' not in data_sensors:
-                data_sensors['es2'] = []
-            data_sensors['es2'].append([timestamp,
-                                        float(m_es2.group('ec')),
-                                        float(m_es2.group('temp'))])
+        # Parse the message using the parser for its token.
+        record = parse_message(message.rstrip())
+        if record is None:
             continue
+        record_type, values = record
 
-        m_sensor = _REGEX_SENSOR_V4_0_0.match(message)
-        if m_sensor:
-            # Extract the sensor type and the data.
-            type_sensor = m_sensor.group('type')
-            data_sensor = [float(datum)
-                           for datum in m_sensor.group('data').split(" ")]
-
-            # Add the sensor if it does not already exist in the data map.
-            if type_sensor not in data_sensors:
-                data_sensors[type_sensor] = []
-
-            # Insert the new sensor reading into the appropriate list.
-            data_sensor.insert(0, timestamp)
-            data_sensors[m_sensor.group('type')].append(data_sensor)
-            continue
+        # Construct log record timestamp from start time and offset.
+        timestamp = start + int(components[0])
 
-    # Convert the list data to pandas DataFrames and return them.
-    # For known types, clean up and label the data.
-    data = {}
+        # Insert the record into the appropriate buffer.
+        if record_type == 'pose':
+            data_pose.append(timestamp, values)
+        else:
+            if record_type not in data_sensors:
+                data_sensors[record_type] = _new_buffer(record_type)
+            data_sensors[record_type].append(timestamp, values)
 
-    data['pose'] = add_ll_to_pose_dataframe(
-        remove_outliers_from_pose_dataframe(
-            pandas.DataFrame(data_pose,
-                             columns=('time',
-                                      'easting', 'northing',
-                                      'altitude', 'zone', 'hemi'))
-                  .set_index('time')
-        )
-    )
-
-    if 'es2' in data_sensors:
-        data['es2'] = pandas.DataFrame(
-            data_sensors['es2'], columns=('time', 'ec', 'temperature')
-        ).set_index('time')
-
-    # For sensor types that we don't know how to handle,
-    # provide an unlabeled data frame.
-    unlabeled_sensor_data = {
-        sensor_type: pandas.DataFrame(sensor_value)
-                           .rename(columns={0: 'time'}, copy=False)
-                           .set_index('time')
-        for sensor_type, sensor_value in six.viewitems(data_sensors)
-        if sensor_type not in data
-    }
-    data.update(unlabeled_sensor_data)
+    # Convert the buffered data to pandas DataFrames and return them.
+    # For known types, label the data.
+    data = _to_dataframes(data_sensors, _DATA_FIELDS_v4_0_0)
+    data['pose'] = data_pose.to_dataframe(_POSE_FIELDS)
 
     # Return merged data structure.
     return data
 
 
+def read_v4_0_0(logfile, filename):
+    """
+    Reads text logs from a Platypus vehicle server logfile.
+
+    :param logfile: the logfile as an iterable
+    :type  logfile: python file-like
+    :param filename: the name of the logfile containing the start time.
+    :type  filename: str
+    :returns: a dict containing the data from this logfile
+    :rtype: {str: pandas.DataFrame}
+    """
+    return _clean(_parse_v4_0_0(logfile, filename))
+
+
 def load_v4_2_0(filename, *args, **kwargs):
     """
     Loads a log from a v4.2.0 server from a filename.
@@ -401,6 +740,268 @@ def load_v4_0_0(filename, *args, **kwargs):
         return read_v4_0_0(logfile, filename)
 
 
+def _detect_version(line):
+    """
+    Detects the version of a logfile from its first line.
+
+    :param line: the first line of the logfile
+    :type  line: str
+    :returns: the version of the logfile
+    :rtype: str
+    """
+    components = re.split("[ \t]", line, 2)
+
+    # Depending on the format of the first line, pick an appropriate version.
+    if len(components[1]) == 1:
+        # Version 4.2.0 files have a single-character log-level.
+        return '4.2.0'
+    else:
+        try:
+            # Version 4.1.0 logs have JSON messages.
+            json.loads(components[2])
+            return '4.1.0'
+        except ValueError:
+            # If all else fails, use the version 4.0.0 parser.
+            return '4.0.0'
+
+
+def _parse_version(version, logfile, filename=None, start_time=0):
+    """
+    Parses text logs from a Platypus vehicle server logfile of a known version.
+
+    :param version: the version of the logfile
+    :type  version: str
+    :param logfile: the logfile as an iterable
+    :type  logfile: python file-like
+    :param filename: (optional) name of file that was loaded
+    :type  filename: str
+    :param start_time: (optional) the start time in milliseconds since epoch
+                       that is active at the beginning of a v4.2.0 logfile
+    :type  start_time: int
+    :returns: a dict containing the uncleaned data from this logfile
+    :rtype: {str: pandas.DataFrame}
+    """
+    if version == '4.2.0':
+        return _parse_v4_2_0(logfile, start_time)
+    elif version == '4.1.0':
+        return _parse_v4_1_0(logfile)
+    else:
+        return _parse_v4_0_0(logfile, filename=filename)
+
+
+def _scan_lines(buf, pattern):
+    """
+    Scans a buffer for the lines that contain a pattern.
+
+    The pattern is searched for directly in the buffer, so lines that do not
+    contain it are skipped without being split or decoded.
+
+    :param buf: the buffer to scan, such as a memory-mapped file
+    :type  buf: bytes or mmap.mmap
+    :param pattern: the compiled regular expression to search for
+    :type  pattern: re.RegexObject
+    :returns: an iterator over the position and content of each matching
+              line, in order
+    :rtype: iterator of (int, bytes)
+    """
+    find, rfind, size = buf.find, buf.rfind, len(buf)
+
+    end = 0
+    for match in pattern.finditer(buf):
+        # Skip further matches within a line that was already returned.
+        position = match.start()
+        if position < end:
+            continue
+
+        # Return the entire line that contains this match.
+        start = rfind(b'\n', 0, position) + 1
+        end = find(b'\n', position)
+        end = size if end < 0 else end + 1
+        yield start, buf[start:end]
+
+
+def _detect_version_mmap(buf):
+    """
+    Detects the version of a memory-mapped logfile from its first line.
+
+    :param buf: the memory-mapped logfile
+    :type  buf: mmap.mmap
+    :returns: the version of the logfile
+    :rtype: str
+    """
+    end = buf.find(b'\n')
+    return _detect_version(buf[:end if end >= 0 else len(buf)]
+                           .decode('utf-8'))
+
+
+def _load_mmap(filename):
+    """
+    Loads a log from a Platypus vehicle server using a memory-mapped file.
+
+    :param filename: path to a log file
+    :type  filename: string
+    :returns: a dict containing the data from this logfile
+    :rtype: {str: pandas.DataFrame}
+    """
+    with open(filename, 'rb') as logfile:
+        buf = mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            version = _detect_version_mmap(buf)
+
+            # Decode and parse only the lines containing relevant records.
+            pattern = _SCAN_PATTERNS[version]
+            lines = (line.decode('utf-8')
+                     for _, line in _scan_lines(buf, pattern))
+            return _clean(_parse_version(version, lines, filename=filename))
+        finally:
+            buf.close()
+
+
+def _split_ranges(buf, num_ranges):
+    """
+    Splits a logfile into byte ranges of similar size that contain whole lines.
+
+    :param buf: the memory-mapped logfile
+    :type  buf: mmap.mmap
+    :param num_ranges: the maximum number of ranges to split the logfile into
+    :type  num_ranges: int
+    :returns: the [start, end) byte offsets of each non-empty range
+    :rtype: [(int, int)]
+    """
+    size = len(buf)
+    ranges = []
+
+    start = 0
+    for i in range(1, num_ranges + 1):
+        # Move the end of each range to the beginning of the next line.
+        end = buf.find(b'\n', max(start, size * i // num_ranges, 1) - 1)
+        end = size if end < 0 or i == num_ranges else end + 1
+        if end > start:
+            ranges.append((start, end))
+        start = end
+
+    return ranges
+
+
+def _start_times_v4_2_0(buf, positions, start_time=0):
+    """
+    Finds the start times that are active at positions in a v4.2.0 logfile.
+
+    Only the lines that contain date records are decoded, so this is much
+    faster than parsing the preceding parts of the logfile.
+
+    :param buf: the memory-mapped logfile, or a part of a logfile
+    :type  buf: mmap.mmap or bytes
+    :param positions: sorted byte offsets of the beginnings of lines
+    :type  positions: [int]
+    :param start_time: the start time in milliseconds since epoch that is
+                       active at the beginning of the buffer
+    :type  start_time: int
+    :returns: the start time in milliseconds since epoch at each position
+    :rtype: [int]
+    """
+    start_times = []
+
+    positions = iter(positions)
+    position = next(positions, None)
+    for line_start, line in _scan_lines(buf, _SCAN_PATTERN_DATE_v4_2_0):
+        # Record the start time for positions before this record.
+        while position is not None and position <= line_start:
+            start_times.append(start_time)
+            position = next(positions, None)
+        if position is None:
+            break
+
+        # Compute the start time in the same way as the parser.
+        time_offset_ms, level, message = line.decode('utf-8').split('\t', 2)
+        entry = _decode_json(message)
+        if 'date' in entry:
+            start_time = int(entry['time']) - int(time_offset_ms)
+
+    # Record the start time for positions after the last date record.
+    while position is not None:
+        start_times.append(start_time)
+        position = next(positions, None)
+
+    return start_times
+
+
+def _parse_range(filename, version, start, end, start_time):
+    """
+    Parses the lines within a byte range of a logfile.
+
+    This is a module-level function so that it can be run in a worker process.
+
+    :param filename: path to a log file
+    :type  filename: str
+    :param version: the version of the logfile
+    :type  version: str
+    :param start: the byte offset of the beginning of the range
+    :type  start: int
+    :param end: the byte offset of the end of the range
+    :type  end: int
+    :param start_time: the start time in milliseconds since epoch that is
+                       active at the beginning of the range
+    :type  start_time: int
+    :returns: a dict containing the uncleaned data from this range
+    :rtype: {str: pandas.DataFrame}
+    """
+    with open(filename, 'rb') as logfile:
+        logfile.seek(start)
+        lines = logfile.read(end - start).decode('utf-8').splitlines(True)
+    return _parse_version(version, lines,
+                          filename=filename, start_time=start_time)
+
+
+def _load_parallel(filename, workers):
+    """
+    Loads a log from a Platypus vehicle server using several processes.
+
+    The logfile is split into byte ranges that are parsed concurrently.  For
+    v4.2.0 logfiles, the start time that is active at the beginning of each
+    range is found beforehand by scanning the earlier ranges for dates.
+
+    :param filename: path to a log file
+    :type  filename: string
+    :param workers: number of worker processes, or None for the number of CPUs
+    :type  workers: int
+    :returns: a dict containing the data from this logfile
+    :rtype: {str: pandas.DataFrame}
+    """
+    workers = workers or multiprocessing.cpu_count()
+
+    with open(filename, 'rb') as logfile:
+        buf = mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            version = _detect_version_mmap(buf)
+            ranges = _split_ranges(buf, workers)
+            if version == '4.2.0':
+                start_times = _start_times_v4_2_0(
+                    buf, [start for start, _ in ranges])
+            else:
+                start_times = [0] * len(ranges)
+        finally:
+            buf.close()
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = [pool.apply_async(_parse_range, (filename, version,
+                                                   start, end, start_time))
+                   for (start, end), start_time in zip(ranges, start_times)]
+        range_data = [result.get() for result in results]
+    finally:
+        pool.terminate()
+        pool.join()
+
+    # Stitch together the data from each range in order.
+    frames = collections.defaultdict(list)
+    for data in range_data:
+        for k, v in six.viewitems(data):
+            frames[k].append(v)
+
+    return _clean({k: pandas.concat(v) for k, v in six.viewitems(frames)})
+
+
 def read(logfile, filename=None):
     """
     Reads text logs from a Platypus vehicle server logfile.
@@ -415,34 +1016,192 @@ def read(logfile, filename=None):
     :rtype: {str: numpy.recarray}
     """
     # Peek at the first line of the file.
-    peek, logfile = itertools.tee(logfile)
-    line = next(peek)
-    components = re.split("[ \t]", line, 2)
+    # (The line is chained back on, rather than using `itertools.tee`, so
+    # that lines are not all kept in memory by the peeking iterator.)
+    logfile = iter(logfile)
+    line = next(logfile)
+    logfile = itertools.chain([line], logfile)
 
     # Depending on the format of the first line, pick an appropriate loader.
-    if len(components[1]) == 1:
-        # Version 4.2.0 files have a single-character log-level.
-        return read_v4_2_0(logfile)
-    else:
-        try:
-            # Version 4.1.0 logs have JSON messages.
-            json.loads(components[2])
-            return read_v4_1_0(logfile)
-        except ValueError:
-            # If all else fails, use the version 4.0.0 parser.
-            return read_v4_0_0(logfile, filename=filename)
+    return _clean(_parse_version(_detect_version(line), logfile,
+                                 filename=filename))
 
 
-def load(filename):
+def load(filename, cache=False, memory_map=False, workers=1):
     """
     Loads a log from a Platypus vehicle server from a filename.
 
-    Attempts to auto-detect format from the file.
+    Attempts to auto-detect format from the file.  If requested, parsed logs
+    are cached on disk (see `platypus.io.cache`), so that loading an
+    unchanged log again does not require it to be parsed again.
 
     :param filename: path to a log file
     :type  filename: string
+    :param cache: whether to use the on-disk cache of parsed logs
+    :type  cache: bool
+    :param memory_map: whether to memory-map the file and only decode the
+                       lines that contain relevant records, which is faster
+                       for large logfiles
+    :type  memory_map: bool
+    :param workers: number of worker processes used to parse the logfile,
+                    or None to use the number of CPUs
+    :type  workers: int
     :returns: a dict containing the data from this logfile
     :rtype: {str: numpy.recarray}
     """
-    with open(filename, 'r') as logfile:
-        return read(logfile, filename=filename)
+    if cache:
+        cache_key = _cache.key(filename, PARSER_VERSION)
+        data = _cache.get(cache_key)
+        if data is not None:
+            return data
+
+    # Empty files cannot be memory-mapped, so they are always read normally.
+    is_empty = os.path.getsize(filename) == 0
+
+    if workers != 1 and not is_empty:
+        data = _load_parallel(filename, workers)
+    elif memory_map and not is_empty:
+        data = _load_mmap(filename)
+    else:
+        with open(filename, 'r') as logfile:
+            data = read(logfile, filename=filename)
+
+    # Failing to store the parsed data in the cache does not fail the load.
+    if cache:
+        try:
+            _cache.put(cache_key, data)
+        except (IOError, OSError) as e:
+            logger.warning("Failed to cache logfile '{:s}': {:s}"
+                           .format(filename, str(e)))
+    return data
+
+
+class LogFollower(object):
+    """
+    Follows a logfile that is still being written by a vehicle server.
+
+    Each call to `poll()` parses only the complete lines that were appended
+    to the logfile since the previous call.  The position in the logfile,
+    its version and the active start time are remembered between calls.
+
+    As with `iter_v4_2_0()`, pose data has Lat/Long added, and outliers are
+    only removed if requested, using a running approximation of the median.
+    """
+    def __init__(self, filename, remove_outliers=False):
+        """
+        Creates a follower that starts at the beginning of a logfile.
+
+        :param filename: path to a log file
+        :type  filename: str
+        :param remove_outliers: whether to remove outliers from pose data
+        :type  remove_outliers: bool
+        """
+        self.filename = filename
+        self.remove_outliers = remove_outliers
+        self._reset()
+
+    def _reset(self):
+        """
+        Resets the follower to the beginning of the logfile.
+        """
+        self.offset = 0
+        self.version = None
+        self.start_time = 0
+        self.outlier_filter = PoseOutlierFilter()
+
+    def poll(self):
+        """
+        Reads the records that were appended to the logfile since last polled.
+
+        If the logfile has become shorter, it is assumed to have been replaced
+        and is followed again from its beginning.
+
+        :returns: a dict containing the new data from this logfile
+        :rtype: {str: pandas.DataFrame}
+        """
+        with open(self.filename, 'rb') as logfile:
+            logfile.seek(0, os.SEEK_END)
+            if logfile.tell() < self.offset:
+                logger.warning("Logfile '{:s}' was truncated, restarting."
+                               .format(self.filename))
+                self._reset()
+
+            logfile.seek(self.offset)
+            content = logfile.read()
+
+        # Only parse complete lines, since the last line may still be written.
+        end = content.rfind(b'\n') + 1
+        if end == 0:
+            return {}
+        content = content[:end]
+        lines = content.decode('utf-8').splitlines(True)
+
+        if self.version is None:
+            self.version = _detect_version(lines[0])
+
+        data = _parse_version(self.version, lines, filename=self.filename,
+                              start_time=self.start_time)
+
+        # Remember the position and start time for the next poll.
+        if self.version == '4.2.0':
+            self.start_time, = _start_times_v4_2_0(
+                content, [end], start_time=self.start_time)
+        self.offset += end
+
+        data = {k: v for k, v in six.viewitems(data) if len(v) > 0}
+        if 'pose' in data:
+            if self.remove_outliers:
+                data['pose'] = self.outlier_filter(data['pose'])
+            data['pose'] = add_ll_to_pose_dataframe(data['pose'])
+        return data
+
+
+def _record_groups(df):
+    """
+    Numbers the records of a dataframe so that records with the same time
+    and values have the same number.
+
+    :param df: a dataframe with a time index
+    :type  df: pandas.DataFrame
+    :returns: the number of each record, in order of first appearance
+    :rtype: numpy.ndarray
+    """
+    groups = numpy.zeros(len(df), dtype=numpy.int64)
+    for values in [df.index] + [df[column] for column in df.columns]:
+        codes, uniques = pandas.factorize(values)
+        groups, _ = pandas.factorize(groups * (len(uniques) + 1) + codes + 1)
+    return groups
+
+
+def merge(logs):
+    """
+    Merges the data from several logs into a single time-ordered dataset.
+
+    The data for each type is concatenated once and sorted by time.  Records
+    with the same time and values as a record in an earlier log, such as
+    those that appear in overlapping logs, are only included once, while
+    identical records within a single log are all kept.
+
+    :param logs: the data from each log, as returned by `read()` or `load()`
+    :type  logs: iterable of {str: pandas.DataFrame}
+    :returns: a dict containing the merged data from all of the logs
+    :rtype: {str: pandas.DataFrame}
+    """
+    # Collect all of the frames for each type before concatenating them.
+    frames = collections.defaultdict(list)
+    for data in logs:
+        for k, v in six.viewitems(data):
+            frames[k].append(v)
+
+    merged = {}
+    for k, v in six.viewitems(frames):
+        df = pandas.concat(v)
+
+        # Keep each record only from the first log in which it appears.
+        source = numpy.repeat(numpy.arange(len(v)), [len(f) for f in v])
+        groups = _record_groups(df)
+        _, first = numpy.unique(groups, return_index=True)
+        keep = source == source[first][groups]
+        merged[k] = df[keep].sort_index(kind='mergesort')
+
+    return merged
@@ -3,8 +3,31 @@
 Module containing utility conversion functions.
 Copyright 2015. Platypus LLC. All rights reserved.
 """
+import logging
+import numpy
+import scipy.spatial
+import six
 import utm
 
+logger = logging.getLogger(__name__)
+
+REGION_RESOLUTION = 1e-5
+"""
+Defines the default grid size in degrees used to thin points before
+computing a region, which is about one meter of latitude.
+"""
+
+SENSOR_MAX_GAP = 5.0
+"""
+Defines the default maximum time in seconds between a sensor reading and
+the poses used to locate it.
+"""
+
+_INTERIOR_CHUNK_SIZE = 2 ** 15
+"""
+Defines the number of points tested against a hull approximation at a time.
+"""
+
 
 def add_ll_to_pose_dataframe(df):
     """
@@ -17,26 +40,245 @@ def add_ll_to_pose_dataframe(df):
               [longitude, latitude], added in-place
     :rtype:   pandas.DataFrame
     """
-    # Create a DataFrame conversion method from UTM to LL coordinates.
-    def utm_to_ll(utm_row):
-        return utm.to_latlon(utm_row['easting'], utm_row['northing'],
-                             utm_row['zone'], northern=utm_row['hemi'])
+    latitude = numpy.empty(len(df))
+    longitude = numpy.empty(len(df))
+    easting = df['easting'].values
+    northing = df['northing'].values
 
-    # Apply the conversion and add the results to the original dataframe.
-    df['latitude'], df['longitude'] = zip(*df.apply(utm_to_ll, axis=1))
+    # Convert all of the poses within each UTM zone in a single batch.
+    # (The fancy-indexing below creates copies, which `utm` may modify.)
+    for (zone, hemi), idx in six.viewitems(
+            df.groupby(['zone', 'hemi']).indices):
+        latitude[idx], longitude[idx] = utm.to_latlon(
+            easting[idx], northing[idx], int(zone), northern=bool(hemi))
+
+    # Add the results to the original dataframe.
+    df['latitude'] = latitude
+    df['longitude'] = longitude
     return df
 
 
-def region_from_points(df):
+def add_pose_to_sensor_dataframe(df, pose, max_gap=SENSOR_MAX_GAP):
+    """
+    Adds the position at which each reading was taken to a sensor dataframe.
+
+    Positions are linearly interpolated between the poses immediately before
+    and after each reading, using a single sorted search over the pose times.
+    Readings without a pose within `max_gap` seconds on each side (or at
+    exactly the same time) are given NaN positions.  If the two poses are in
+    different UTM zones or hemispheres, the UTM position of the closer pose
+    is used.
+
+    :param df: a sensor dataframe with a time index
+    :type  df: pandas.DataFrame
+    :param pose: a pose dataframe with a time index and columns
+                 [easting, northing, zone, hemi, latitude, longitude]
+    :type  pose: pandas.DataFrame
+    :param max_gap: the maximum time in seconds between a reading and the
+                    poses used to locate it
+    :type  max_gap: float
+    :returns: the original dataframe with the additional columns
+              [easting, northing, latitude, longitude], added in-place
+    :rtype: pandas.DataFrame
+    """
+    columns = ('easting', 'northing', 'latitude', 'longitude')
+    if len(pose) == 0:
+        for column in columns:
+            df[column] = numpy.nan
+        return df
+    if not pose.index.is_monotonic_increasing:
+        pose = pose.sort_index(kind='mergesort')
+
+    # Find the last pose at or before and the first pose after each reading.
+    # (Times are compared in nanoseconds, whatever the unit of each index.)
+    pose_time = (pose.index.values.astype('datetime64[ns]')
+                 .astype(numpy.int64))
+    time = df.index.values.astype('datetime64[ns]').astype(numpy.int64)
+    after = numpy.searchsorted(pose_time, time, side='right')
+    before = numpy.maximum(after - 1, 0)
+    has_before = after > 0
+    has_after = after < len(pose_time)
+    after = numpy.minimum(after, len(pose_time) - 1)
+
+    # Only locate readings that are bracketed closely enough by poses.
+    max_gap = int(max_gap * 1e9)
+    gap_before = time - pose_time[before]
+    gap_after = pose_time[after] - time
+    exact = has_before & (gap_before == 0)
+    bracketed = (has_before & has_after &
+                 (gap_before <= max_gap) & (gap_after <= max_gap))
+    weight = numpy.where(
+        bracketed & ~exact,
+        gap_before.astype(numpy.float64) / (gap_before + gap_after).clip(1),
+        0.0)
+    valid = exact | bracketed
+
+    zone, hemi = pose['zone'].values, pose['hemi'].values
+    same_zone = ((zone[before] == zone[after]) &
+                 (hemi[before] == hemi[after]))
+    for column in columns:
+        values = pose[column].values.astype(numpy.float64)
+        position = values[before] + weight * (values[after] - values[before])
+        if column in ('easting', 'northing'):
+            nearest = numpy.where(weight < 0.5, values[before], values[after])
+            position = numpy.where(same_zone, position, nearest)
+        df[column] = numpy.where(valid, position, numpy.nan)
+    return df
+
+
+def add_pose_to_sensor_dataframes(data, max_gap=SENSOR_MAX_GAP):
+    """
+    Adds the position at which each reading was taken to every sensor
+    dataframe of a parsed log.
+
+    If the log does not contain any `pose` data, a warning is logged and
+    the sensor dataframes are left unchanged.
+
+    :param data: a dict of dataframes from a log
+    :type  data: {str: pandas.DataFrame}
+    :param max_gap: the maximum time in seconds between a reading and the
+                    poses used to locate it
+    :type  max_gap: float
+    :returns: the original dict, with the sensor dataframes updated in-place
+    :rtype: {str: pandas.DataFrame}
+    """
+    if 'pose' not in data:
+        logger.warning("Cannot locate sensor readings without pose data.")
+        return data
+
+    for name, df in six.viewitems(data):
+        if name != 'pose':
+            add_pose_to_sensor_dataframe(df, data['pose'], max_gap)
+    return data
+
+
+def _interior_mask(x, y):
+    """
+    Finds points that are strictly inside the octagon spanned by the extreme
+    points of a set, which cannot be vertices of its convex hull.
+
+    This is the Akl-Toussaint heuristic, which discards most of the points of
+    a densely sampled track in a few linear passes.
+
+    :param x: the x-coordinates of the points
+    :type  x: numpy.ndarray
+    :param y: the y-coordinates of the points
+    :type  y: numpy.ndarray
+    :returns: a boolean mask of the points inside the octagon
+    :rtype: numpy.ndarray
+    """
+    inside = numpy.zeros(len(x), dtype=bool)
+    if len(x) == 0:
+        return inside
+
+    # Order the extreme points counter-clockwise, starting from the bottom.
+    difference = x - y
+    total = x + y
+    extremes = [numpy.argmin(y), numpy.argmax(difference),
+                numpy.argmax(x), numpy.argmax(total),
+                numpy.argmax(y), numpy.argmin(difference),
+                numpy.argmin(x), numpy.argmin(total)]
+    del difference, total
+    octagon = [(x[i], y[i])
+               for i, j in zip(extremes, extremes[1:] + extremes[:1])
+               if (x[i], y[i]) != (x[j], y[j])]
+    if len(octagon) < 3:
+        return inside
+
+    # Express each edge as a half-plane `a * y - b * x > c`, which contains
+    # the points strictly to the left of the edge.
+    edges = [(x2 - x1, y2 - y1, (x2 - x1) * y1 - (y2 - y1) * x1)
+             for (x1, y1), (x2, y2) in zip(octagon, octagon[1:] + octagon[:1])]
+
+    # Test the points in chunks that fit in the processor cache.
+    for start in six.moves.range(0, len(x), _INTERIOR_CHUNK_SIZE):
+        chunk = slice(start, start + _INTERIOR_CHUNK_SIZE)
+        x_chunk, y_chunk = x[chunk], y[chunk]
+        inside_chunk = inside[chunk]
+        inside_chunk[:] = True
+        for a, b, c in edges:
+            inside_chunk &= a * y_chunk - b * x_chunk > c
+    return inside
+
+
+def region_from_points(df, resolution=REGION_RESOLUTION):
     """
     Computes a convex-hull region boundary from the provided 'pose' dataframe.
 
+    Before computing the hull, points that cannot lie on the hull are
+    discarded and the remaining points are replaced by the corners of the
+    grid cells of the specified resolution that contain them, so the
+    boundary contains every position and is within about one cell of the
+    exact convex hull.
+
     :param df: A dataframe containing `longitude` and `latitude` as columns
     :type  df: pandas.DataFrame
+    :param resolution: the size of the grid cells in degrees
+    :type  resolution: float
     :returns: convex hull of positions in `pose`
-    :rtype: GeoJSON polyline defining region boundary
+    :rtype: GeoJSON Polygon dict defining region boundary
+    :raises ValueError: if the positions do not span a region
+    """
+    x = numpy.asarray(df['longitude'].values, dtype=numpy.float64)
+    y = numpy.asarray(df['latitude'].values, dtype=numpy.float64)
+    valid = numpy.isfinite(x) & numpy.isfinite(y)
+    if not valid.all():
+        x, y = x[valid], y[valid]
+
+    candidates = ~_interior_mask(x, y)
+    points = numpy.column_stack((x[candidates], y[candidates]))
+
+    # Find the grid cells that contain points, keeping a point from each.
+    cells = numpy.floor(points / resolution).astype(numpy.int64)
+    cells, idx = numpy.unique(cells, axis=0, return_index=True)
+    points = points[idx]
+
+    # Positions that lie on a line or at a single point do not span a
+    # region, even though the cells that contain them do.
+    if len(points) < 3 or numpy.linalg.matrix_rank(points - points[0]) < 2:
+        raise ValueError("Positions do not span a region.")
+
+    # Replace each cell by its corners, so that the hull contains every
+    # point in the cell.
+    corners = numpy.unique(numpy.concatenate(
+        [cells + offset for offset in ((0, 0), (1, 0), (0, 1), (1, 1))]),
+        axis=0)
+    points = corners * resolution
+
+    # Degenerate inputs raise a QhullError, which is a RuntimeError.
+    try:
+        hull = scipy.spatial.ConvexHull(points)
+    except (ValueError, RuntimeError) as e:
+        raise ValueError("Positions do not span a region: {:s}"
+                         .format(str(e)))
+
+    # Hull vertices are counter-clockwise, as GeoJSON expects, and the ring
+    # is closed by repeating the first vertex.
+    ring = points[numpy.append(hull.vertices, hull.vertices[0])]
+    return {
+        'type': 'Polygon',
+        'coordinates': [ring.tolist()]
+    }
+
+
+def _valid_pose_mask(df, median_easting, median_northing, tolerance):
+    """
+    Computes which poses are within a tolerance of a median pose.
+
+    :param df: a UTM dataframe with time index and [easting, northing] columns
+    :type  df: pandas.DataFrame
+    :param median_easting: the median easting of the poses
+    :type  median_easting: float
+    :param median_northing: the median northing of the poses
+    :type  median_northing: float
+    :param tolerance: maximum distance in meters from the median pose
+    :type  tolerance: float
+    :returns: a boolean mask that is True for poses within the tolerance
+    :rtype: numpy.ndarray
     """
-    raise NotImplementedError()
+    valid_easting = numpy.abs(df['easting'].values - median_easting)
+    valid_northing = numpy.abs(df['northing'].values - median_northing)
+    return (valid_easting < tolerance) & (valid_northing < tolerance)
 
 
 def remove_outliers_from_pose_dataframe(df, tolerance=10000):
@@ -56,7 +298,119 @@ def remove_outliers_from_pose_dataframe(df, tolerance=10000):
     median_easting = df['easting'].median()
     median_northing = df['northing'].median()
 
-    valid_easting = abs(df['easting'] - median_easting) < tolerance
-    valid_northing = abs(df['northing'] - median_northing) < tolerance
+    return df[_valid_pose_mask(df, median_easting, median_northing,
+                               tolerance)]
+
+
+class MedianSketch(object):
+    """
+    Approximates the median of a stream of values in bounded memory.
+
+    The values are summarized by at most `size` weighted points, similar to
+    a t-digest.  Each batch of values is summarized by its quantiles, merged
+    with the existing points, and the merged points are compressed back into
+    quantiles.  While fewer than `size` values have been seen, the median of
+    the values is exact, apart from taking the lower of the two middle values
+    for an even number of values.
+    """
+    def __init__(self, size=1024):
+        """
+        Creates an empty median sketch.
+
+        :param size: the maximum number of points used to summarize values
+        :type  size: int
+        """
+        self.size = size
+        self.values = numpy.empty(0)
+        self.weights = numpy.empty(0)
+
+    def update(self, values):
+        """
+        Adds a batch of values to the sketch.
+
+        :param values: the values to add, where NaNs are ignored
+        :type  values: numpy.ndarray
+        """
+        values = numpy.asarray(values, dtype=float)
+        values = values[~numpy.isnan(values)]
+
+        # Summarize large batches of values by their quantiles.
+        if len(values) > self.size:
+            quantiles = (numpy.arange(self.size) + 0.5) / self.size
+            weights = numpy.full(self.size, len(values) / float(self.size))
+            values = numpy.percentile(values, 100 * quantiles)
+        else:
+            weights = numpy.ones(len(values))
+
+        # Merge the new values with the existing points.
+        values = numpy.concatenate((self.values, values))
+        weights = numpy.concatenate((self.weights, weights))
+        order = numpy.argsort(values, kind='mergesort')
+        values, weights = values[order], weights[order]
+
+        # Compress the merged points back into evenly weighted quantiles.
+        if len(values) > self.size:
+            total = weights.sum()
+            targets = (numpy.arange(self.size) + 0.5) * total / self.size
+            indices = numpy.searchsorted(numpy.cumsum(weights), targets)
+            values = values[numpy.minimum(indices, len(values) - 1)]
+            weights = numpy.full(self.size, total / self.size)
+
+        self.values, self.weights = values, weights
+
+    def median(self):
+        """
+        Gets the approximate median of the values added to the sketch.
+
+        :returns: the approximate median, or NaN if no values were added
+        :rtype: float
+        """
+        if len(self.values) == 0:
+            return float('nan')
+
+        cumulative_weights = numpy.cumsum(self.weights)
+        index = numpy.searchsorted(cumulative_weights,
+                                   cumulative_weights[-1] / 2.)
+        return self.values[index]
+
+
+class PoseOutlierFilter(object):
+    """
+    Removes outlier poses from a stream of pose dataframes.
+
+    This is the streaming equivalent of `remove_outliers_from_pose_dataframe`,
+    where the median pose is approximated by `MedianSketch` estimates that are
+    updated incrementally with each dataframe.  Each dataframe is filtered
+    using an estimate that includes its own poses, so dataframes should be
+    larger than the burst of poses from GPS initialization.
+    """
+    def __init__(self, tolerance=10000, size=1024):
+        """
+        Creates a filter that has not seen any poses.
+
+        :param tolerance: maximum distance in meters from median of poses
+        :type  tolerance: float
+        :param size: the maximum number of points used to summarize values
+        :type  size: int
+        """
+        self.tolerance = tolerance
+        self.easting = MedianSketch(size)
+        self.northing = MedianSketch(size)
+
+    def __call__(self, df):
+        """
+        Updates the median pose, then removes outliers from a dataframe.
+
+        :param df: a UTM dataframe with time index and
+                   [easting, northing] columns
+        :type  df: pandas.DataFrame
+        :returns: A dataframe with rows exceeding the tolerance removed
+        :rtype: pandas.DataFrame
+        """
+        self.easting.update(df['easting'].values)
+        self.northing.update(df['northing'].values)
 
-    return df[valid_northing & valid_easting]
+        return df[_valid_pose_mask(df,
+                                   self.easting.median(),
+                                   self.northing.median(),
+                                   self.tolerance)]
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""
+Module for interpolating georeferenced sensor readings into raster maps.
+
+Readings must have UTM [easting, northing] positions, such as those added by
+`platypus.util.conversions.add_pose_to_sensor_dataframe`.  The raster is a
+regular grid over easting and northing, whose first row is at the minimum
+northing, and is evaluated in chunks of rows so that memory use is bounded
+regardless of the size of the grid.  To plot a raster with matplotlib, use:
+
+    plt.imshow(raster, origin='lower',
+               extent=(bounds[0], bounds[2], bounds[1], bounds[3]))
+
+Copyright 2016. Platypus LLC. All rights reserved.
+"""
+import multiprocessing
+import numpy
+import scipy.interpolate
+import scipy.spatial
+
+RASTER_METHODS = ('idw', 'nearest', 'linear')
+"""
+Defines the supported interpolation methods: inverse distance weighting of
+the nearest readings, the value of the nearest reading, or linear
+interpolation within a triangulation of the readings.
+"""
+
+RASTER_NEIGHBORS = 8
+"""
+Defines the default number of nearest readings used by inverse distance
+weighting.
+"""
+
+RASTER_POWER = 2.0
+"""
+Defines the default power of the distance used by inverse distance
+weighting.
+"""
+
+_RASTER_CHUNK_SIZE = 2 ** 16
+"""
+Defines the approximate number of grid cells that are evaluated at a time.
+"""
+
+_interpolator = None
+"""
+Holds the interpolator of a worker process that evaluates raster tiles.
+"""
+
+
+def _make_interpolator(points, values, method, neighbors, power,
+                       max_distance):
+    """
+    Creates a function that interpolates readings at a set of positions.
+
+    :param points: the [easting, northing] position of each reading
+    :type  points: numpy.ndarray
+    :param values: the value of each reading
+    :type  values: numpy.ndarray
+    :returns: a function mapping an array of [easting, northing] positions to
+              the interpolated values, which are NaN where no readings are
+              within `max_distance`
+    :rtype: function
+    """
+    if method == 'linear':
+        return scipy.interpolate.LinearNDInterpolator(points, values)
+
+    tree = scipy.spatial.cKDTree(points)
+    k = 1 if method == 'nearest' else min(neighbors, len(points))
+    # Missing neighbors are reported at an index past the end of the values.
+    padded = numpy.append(values, numpy.nan)
+
+    def interpolate(positions):
+        distance, index = tree.query(
+            positions, k=k, distance_upper_bound=max_distance or numpy.inf)
+        if k == 1:
+            return padded[index]
+
+        found = numpy.isfinite(distance)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            weight = numpy.where(found, distance ** -power, 0.0)
+            result = (numpy.sum(weight * numpy.where(found, padded[index], 0),
+                                axis=1) / numpy.sum(weight, axis=1))
+
+        # Use the value of any reading at exactly the same position.
+        exact = distance[:, 0] == 0
+        result[exact] = padded[index[exact, 0]]
+        return result
+
+    return interpolate
+
+
+def _init_worker(*args):
+    """
+    Creates the interpolator of a worker process.
+
+    This is a module-level function so that it can be run in a worker process.
+    """
+    global _interpolator
+    _interpolator = _make_interpolator(*args)
+
+
+def _evaluate_rows(x, y):
+    """
+    Evaluates the interpolator of a worker process over rows of a grid.
+
+    This is a module-level function so that it can be run in a worker process.
+
+    :param x: the easting of each column of the grid
+    :type  x: numpy.ndarray
+    :param y: the northing of each row to evaluate
+    :type  y: numpy.ndarray
+    :returns: the interpolated values of the rows
+    :rtype: numpy.ndarray
+    """
+    return _interpolate_rows(_interpolator, x, y)
+
+
+def _interpolate_rows(interpolator, x, y):
+    """
+    Evaluates an interpolator over rows of a grid.
+
+    :param interpolator: the function used to interpolate positions
+    :type  interpolator: function
+    :param x: the easting of each column of the grid
+    :type  x: numpy.ndarray
+    :param y: the northing of each row to evaluate
+    :type  y: numpy.ndarray
+    :returns: the interpolated values of the rows
+    :rtype: numpy.ndarray
+    """
+    easting, northing = numpy.meshgrid(x, y)
+    positions = numpy.column_stack((easting.ravel(), northing.ravel()))
+    return interpolator(positions).reshape(len(y), len(x))
+
+
+def interpolate_raster(df, column, shape, bounds=None, method='idw',
+                       neighbors=RASTER_NEIGHBORS, power=RASTER_POWER,
+                       max_distance=None, workers=1):
+    """
+    Interpolates a column of georeferenced sensor readings onto a grid.
+
+    Each grid cell is evaluated at its center.  Readings without a valid
+    position or value are ignored.
+
+    :param df: a sensor dataframe with columns [easting, northing]
+    :type  df: pandas.DataFrame
+    :param column: the name of the column to interpolate
+    :type  column: str
+    :param shape: the number of (rows, columns) of the grid
+    :type  shape: (int, int)
+    :param bounds: (optional) the (min_easting, min_northing, max_easting,
+                   max_northing) of the grid, which defaults to the bounds
+                   of the readings
+    :type  bounds: (float, float, float, float)
+    :param method: the interpolation method, one of `RASTER_METHODS`
+    :type  method: str
+    :param neighbors: the number of readings used by inverse distance
+                      weighting
+    :type  neighbors: int
+    :param power: the power of the distance used by inverse distance
+                  weighting
+    :type  power: float
+    :param max_distance: (optional) the maximum distance in meters of the
+                         readings used by inverse distance weighting and
+                         nearest interpolation
+    :type  max_distance: float
+    :param workers: number of worker processes used to evaluate tiles of the
+                    grid, or None for the number of CPUs
+    :type  workers: int
+    :returns: the interpolated grid, which is NaN where it cannot be
+              interpolated, and its bounds
+    :rtype: (numpy.ndarray, (float, float, float, float))
+    """
+    if method not in RASTER_METHODS:
+        raise ValueError("Unknown interpolation method '{:s}'."
+                         .format(method))
+
+    easting = numpy.asarray(df['easting'].values, dtype=numpy.float64)
+    northing = numpy.asarray(df['northing'].values, dtype=numpy.float64)
+    values = numpy.asarray(df[column].values, dtype=numpy.float64)
+    valid = (numpy.isfinite(easting) & numpy.isfinite(northing) &
+             numpy.isfinite(values))
+    points = numpy.column_stack((easting[valid], northing[valid]))
+    values = values[valid]
+    if len(values) == 0:
+        raise ValueError("No georeferenced readings of '{:s}'."
+                         .format(column))
+
+    if bounds is None:
+        bounds = (points[:, 0].min(), points[:, 1].min(),
+                  points[:, 0].max(), points[:, 1].max())
+    rows, columns = shape
+    width = float(bounds[2] - bounds[0]) / columns
+    height = float(bounds[3] - bounds[1]) / rows
+    x = bounds[0] + (numpy.arange(columns) + 0.5) * width
+    y = bounds[1] + (numpy.arange(rows) + 0.5) * height
+
+    # Evaluate the grid in chunks of whole rows.
+    chunk_rows = max(1, _RASTER_CHUNK_SIZE // max(columns, 1))
+    chunks = [y[i:i + chunk_rows] for i in range(0, rows, chunk_rows)]
+    args = (points, values, method, neighbors, power, max_distance)
+
+    if workers == 1:
+        interpolator = _make_interpolator(*args)
+        tiles = [_interpolate_rows(interpolator, x, chunk)
+                 for chunk in chunks]
+    else:
+        pool = multiprocessing.Pool(workers or multiprocessing.cpu_count(),
+                                    initializer=_init_worker, initargs=args)
+        try:
+            results = [pool.apply_async(_evaluate_rows, (x, chunk))
+                       for chunk in chunks]
+            tiles = [result.get() for result in results]
+        finally:
+            pool.terminate()
+            pool.join()
+
+    raster = (numpy.concatenate(tiles) if tiles
+              else numpy.empty((rows, columns)))
+    return raster, tuple(bounds)
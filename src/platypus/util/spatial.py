@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""
+Module containing a spatial index over the positions of pose dataframes.
+
+Poses are bucketed into a uniform grid of square cells over their UTM
+[easting, northing] coordinates.  The cells are numbered so that the cells
+of each grid column are contiguous, and the poses are sorted by cell, so a
+bounding box can be found using a binary search per grid column instead of
+a scan over every pose.
+
+Copyright 2016. Platypus LLC. All rights reserved.
+"""
+import numpy
+
+CELL_SIZE = 10.0
+"""
+Defines the default width and height of grid cells in meters.
+"""
+
+_COLUMN_BITS = 24
+"""
+Defines the number of bits of a cell key that hold the column of the cell.
+"""
+
+_ROW_BITS = 28
+"""
+Defines the number of bits of a cell key that hold the row of the cell.  The
+bits above the column and row hold the UTM zone and hemisphere of the cell.
+"""
+
+
+def _cell_keys(code, column, row):
+    """
+    Combines the UTM zone code, column and row of grid cells into keys that
+    sort by zone, then by column, then by row.
+
+    :param code: the UTM zone and hemisphere of each cell
+    :type  code: numpy.ndarray
+    :param column: the grid column of each cell
+    :type  column: numpy.ndarray
+    :param row: the grid row of each cell
+    :type  row: numpy.ndarray
+    :returns: the key of each cell
+    :rtype: numpy.ndarray
+    """
+    column = numpy.clip(column, 0, 2 ** _COLUMN_BITS - 1).astype(numpy.int64)
+    row = numpy.clip(row, 0, 2 ** _ROW_BITS - 1).astype(numpy.int64)
+    return ((numpy.asarray(code, dtype=numpy.int64)
+             << (_COLUMN_BITS + _ROW_BITS)) | (column << _ROW_BITS) | row)
+
+
+def _zone_codes(zone, hemi):
+    """
+    Combines UTM zones and hemispheres into single integer codes.
+
+    :param zone: the UTM zone numbers
+    :type  zone: numpy.ndarray
+    :param hemi: whether each zone is in the northern hemisphere
+    :type  hemi: numpy.ndarray
+    :returns: the code of each zone and hemisphere
+    :rtype: numpy.ndarray
+    """
+    return (numpy.asarray(zone, dtype=numpy.int64) * 2 +
+            numpy.asarray(hemi, dtype=numpy.int64))
+
+
+class PoseIndex(object):
+    """
+    Answers bounding box and radius queries over the poses of a dataframe.
+
+    Queries return the integer positions of the matching poses within the
+    indexed dataframe, in increasing order, which can be used with
+    `df.iloc` to retrieve them.  Poses are only matched against queries in
+    the same UTM zone and hemisphere, unless the query does not specify one.
+    """
+    def __init__(self, df, cell_size=CELL_SIZE):
+        """
+        Creates an index over the positions of a pose dataframe.
+
+        :param df: a UTM dataframe with columns [easting, northing], and
+                   optionally [zone, hemi]
+        :type  df: pandas.DataFrame
+        :param cell_size: the width and height of grid cells in meters
+        :type  cell_size: float
+        """
+        easting = numpy.asarray(df['easting'].values, dtype=numpy.float64)
+        northing = numpy.asarray(df['northing'].values, dtype=numpy.float64)
+        if 'zone' in df and 'hemi' in df:
+            code = _zone_codes(df['zone'].values, df['hemi'].values)
+        else:
+            code = numpy.zeros(len(df), dtype=numpy.int64)
+
+        # Sort the poses with valid positions by the cell that contains them.
+        positions = numpy.flatnonzero(numpy.isfinite(easting) &
+                                      numpy.isfinite(northing))
+        keys = _cell_keys(code[positions],
+                          numpy.floor(easting[positions] / cell_size),
+                          numpy.floor(northing[positions] / cell_size))
+        order = numpy.argsort(keys, kind='mergesort')
+
+        self.cell_size = float(cell_size)
+        self.keys = keys[order]
+        self.positions = positions[order]
+        self.easting = easting[self.positions]
+        self.northing = northing[self.positions]
+        self.codes = numpy.unique(code[positions])
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _candidates(self, min_easting, min_northing, max_easting,
+                    max_northing, zone, hemi):
+        """
+        Finds the poses in the grid cells that overlap a bounding box.
+
+        :returns: the positions in the sorted arrays of the candidate poses
+        :rtype: numpy.ndarray
+        """
+        codes = self.codes
+        if zone is not None:
+            codes = codes[codes // 2 == zone]
+        if hemi is not None:
+            codes = codes[codes % 2 == int(hemi)]
+
+        # Find the range of sorted poses within each column of the box.
+        columns = numpy.arange(
+            max(numpy.floor(min_easting / self.cell_size), 0),
+            min(numpy.floor(max_easting / self.cell_size),
+                2 ** _COLUMN_BITS - 1) + 1)
+        first_row = numpy.floor(min_northing / self.cell_size)
+        last_row = numpy.floor(max_northing / self.cell_size)
+        code = numpy.repeat(codes, len(columns))
+        columns = numpy.tile(columns, len(codes))
+        starts = numpy.searchsorted(
+            self.keys, _cell_keys(code, columns, first_row), side='left')
+        ends = numpy.searchsorted(
+            self.keys, _cell_keys(code, columns, last_row), side='right')
+
+        # Concatenate the ranges of sorted poses.
+        counts = ends - starts
+        offsets = numpy.cumsum(counts) - counts
+        return (numpy.repeat(starts - offsets, counts) +
+                numpy.arange(numpy.sum(counts)))
+
+    def query_bbox(self, min_easting, min_northing, max_easting,
+                   max_northing, zone=None, hemi=None):
+        """
+        Finds the poses within a bounding box.
+
+        :param min_easting: the minimum easting of the box in meters
+        :type  min_easting: float
+        :param min_northing: the minimum northing of the box in meters
+        :type  min_northing: float
+        :param max_easting: the maximum easting of the box in meters
+        :type  max_easting: float
+        :param max_northing: the maximum northing of the box in meters
+        :type  max_northing: float
+        :param zone: (optional) the UTM zone of the box
+        :type  zone: int
+        :param hemi: (optional) whether the box is in the northern hemisphere
+        :type  hemi: bool
+        :returns: the positions of the poses within the box
+        :rtype: numpy.ndarray
+        """
+        candidates = self._candidates(min_easting, min_northing,
+                                      max_easting, max_northing, zone, hemi)
+        easting = self.easting[candidates]
+        northing = self.northing[candidates]
+        inside = ((easting >= min_easting) & (easting <= max_easting) &
+                  (northing >= min_northing) & (northing <= max_northing))
+        return numpy.sort(self.positions[candidates[inside]])
+
+    def query_radius(self, easting, northing, radius, zone=None, hemi=None):
+        """
+        Finds the poses within a distance of a position.
+
+        :param easting: the easting of the position in meters
+        :type  easting: float
+        :param northing: the northing of the position in meters
+        :type  northing: float
+        :param radius: the maximum distance from the position in meters
+        :type  radius: float
+        :param zone: (optional) the UTM zone of the position
+        :type  zone: int
+        :param hemi: (optional) whether the position is in the northern
+                     hemisphere
+        :type  hemi: bool
+        :returns: the positions of the poses within the radius
+        :rtype: numpy.ndarray
+        """
+        candidates = self._candidates(easting - radius, northing - radius,
+                                      easting + radius, northing + radius,
+                                      zone, hemi)
+        inside = numpy.hypot(self.easting[candidates] - easting,
+                             self.northing[candidates] - northing) <= radius
+        return numpy.sort(self.positions[candidates[inside]])
+
+    def save(self, filename):
+        """
+        Saves this index to a file.
+
+        :param filename: path to the index file, which should end in `.npz`
+        :type  filename: str
+        """
+        numpy.savez(filename, cell_size=self.cell_size, keys=self.keys,
+                    positions=self.positions, easting=self.easting,
+                    northing=self.northing, codes=self.codes)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads an index from a file created by `PoseIndex.save`.
+
+        :param filename: path to the index file
+        :type  filename: str
+        :returns: the saved index
+        :rtype: PoseIndex
+        """
+        index = cls.__new__(cls)
+        with numpy.load(filename) as arrays:
+            index.cell_size = float(arrays['cell_size'])
+            for name in ('keys', 'positions', 'easting', 'northing', 'codes'):
+                setattr(index, name, arrays[name])
+        return index
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+Module containing vectorized trajectory metrics for pose dataframes.
+
+Segments are the straight lines between consecutive poses.  Within a UTM
+zone, segments are measured on the UTM grid using the [easting, northing]
+columns.  Segments that cross between UTM zones are measured on a spherical
+earth using the [latitude, longitude] columns instead.
+
+Paths can also be simplified for storage and display using the
+Douglas-Peucker algorithm, either to a distance tolerance or to a maximum
+number of vertices, and at several levels of detail at once.
+
+Copyright 2016. Platypus LLC. All rights reserved.
+"""
+import numpy
+
+EARTH_RADIUS = 6371008.8
+"""
+Defines the mean radius of the earth in meters.
+"""
+
+PATH_TOLERANCE = 1.0
+"""
+Defines the default distance in meters by which a simplified path may
+deviate from the original path.
+"""
+
+
+def _segments(df):
+    """
+    Computes the length and heading of each segment of a trajectory.
+
+    :param df: a pose dataframe with a time index and columns
+               [easting, northing, zone, hemi, latitude, longitude]
+    :type  df: pandas.DataFrame
+    :returns: the length in meters and heading in degrees of the segment
+              ending at each pose, which are NaN for the first pose
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    distance = numpy.full(len(df), numpy.nan)
+    heading = numpy.full(len(df), numpy.nan)
+    if len(df) < 2:
+        return distance, heading
+
+    # Measure segments on the UTM grid.
+    d_easting = numpy.diff(df['easting'].values)
+    d_northing = numpy.diff(df['northing'].values)
+    distance[1:] = numpy.hypot(d_easting, d_northing)
+    heading[1:] = numpy.mod(
+        numpy.degrees(numpy.arctan2(d_easting, d_northing)), 360.0)
+
+    # Measure segments that cross UTM zones on a sphere.
+    zone = df['zone'].values
+    hemi = df['hemi'].values
+    crossing = (zone[1:] != zone[:-1]) | (hemi[1:] != hemi[:-1])
+    if crossing.any():
+        index = numpy.flatnonzero(crossing)
+        latitude = numpy.radians(df['latitude'].values)
+        longitude = numpy.radians(df['longitude'].values)
+        lat1, lat2 = latitude[index], latitude[index + 1]
+        d_longitude = longitude[index + 1] - longitude[index]
+
+        a = (numpy.sin((lat2 - lat1) / 2) ** 2 +
+             numpy.cos(lat1) * numpy.cos(lat2) *
+             numpy.sin(d_longitude / 2) ** 2)
+        distance[index + 1] = 2 * EARTH_RADIUS * numpy.arcsin(
+            numpy.sqrt(numpy.minimum(a, 1.0)))
+        heading[index + 1] = numpy.mod(numpy.degrees(numpy.arctan2(
+            numpy.sin(d_longitude) * numpy.cos(lat2),
+            numpy.cos(lat1) * numpy.sin(lat2) -
+            numpy.sin(lat1) * numpy.cos(lat2) * numpy.cos(d_longitude))),
+            360.0)
+
+    # Segments between identical poses do not have a heading.
+    heading[distance == 0] = numpy.nan
+    return distance, heading
+
+
+def add_trajectory_to_pose_dataframe(df):
+    """
+    Adds segment metrics to each pose of a pose dataframe.
+
+    The added columns describe the segment from the previous pose to each
+    pose, and are NaN for the first pose:
+
+     * distance: the length of the segment in meters
+     * speed: the average speed along the segment in meters per second
+     * heading: the direction of the segment in degrees clockwise from north
+     * cumulative_distance: the total length of the path up to this pose,
+       which is zero for the first pose
+
+    Speeds are NaN for segments between poses with the same timestamp, and
+    headings are NaN for segments between poses with the same position.
+
+    :param df: a pose dataframe with a time index and columns
+               [easting, northing, zone, hemi, latitude, longitude]
+    :type  df: pandas.DataFrame
+    :returns: the original dataframe with the additional columns
+              [distance, speed, heading, cumulative_distance], added in-place
+    :rtype: pandas.DataFrame
+    """
+    distance, heading = _segments(df)
+
+    duration = numpy.full(len(df), numpy.nan)
+    if len(df) > 1:
+        duration[1:] = (numpy.diff(df.index.values) /
+                        numpy.timedelta64(1, 's'))
+        duration[duration == 0] = numpy.nan
+
+    df['distance'] = distance
+    df['speed'] = distance / duration
+    df['heading'] = heading
+    df['cumulative_distance'] = numpy.nancumsum(distance)
+    return df
+
+
+def path_length(df):
+    """
+    Computes the total length of the path through the poses of a dataframe.
+
+    :param df: a pose dataframe with a time index and columns
+               [easting, northing, zone, hemi, latitude, longitude]
+    :type  df: pandas.DataFrame
+    :returns: the total length of the path in meters
+    :rtype: float
+    """
+    distance, _ = _segments(df)
+    return numpy.nansum(distance)
+
+
+def _path_importance(df, tolerance):
+    """
+    Ranks the poses of a path by the Douglas-Peucker distance tolerance at
+    which they are removed from the simplified path.
+
+    The path is split at the pose farthest from each segment until every
+    segment is within the tolerance.  All of the segments at each depth of
+    this recursion are processed together, so each depth takes a single
+    pass over the poses.  Positions are projected onto a local
+    equirectangular plane, so distances are in meters.
+
+    :param df: a pose dataframe with columns [latitude, longitude]
+    :type  df: pandas.DataFrame
+    :param tolerance: the tolerance in meters below which poses are removed
+    :type  tolerance: float
+    :returns: the largest tolerance at which each pose is kept, which is
+              infinite for the endpoints and zero for removed poses
+    :rtype: numpy.ndarray
+    """
+    importance = numpy.zeros(len(df))
+    if len(df) == 0:
+        return importance
+    importance[[0, -1]] = numpy.inf
+
+    latitude = numpy.radians(df['latitude'].values)
+    longitude = numpy.radians(df['longitude'].values)
+    x = EARTH_RADIUS * numpy.cos(numpy.mean(latitude)) * longitude
+    y = EARTH_RADIUS * latitude
+
+    start = numpy.array([0])
+    end = numpy.array([len(df) - 1])
+    while len(start) > 0:
+        # Find the interior poses of each segment.
+        nonempty = end - start > 1
+        start, end = start[nonempty], end[nonempty]
+        if len(start) == 0:
+            break
+        counts = end - start - 1
+        offsets = numpy.cumsum(counts) - counts
+        segment = numpy.repeat(numpy.arange(len(start)), counts)
+        index = (start[segment] + 1 +
+                 numpy.arange(len(segment)) - offsets[segment])
+
+        # Compute the distance from each interior pose to its segment.
+        x1, y1 = x[start][segment], y[start][segment]
+        dx = x[end][segment] - x1
+        dy = y[end][segment] - y1
+        px = x[index] - x1
+        py = y[index] - y1
+        # (Segments with coincident endpoints measure from the start pose.)
+        length2 = numpy.maximum(dx * dx + dy * dy, numpy.finfo(float).tiny)
+        t = numpy.clip((px * dx + py * dy) / length2, 0.0, 1.0)
+        distance = numpy.hypot(px - t * dx, py - t * dy)
+
+        # Split each segment at its farthest pose, if it is out of tolerance.
+        farthest = numpy.maximum.reduceat(distance, offsets)
+        candidates = numpy.flatnonzero(distance == farthest[segment])
+        first = numpy.ones(len(candidates), dtype=bool)
+        first[1:] = segment[candidates[1:]] != segment[candidates[:-1]]
+        split = index[candidates[first]]
+
+        splitting = farthest > tolerance
+        start, end = start[splitting], end[splitting]
+        split = split[splitting]
+        importance[split] = numpy.minimum(
+            farthest[splitting],
+            numpy.minimum(importance[start], importance[end]))
+        start, end = (numpy.concatenate((start, split)),
+                      numpy.concatenate((split, end)))
+
+    return importance
+
+
+def _select_path(df, importance, tolerance, max_vertices):
+    """
+    Selects the poses of a simplified path using their importance.
+
+    :param df: a pose dataframe
+    :type  df: pandas.DataFrame
+    :param importance: the importance of each pose from `_path_importance`
+    :type  importance: numpy.ndarray
+    :param tolerance: the tolerance in meters below which poses are removed
+    :type  tolerance: float
+    :param max_vertices: the maximum number of poses to keep, or None
+    :type  max_vertices: int
+    :returns: the poses of the simplified path
+    :rtype: pandas.DataFrame
+    """
+    keep = importance > tolerance
+    if max_vertices is not None and numpy.count_nonzero(keep) > max_vertices:
+        keep[:] = False
+        keep[numpy.argsort(-importance, kind='mergesort')[
+            :max(max_vertices, 2)]] = True
+    return df[keep]
+
+
+def simplify_path(df, tolerance=PATH_TOLERANCE, max_vertices=None):
+    """
+    Simplifies the path through the poses of a dataframe.
+
+    Poses are removed using the Douglas-Peucker algorithm until the
+    simplified path deviates from the original path by no more than the
+    tolerance.  If more poses than `max_vertices` remain, only the poses
+    that are kept at the largest tolerances are returned.  The first and
+    last poses are always kept.
+
+    :param df: a pose dataframe with columns [latitude, longitude]
+    :type  df: pandas.DataFrame
+    :param tolerance: the maximum deviation of the simplified path in meters
+    :type  tolerance: float
+    :param max_vertices: (optional) the maximum number of poses to keep
+    :type  max_vertices: int
+    :returns: the poses of the simplified path
+    :rtype: pandas.DataFrame
+    """
+    df = df[numpy.isfinite(df['latitude'].values) &
+            numpy.isfinite(df['longitude'].values)]
+    importance = _path_importance(df, tolerance)
+    return _select_path(df, importance, tolerance, max_vertices)
+
+
+def simplify_path_levels(df, tolerances, max_vertices=None):
+    """
+    Simplifies the path through the poses of a dataframe at several levels
+    of detail, for example to render the path at different zoom levels.
+
+    This is equivalent to calling `simplify_path` with each tolerance, but
+    only runs the Douglas-Peucker algorithm once.
+
+    :param df: a pose dataframe with columns [latitude, longitude]
+    :type  df: pandas.DataFrame
+    :param tolerances: the maximum deviation in meters of each level
+    :type  tolerances: [float]
+    :param max_vertices: (optional) the maximum number of poses per level
+    :type  max_vertices: int
+    :returns: the poses of the simplified path at each level
+    :rtype: [pandas.DataFrame]
+    """
+    df = df[numpy.isfinite(df['latitude'].values) &
+            numpy.isfinite(df['longitude'].values)]
+    importance = _path_importance(df, min(tolerances))
+    return [_select_path(df, importance, tolerance, max_vertices)
+            for tolerance in tolerances]
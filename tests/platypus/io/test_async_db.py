@@ -0,0 +1,278 @@
+import asyncio
+import multiprocessing
+import unittest
+from bson.timestamp import Timestamp
+from unittest import TestCase
+
+try:
+    import mongomock
+    import mongomock.gridfs
+    import gridfs
+    import platypus.io.async_db
+    import platypus.io.connection
+    import platypus.io.db
+    mongomock.gridfs.enable_gridfs_integration()
+    from .test_db import TEST_LOG_FILENAMES, make_database, make_oplog
+except ImportError:
+    mongomock = None
+
+
+class FakeAsyncCursor(object):
+    """ Iterates asynchronously over documents until they are exhausted. """
+    def __init__(self, documents):
+        self.documents = list(documents)
+        self.alive = True
+
+    async def to_list(self, length):
+        await asyncio.sleep(0)
+        documents, self.documents = self.documents, []
+        self.alive = False
+        return documents
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0)
+        if not self.documents:
+            self.alive = False
+            raise StopAsyncIteration
+        return self.documents.pop(0)
+
+
+class FakeAsyncCollection(object):
+    """ Wraps an in-memory collection with the coroutines of motor. """
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        return FakeAsyncCursor(self.collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(0)
+            return method(*args, **kwargs)
+        return call
+
+
+class FakeAsyncDatabase(object):
+    """ Wraps an in-memory database with the collections of motor. """
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, name):
+        return FakeAsyncCollection(self.db[name])
+
+
+class FakeAsyncGridOut(object):
+    """ Wraps a GridFS file with the coroutines of motor. """
+    def __init__(self, grid_out):
+        self.grid_out = grid_out
+        self._id = grid_out._id
+        self.length = grid_out.length
+
+    async def read(self, size=-1):
+        await asyncio.sleep(0)
+        return self.grid_out.read(size)
+
+
+class FakeAsyncBucket(object):
+    """ Wraps an in-memory GridFS store with the bucket of motor. """
+    def __init__(self, db, bucket_name):
+        self.fs = gridfs.GridFS(db, bucket_name)
+
+    def find(self, spec):
+        return FakeAsyncCursor(FakeAsyncGridOut(grid_out)
+                               for grid_out in self.fs.find(spec))
+
+
+class FakeAsyncOplog(object):
+    """ Wraps an in-process oplog with the coroutines of motor. """
+    def __init__(self, oplog):
+        self.oplog = oplog
+
+    def find(self, spec, **kwargs):
+        return FakeAsyncCursor(self.oplog.find(spec, **kwargs))
+
+    async def find_one(self, sort=None):
+        return self.oplog.find_one(sort=sort)
+
+
+@unittest.skipIf(mongomock is None, "requires mongomock")
+class AsyncDbTest(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def process(self, db, dataset_id, **kwargs):
+        return self.loop.run_until_complete(platypus.io.async_db.process(
+            FakeAsyncDatabase(db),
+            FakeAsyncBucket(db, 'cfs_gridfs.logs_gridfs'),
+            dataset_id, **kwargs))
+
+    def test_process(self):
+        """ Test that datasets are processed as by the blocking server. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES)
+        self.assertTrue(self.process(db, dataset_id))
+        dataset = db['datasets'].find_one(dataset_id)
+
+        expected_db, expected_id = make_database(TEST_LOG_FILENAMES)
+        platypus.io.db.process(expected_db, expected_id, workers=1)
+        expected = expected_db['datasets'].find_one(expected_id)
+
+        for field in ('processed', 'bounds', 'path'):
+            self.assertEqual(dataset[field], expected[field])
+        self.assertEqual(dataset['fingerprint'], platypus.io.db._fingerprint(
+            dataset, platypus.io.db._fetch_logs(db, dataset)))
+        series = platypus.io.db.SERIES_COLLECTION
+        self.assertEqual(
+            db[series].count_documents({'dataset': dataset_id}),
+            expected_db[series].count_documents({'dataset': expected_id}))
+
+        # Test that an unchanged dataset is skipped.
+        self.assertFalse(self.process(db, dataset_id))
+        self.assertTrue(self.process(db, dataset_id, force=True))
+
+    @unittest.skipIf(multiprocessing.get_start_method() != 'fork',
+                     "requires forked processes")
+    def test_process_executor(self):
+        """ Test that logs can be streamed and parsed in worker processes. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES)
+
+        # (Forked workers stream logs from their copy of the database.)
+        manager = platypus.io.connection.ConnectionManager(
+            database=db.name, client_factory=lambda **kwargs: db.client)
+        executor = platypus.io.async_db.worker_executor(manager, 2)
+        try:
+            self.assertTrue(self.process(db, dataset_id, executor=executor))
+        finally:
+            executor.shutdown()
+        self.assertEqual(db['datasets'].find_one(dataset_id)['processed'], 1.0)
+
+    def test_process_invalid(self):
+        """ Test that unknown datasets are rejected. """
+        db, _ = make_database([])
+        with self.assertRaises(ValueError):
+            self.process(db, 'missing')
+
+
+@unittest.skipIf(mongomock is None, "requires mongomock")
+class AsyncDatasetConsumerTest(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.db = mongomock.MongoClient().meteor
+        self.processed = []
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    async def handler(self, dataset_id):
+        await asyncio.sleep(0.01)
+        self.processed.append(dataset_id)
+
+    def run_consumer(self, consumer, dataset_ids):
+        oplog = FakeAsyncOplog(make_oplog(dataset_ids))
+        try:
+            self.loop.run_until_complete(
+                consumer.run(oplog, 'meteor.datasets', follow=False))
+        finally:
+            self.loop.run_until_complete(consumer.close())
+
+    def test_coalesce(self):
+        """ Test that repeated updates to a dataset are processed once. """
+        consumer = platypus.io.async_db.AsyncDatasetConsumer(
+            FakeAsyncDatabase(self.db), None, window=0.2,
+            handler=self.handler)
+        consumer.resume_ts = Timestamp(0, 0)
+        self.run_consumer(consumer, ['a', 'a', 'b', 'a', 'b'])
+
+        self.assertEqual(sorted(self.processed), ['a', 'b'])
+        self.assertEqual(
+            self.db[platypus.io.db.STATE_COLLECTION].find_one()['ts'],
+            Timestamp(1000, 5))
+
+    def test_resume(self):
+        """ Test that a consumer resumes after the persisted timestamp. """
+        self.db[platypus.io.db.STATE_COLLECTION].insert_one(
+            {'_id': 'oplog', 'ts': Timestamp(1000, 2)})
+        consumer = platypus.io.async_db.AsyncDatasetConsumer(
+            FakeAsyncDatabase(self.db), None, window=0, handler=self.handler)
+        self.run_consumer(consumer, ['a', 'b', 'c', 'd'])
+
+        self.assertEqual(sorted(self.processed), ['c', 'd'])
+        self.assertEqual(consumer.resume_ts, Timestamp(1000, 4))
+
+    def test_start(self):
+        """ Test that a new consumer persists its starting timestamp. """
+        consumer = platypus.io.async_db.AsyncDatasetConsumer(
+            FakeAsyncDatabase(self.db), None, window=0, handler=self.handler)
+        self.run_consumer(consumer, ['a', 'b'])
+
+        self.assertEqual(self.processed, [])
+        self.assertEqual(
+            self.db[platypus.io.db.STATE_COLLECTION].find_one()['ts'],
+            Timestamp(1000, 2))
+
+    def test_failure(self):
+        """ Test that a failed dataset does not stop the consumer. """
+        async def handler(dataset_id):
+            if dataset_id == 'a':
+                raise ValueError("Invalid dataset.")
+            await self.handler(dataset_id)
+
+        consumer = platypus.io.async_db.AsyncDatasetConsumer(
+            FakeAsyncDatabase(self.db), None, window=0, handler=handler)
+        consumer.resume_ts = Timestamp(0, 0)
+        self.run_consumer(consumer, ['a', 'b'])
+
+        # Test that the resume timestamp stays before the failed dataset.
+        self.assertEqual(self.processed, ['b'])
+        self.assertEqual(consumer.resume_ts, Timestamp(0, 0))
+
+    def test_retry(self):
+        """ Test that a failed dataset is retried. """
+        failures = []
+
+        async def handler(dataset_id):
+            if dataset_id == 'a' and not failures:
+                failures.append(dataset_id)
+                raise ValueError("Temporary failure.")
+            await self.handler(dataset_id)
+
+        consumer = platypus.io.async_db.AsyncDatasetConsumer(
+            FakeAsyncDatabase(self.db), None, window=0, handler=handler,
+            retry_delay=0)
+        consumer.resume_ts = Timestamp(0, 0)
+        self.run_consumer(consumer, ['a', 'b'])
+
+        self.assertEqual(failures, ['a'])
+        self.assertEqual(sorted(self.processed), ['a', 'b'])
+        self.assertEqual(consumer.resume_ts, Timestamp(1000, 2))
+
+    def test_jobs(self):
+        """ Test that no more than the maximum number of jobs run at once. """
+        running = [0, 0]
+
+        async def handler(dataset_id):
+            running[0] += 1
+            running[1] = max(running)
+            await asyncio.sleep(0.05)
+            running[0] -= 1
+            self.processed.append(dataset_id)
+
+        consumer = platypus.io.async_db.AsyncDatasetConsumer(
+            FakeAsyncDatabase(self.db), None, jobs=2, window=0,
+            handler=handler)
+        consumer.resume_ts = Timestamp(0, 0)
+        self.run_consumer(consumer, ['a', 'b', 'c', 'd', 'e'])
+
+        self.assertEqual(sorted(self.processed), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(running[1], 2)
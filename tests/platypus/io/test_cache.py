@@ -0,0 +1,118 @@
+import datetime
+import os
+import platypus.io.cache
+import platypus.io.logs
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+TEST_LOG_V4_0_0_FILENAME = os.path.join(
+    os.path.dirname(__file__), 'airboat_20130807_063622.txt')
+
+TEST_LOG_V4_2_0_FILENAME = os.path.join(
+    os.path.dirname(__file__), 'platypus_20160519_013623.txt')
+
+
+class CacheTest(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.environ = os.environ.get('PLATYPUS_CACHE_DIR')
+        os.environ['PLATYPUS_CACHE_DIR'] = self.cache_dir
+
+    def tearDown(self):
+        if self.environ is None:
+            del os.environ['PLATYPUS_CACHE_DIR']
+        else:
+            os.environ['PLATYPUS_CACHE_DIR'] = self.environ
+        shutil.rmtree(self.cache_dir)
+
+    def test_key(self):
+        """ Test that cache keys depend on log content and parser version. """
+        key = platypus.io.cache.key(TEST_LOG_V4_2_0_FILENAME, '1')
+        self.assertEqual(
+            key, platypus.io.cache.key(TEST_LOG_V4_2_0_FILENAME, '1'))
+        self.assertNotEqual(
+            key, platypus.io.cache.key(TEST_LOG_V4_2_0_FILENAME, '2'))
+
+        # Test that a copy of the log with a different name has another key.
+        filename = os.path.join(self.cache_dir, 'copy.txt')
+        shutil.copy(TEST_LOG_V4_2_0_FILENAME, filename)
+        copy_key = platypus.io.cache.key(filename, '1')
+        self.assertNotEqual(key, copy_key)
+
+        # Test that a log with the same name and other content has another key.
+        other_dir = os.path.join(self.cache_dir, 'other')
+        os.mkdir(other_dir)
+        other_filename = os.path.join(
+            other_dir, os.path.basename(TEST_LOG_V4_2_0_FILENAME))
+        shutil.copy(TEST_LOG_V4_2_0_FILENAME, other_filename)
+        self.assertEqual(key, platypus.io.cache.key(other_filename, '1'))
+
+        with open(other_filename, 'a') as log_file:
+            log_file.write('0\tI\t{"cmd":{}}\n')
+        self.assertNotEqual(key, platypus.io.cache.key(other_filename, '1'))
+
+    def test_load(self):
+        """ Test that loading a log a second time uses the cache. """
+        data = platypus.io.logs.load(TEST_LOG_V4_2_0_FILENAME, cache=True)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        cached_data = platypus.io.logs.load(TEST_LOG_V4_2_0_FILENAME,
+                                            cache=True)
+        self.assertEqual(set(data), set(cached_data))
+        for k, v in data.items():
+            self.assertTrue(v.equals(cached_data[k]))
+
+    def test_load_renamed(self):
+        """ Test that logs timed by their name are not shared by the cache. """
+        platypus.io.logs.load(TEST_LOG_V4_0_0_FILENAME, cache=True)
+        filename = os.path.join(self.cache_dir, 'airboat_20150101_000000.txt')
+        shutil.copy(TEST_LOG_V4_0_0_FILENAME, filename)
+
+        data = platypus.io.logs.load(filename, cache=True)
+        self.assertEqual(data['pose'].index[0].date(),
+                         datetime.date(2015, 1, 1))
+
+    def test_load_unwritable(self):
+        """ Test that logs are loaded if the cache cannot be written. """
+        blocker = os.path.join(self.cache_dir, 'file')
+        open(blocker, 'w').close()
+        os.environ['PLATYPUS_CACHE_DIR'] = os.path.join(blocker, 'cache')
+
+        data = platypus.io.logs.load(TEST_LOG_V4_2_0_FILENAME, cache=True)
+        self.assertTrue(len(data['pose']) > 0)
+
+    def test_load_without_cache(self):
+        """ Test that the cache is not used unless it is requested. """
+        platypus.io.logs.load(TEST_LOG_V4_2_0_FILENAME)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_get_invalid(self):
+        """ Test that missing or unreadable entries are cache misses. """
+        self.assertIsNone(platypus.io.cache.get('missing'))
+
+        with open(os.path.join(self.cache_dir, 'invalid.pkl'), 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertIsNone(platypus.io.cache.get('invalid'))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_evict(self):
+        """ Test that the least recently used entries are evicted. """
+        data = {'values': list(range(1000))}
+        for cache_key in ('a', 'b', 'c'):
+            platypus.io.cache.put(cache_key, data)
+        size = os.path.getsize(os.path.join(self.cache_dir, 'a.pkl'))
+
+        # Set the access times of each entry, then use entry 'a' again.
+        for i, cache_key in enumerate(('a', 'b', 'c')):
+            path = os.path.join(self.cache_dir, cache_key + '.pkl')
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        self.assertEqual(platypus.io.cache.get('a'), data)
+
+        platypus.io.cache.evict(max_size=2 * size)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         ['a.pkl', 'c.pkl'])
+
+        platypus.io.cache.clear()
+        self.assertEqual(os.listdir(self.cache_dir), [])
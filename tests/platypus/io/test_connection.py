@@ -0,0 +1,123 @@
+import collections
+import multiprocessing
+import pickle
+import unittest
+from unittest import TestCase
+
+try:
+    import mongomock
+    import mongomock.gridfs
+    import platypus.io.connection
+    mongomock.gridfs.enable_gridfs_integration()
+except ImportError:
+    mongomock = None
+
+
+class ClientFactory(object):
+    """ Creates in-memory clients, recording the settings of each. """
+    def __init__(self):
+        self.settings = []
+
+    def __call__(self, **kwargs):
+        self.settings.append(kwargs)
+        return mongomock.MongoClient()
+
+
+def _check_client(manager, queue):
+    """ Reports whether a forked process created its own client. """
+    manager['datasets'].insert_one({'name': 'child'})
+    queue.put(len(manager.client_factory.settings))
+
+
+def _check_lock(manager, queue):
+    """ Reports whether a forked process can use an inherited manager. """
+    queue.put(manager.gridfs('logs') is not None)
+
+
+@unittest.skipIf(mongomock is None, "requires mongomock")
+class ConnectionManagerTest(TestCase):
+    def setUp(self):
+        self.factory = ClientFactory()
+        self.manager = platypus.io.connection.ConnectionManager(
+            'mongodb://example:27017', 'meteor', max_pool_size=10,
+            timeout=500, client_factory=self.factory)
+
+    def tearDown(self):
+        self.manager.close()
+
+    def test_cached_handles(self):
+        """ Test that a single client and cached handles are used. """
+        self.assertIs(self.manager['datasets'], self.manager['datasets'])
+        self.assertIs(self.manager.gridfs('logs'), self.manager.gridfs('logs'))
+        self.assertIs(self.manager.db.client, self.manager.client)
+        self.assertEqual(self.manager['datasets'].name, 'datasets')
+        self.assertEqual(self.manager.db.name, 'meteor')
+
+        self.assertEqual(self.factory.settings, [{
+            'host': 'mongodb://example:27017',
+            'maxPoolSize': 10,
+            'serverSelectionTimeoutMS': 500,
+            'waitQueueTimeoutMS': 500,
+            'event_listeners': [self.manager.commands],
+        }])
+
+    def test_command_counter(self):
+        """ Test that the commands sent to the server are counted. """
+        Event = collections.namedtuple('Event', ['command_name'])
+        commands = self.manager.commands
+        for name in ('find', 'find', 'insert'):
+            commands.started(Event(name))
+            commands.succeeded(Event(name))
+        self.assertEqual(commands.counts, {'find': 2, 'insert': 1})
+        self.assertEqual(commands.total, 3)
+
+        commands.reset()
+        self.assertEqual(commands.total, 0)
+
+    def test_close(self):
+        """ Test that a closed manager reconnects on next use. """
+        datasets = self.manager['datasets']
+        self.manager.close()
+        self.assertIsNot(self.manager['datasets'], datasets)
+        self.assertEqual(len(self.factory.settings), 2)
+
+    def test_pickle(self):
+        """ Test that a pickled manager opens its own client. """
+        datasets = self.manager['datasets']
+        manager = pickle.loads(pickle.dumps(self.manager))
+        self.assertEqual(manager.host, 'mongodb://example:27017')
+        self.assertIsNot(manager['datasets'], datasets)
+        self.assertEqual(len(manager.client_factory.settings), 2)
+
+    @unittest.skipIf(not hasattr(multiprocessing, 'get_start_method') or
+                     multiprocessing.get_start_method() != 'fork',
+                     "requires forked processes")
+    def test_fork(self):
+        """ Test that a forked process does not reuse the parent client. """
+        self.manager['datasets'].insert_one({'name': 'parent'})
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_check_client,
+                                          args=(self.manager, queue))
+        process.start()
+        self.assertEqual(queue.get(), 2)
+        process.join()
+
+        # Test that the parent client is still used by the parent.
+        self.assertEqual(len(self.factory.settings), 1)
+        self.assertEqual(self.manager['datasets'].count_documents({}), 1)
+
+    @unittest.skipIf(not hasattr(multiprocessing, 'get_start_method') or
+                     multiprocessing.get_start_method() != 'fork',
+                     "requires forked processes")
+    def test_fork_locked(self):
+        """ Test that a process forked while the lock is held can connect. """
+        queue = multiprocessing.Queue()
+        with self.manager._lock:
+            process = multiprocessing.Process(target=_check_lock,
+                                              args=(self.manager, queue))
+            process.start()
+        try:
+            self.assertTrue(queue.get(timeout=10))
+        finally:
+            process.terminate()
+            process.join()
@@ -0,0 +1,504 @@
+import collections
+import io
+import multiprocessing
+import os
+import pandas
+import threading
+import time
+import unittest
+from bson.timestamp import Timestamp
+from unittest import TestCase
+
+try:
+    import mongomock
+    import mongomock.gridfs
+    import gridfs
+    import platypus.io.connection
+    import platypus.io.db
+    mongomock.gridfs.enable_gridfs_integration()
+except ImportError:
+    mongomock = None
+
+TEST_LOG_FILENAMES = [
+    os.path.join(os.path.dirname(__file__), filename)
+    for filename in ('platypus_20160519_013623.txt',
+                     'platypus_20160426_024734.txt',
+                     'airboat_20130807_063622.txt')
+]
+
+
+def make_database(filenames):
+    """ Creates an in-memory database containing a dataset of logs. """
+    db = mongomock.MongoClient().meteor
+    fs = gridfs.GridFS(db, 'cfs_gridfs.logs_gridfs')
+
+    log_ids = []
+    for filename in filenames:
+        with open(filename, 'rb') as log_file:
+            key = fs.put(log_file.read())
+        log_ids.append(db['cfs.logs.filerecord'].insert_one({
+            'copies': {'logs_gridfs': {'key': str(key)}},
+            'original': {'name': os.path.basename(filename)},
+        }).inserted_id)
+
+    dataset_id = db['datasets'].insert_one({'logs': log_ids}).inserted_id
+    return db, dataset_id
+
+
+class CountingCollection(object):
+    """ Counts the queries made to an in-memory collection. """
+    def __init__(self, collection, counts):
+        self.collection = collection
+        self.counts = counts
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        def count(*args, **kwargs):
+            self.counts[self.collection.name] += 1
+            return method(*args, **kwargs)
+        return count
+
+
+if mongomock is not None:
+    class CountingConnectionManager(platypus.io.connection.ConnectionManager):
+        """ Counts the queries made to each collection of a database. """
+        def __init__(self, db):
+            super(CountingConnectionManager, self).__init__(
+                database=db.name, client_factory=lambda **kwargs: db.client)
+            self.counts = collections.Counter()
+
+        def __getitem__(self, name):
+            collection = super(CountingConnectionManager,
+                               self).__getitem__(name)
+            return CountingCollection(collection, self.counts)
+
+
+class FakeCursor(object):
+    """ Iterates over oplog entries until they are exhausted. """
+    def __init__(self, entries):
+        self.entries = entries
+        self.alive = True
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield entry
+        self.alive = False
+
+
+class FakeOplog(object):
+    """ An in-process stand-in for the oplog collection. """
+    def __init__(self, entries):
+        self.entries = entries
+
+    def find(self, spec, **kwargs):
+        return FakeCursor([entry for entry in self.entries
+                           if entry['ts'] > spec['ts']['$gt'] and
+                           entry['ns'] == spec['ns'] and
+                           entry['op'] == spec['op']])
+
+    def find_one(self, sort=None):
+        return self.entries[-1] if self.entries else None
+
+
+def make_oplog(dataset_ids, ns='meteor.datasets'):
+    """ Creates an oplog containing an update for each dataset ID. """
+    return FakeOplog([{'ts': Timestamp(1000, i + 1), 'ns': ns, 'op': 'u',
+                       'o2': {'_id': dataset_id}}
+                      for i, dataset_id in enumerate(dataset_ids)])
+
+
+@unittest.skipIf(mongomock is None, "requires mongomock")
+class DbTest(TestCase):
+    def test_load(self):
+        """ Test loading and merging all of the logs in a dataset. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES)
+        dataset = db['datasets'].find_one(dataset_id)
+        data = platypus.io.db.load(db, dataset, workers=1)
+
+        # Test that the data from every log was merged in time order.
+        self.assertEqual(data['pose'].shape, (571 + 211 + 95, 7))
+        self.assertEqual(data['BATTERY'].shape, (46 + 12, 3))
+        self.assertEqual(data['es2'].shape, (22, 2))
+        for v in data.values():
+            self.assertTrue(v.index.is_monotonic_increasing)
+
+    @unittest.skipIf(not hasattr(multiprocessing, 'get_start_method') or
+                     multiprocessing.get_start_method() != 'fork',
+                     "requires forked processes")
+    def test_load_parallel(self):
+        """ Test that parsing logs in worker processes gives same results. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES)
+        dataset = db['datasets'].find_one(dataset_id)
+        data_serial = platypus.io.db.load(db, dataset, workers=1)
+
+        # (Forked workers stream logs from their copy of the database.)
+        manager = platypus.io.connection.ConnectionManager(
+            database=db.name, client_factory=lambda **kwargs: db.client)
+        data_parallel = platypus.io.db.load(manager, dataset, workers=2)
+
+        self.assertEqual(set(data_serial), set(data_parallel))
+        for k, v in data_serial.items():
+            self.assertTrue(v.equals(data_parallel[k]))
+
+        # Test that logs from a database without a manager are parsed here.
+        with self.assertLogs('platypus.io.db', 'WARNING'):
+            data_database = platypus.io.db.load(db, dataset, workers=2)
+        for k, v in data_serial.items():
+            self.assertTrue(v.equals(data_database[k]))
+
+    def test_process_connection_manager(self):
+        """ Test processing using a shared connection manager. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES)
+        manager = platypus.io.connection.ConnectionManager(
+            database=db.name, client_factory=lambda **kwargs: db.client)
+        platypus.io.db.process(manager, dataset_id, workers=1)
+
+        self.assertEqual(db['datasets'].find_one(dataset_id)['processed'], 1.0)
+        self.assertIs(manager.gridfs('cfs_gridfs.logs_gridfs'),
+                      manager.gridfs('cfs_gridfs.logs_gridfs'))
+
+    def test_fetch_logs(self):
+        """ Test that filerecords are retrieved in a single query. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES * 2)
+        dataset = db['datasets'].find_one(dataset_id)
+        manager = CountingConnectionManager(db)
+        logs = list(platypus.io.db._fetch_logs(manager, dataset))
+
+        self.assertEqual(manager.counts, {'cfs.logs.filerecord': 1})
+        self.assertEqual([filename for _, filename in logs],
+                         [os.path.basename(filename)
+                          for filename in TEST_LOG_FILENAMES * 2])
+        for (log_file, _), filename in zip(logs, TEST_LOG_FILENAMES * 2):
+            with open(filename, 'rb') as expected:
+                self.assertEqual(log_file.read(), expected.read())
+
+    def test_store_series(self):
+        """ Test that time series are stored in time-bucketed documents. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES)
+        data = platypus.io.db.load(db, db['datasets'].find_one(dataset_id),
+                                   workers=1)
+        count = platypus.io.db.store_series(db, dataset_id, data,
+                                            batch_size=3, interval=60)
+        series = db[platypus.io.db.SERIES_COLLECTION]
+        self.assertEqual(series.count_documents({}), count)
+
+        # Test that the samples of each type can be reassembled.
+        for name, df in data.items():
+            documents = list(series.find({'dataset': dataset_id,
+                                          'type': name}).sort('start', 1))
+            self.assertEqual(sum(d['count'] for d in documents), len(df))
+            self.assertEqual(documents[0]['start'],
+                             df.index[0].to_pydatetime())
+            for d in documents:
+                self.assertEqual(d['start'].minute, d['end'].minute)
+                self.assertLessEqual(len(d['time']),
+                                     platypus.io.db.SERIES_MAX_SAMPLES)
+            values = [v for d in documents for v in d['values'][df.columns[0]]]
+            self.assertEqual(values, df[df.columns[0]].tolist())
+
+            # Test that the sample times can be reassembled.
+            times = [pandas.Timestamp(d['start']) +
+                     pandas.Timedelta(milliseconds=t)
+                     for d in documents for t in d['time']]
+            self.assertEqual(times, list(df.index))
+
+        # Test that documents do not depend on the unit of the time index.
+        df = data['pose']
+        df_ms = df.copy()
+        df_ms.index = df.index.values.astype('datetime64[ms]')
+        self.assertEqual(
+            list(platypus.io.db._series_documents(dataset_id, 'pose', df_ms)),
+            list(platypus.io.db._series_documents(dataset_id, 'pose', df)))
+
+        # Test that storing the series again replaces them.
+        self.assertEqual(platypus.io.db.store_series(db, dataset_id, data,
+                                                     interval=60), count)
+        self.assertEqual(series.count_documents({}), count)
+
+    def test_iter_lines(self):
+        """ Test that lines are decoded across chunk boundaries. """
+        content = u'first\r\nsecond \u00b0C\nthird'.encode('utf-8')
+        for chunk_size in range(1, len(content) + 1):
+            self.assertEqual(
+                list(platypus.io.db._iter_lines(io.BytesIO(content),
+                                                chunk_size)),
+                [u'first', u'second \u00b0C', u'third'])
+
+        # Test that lines are only split at newlines.
+        content = u'a\u2028b\x1c\x85c\r\n\nd\n'.encode('utf-8')
+        for chunk_size in (1, 4, len(content)):
+            self.assertEqual(
+                list(platypus.io.db._iter_lines(io.BytesIO(content),
+                                                chunk_size)),
+                [u'a\u2028b\x1c\x85c', u'', u'd'])
+
+    def test_read_log(self):
+        """ Test that records containing line separators are parsed. """
+        def read_log(content):
+            return platypus.io.logs.read(
+                platypus.io.db._iter_lines(io.BytesIO(content)),
+                filename='log.txt')
+
+        with open(TEST_LOG_FILENAMES[0], 'rb') as log_file:
+            content = log_file.read()
+        data = read_log(content)
+
+        # Add a pose whose JSON contains an unescaped line separator.
+        content += u'60100\tI\t{"pose":{"p":[592301.0,4481762.5,252],' \
+            u'"q":[0,0,0,1],"zone":"17North","note":"a\u2028b"}}\n' \
+            .encode('utf-8')
+        separated = read_log(content)
+        self.assertEqual(len(separated['pose']), len(data['pose']) + 1)
+
+    def test_load_invalid(self):
+        """ Test that logs without any available source are rejected. """
+        db, dataset_id = make_database([])
+        log_id = db['cfs.logs.filerecord'].insert_one({
+            'copies': {}, 'original': {'name': 'missing.txt'}}).inserted_id
+        db['datasets'].update_one({'_id': dataset_id},
+                                  {'$set': {'logs': [log_id]}})
+        dataset = db['datasets'].find_one(dataset_id)
+
+        with self.assertRaises(ValueError):
+            platypus.io.db.load(db, dataset, workers=1)
+
+        # Test that logs without a filerecord are rejected.
+        db['cfs.logs.filerecord'].delete_one({'_id': log_id})
+        with self.assertRaises(ValueError):
+            platypus.io.db.load(db, dataset, workers=1)
+
+    def test_process(self):
+        """ Test that processing stores the bounds and path of a dataset. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES)
+        platypus.io.db.process(db, dataset_id, workers=1)
+        dataset = db['datasets'].find_one(dataset_id)
+
+        self.assertEqual(dataset['processed'], 1.0)
+        self.assertEqual(dataset['bounds']['geo']['type'], 'Polygon')
+        self.assertTrue(db[platypus.io.db.SERIES_COLLECTION].count_documents(
+            {'dataset': dataset_id, 'type': 'pose'}) > 0)
+
+        # Test that coarser levels of detail have fewer vertices.
+        levels = dataset['path']['levels']
+        self.assertEqual([level['tolerance'] for level in levels],
+                         list(platypus.io.db.PATH_TOLERANCES))
+        self.assertEqual(dataset['path']['geo'], levels[0]['geo'])
+        vertices = [len(level['geo']['coordinates']) for level in levels]
+        self.assertEqual(vertices, sorted(vertices, reverse=True))
+        self.assertTrue(2 <= vertices[-1] <= vertices[0] < 570 + 211 + 95)
+
+    def test_process_unchanged(self):
+        """ Test that datasets are only processed when their logs change. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES)
+        log_ids = db['datasets'].find_one(dataset_id)['logs']
+        db['datasets'].update_one({'_id': dataset_id},
+                                  {'$set': {'logs': log_ids[:2]}})
+        self.assertTrue(platypus.io.db.process(db, dataset_id, workers=1))
+        fingerprint = db['datasets'].find_one(dataset_id)['fingerprint']
+
+        # Test that an unchanged dataset is skipped without parsing its logs.
+        manager = CountingConnectionManager(db)
+        self.assertFalse(platypus.io.db.process(manager, dataset_id,
+                                                workers=1))
+        self.assertEqual(manager.counts, {'datasets': 1,
+                                          'cfs.logs.filerecord': 1})
+        self.assertTrue(platypus.io.db.process(db, dataset_id, workers=1,
+                                               force=True))
+
+        # Test that adding a log changes the fingerprint.
+        db['datasets'].update_one({'_id': dataset_id},
+                                  {'$set': {'logs': log_ids}})
+        self.assertTrue(platypus.io.db.process(db, dataset_id, workers=1))
+        self.assertNotEqual(db['datasets'].find_one(dataset_id)['fingerprint'],
+                            fingerprint)
+
+        # Test that a dataset is reprocessed if it is marked as unprocessed.
+        db['datasets'].update_one({'_id': dataset_id},
+                                  {'$set': {'processed': 0.0}})
+        self.assertTrue(platypus.io.db.process(db, dataset_id, workers=1))
+
+
+@unittest.skipIf(mongomock is None, "requires mongomock")
+class DatasetConsumerTest(TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient().meteor
+        self.processed = []
+        self.lock = threading.Lock()
+
+    def handler(self, dataset_id):
+        with self.lock:
+            self.processed.append(dataset_id)
+
+    def test_coalesce(self):
+        """ Test that repeated updates to a dataset are processed once. """
+        oplog = make_oplog(['a', 'a', 'b', 'a', 'b'])
+        consumer = platypus.io.db.DatasetConsumer(
+            self.db, window=0.2, handler=self.handler)
+        consumer.resume_ts = Timestamp(0, 0)
+        try:
+            consumer.run(oplog, 'meteor.datasets', follow=False)
+        finally:
+            consumer.close()
+
+        self.assertEqual(sorted(self.processed), ['a', 'b'])
+        self.assertEqual(
+            self.db[platypus.io.db.STATE_COLLECTION].find_one()['ts'],
+            Timestamp(1000, 5))
+
+    def test_resume(self):
+        """ Test that a consumer resumes after the persisted timestamp. """
+        self.db[platypus.io.db.STATE_COLLECTION].insert_one(
+            {'_id': 'oplog', 'ts': Timestamp(1000, 2)})
+        oplog = make_oplog(['a', 'b', 'c', 'd'])
+        oplog.entries.append({'ts': Timestamp(1000, 5), 'ns': 'meteor.logs',
+                              'op': 'u', 'o2': {'_id': 'e'}})
+        consumer = platypus.io.db.DatasetConsumer(
+            self.db, window=0, handler=self.handler)
+        try:
+            consumer.run(oplog, 'meteor.datasets', follow=False)
+        finally:
+            consumer.close()
+
+        self.assertEqual(sorted(self.processed), ['c', 'd'])
+        self.assertEqual(consumer.resume_ts, Timestamp(1000, 4))
+
+    def test_start(self):
+        """ Test that a new consumer persists its starting timestamp. """
+        consumer = platypus.io.db.DatasetConsumer(
+            self.db, window=0, handler=self.handler)
+        try:
+            consumer.run(make_oplog(['a', 'b']), 'meteor.datasets',
+                         follow=False)
+        finally:
+            consumer.close()
+
+        self.assertEqual(self.processed, [])
+        self.assertEqual(
+            self.db[platypus.io.db.STATE_COLLECTION].find_one()['ts'],
+            Timestamp(1000, 2))
+
+    def test_failure(self):
+        """ Test that a failed dataset does not stop the consumer. """
+        def handler(dataset_id):
+            if dataset_id == 'a':
+                raise ValueError("Invalid dataset.")
+            self.handler(dataset_id)
+
+        consumer = platypus.io.db.DatasetConsumer(
+            self.db, window=0, handler=handler)
+        consumer.resume_ts = Timestamp(0, 0)
+        try:
+            consumer.run(make_oplog(['a', 'b']), 'meteor.datasets',
+                         follow=False)
+        finally:
+            consumer.close()
+
+        # Test that the resume timestamp stays before the failed dataset.
+        self.assertEqual(self.processed, ['b'])
+        self.assertEqual(consumer.resume_ts, Timestamp(0, 0))
+
+    def test_retry(self):
+        """ Test that a failed dataset is retried. """
+        failures = []
+
+        def handler(dataset_id):
+            if dataset_id == 'a' and not failures:
+                failures.append(dataset_id)
+                raise ValueError("Temporary failure.")
+            self.handler(dataset_id)
+
+        consumer = platypus.io.db.DatasetConsumer(
+            self.db, window=0, handler=handler, retry_delay=0)
+        consumer.resume_ts = Timestamp(0, 0)
+        try:
+            consumer.run(make_oplog(['a', 'b']), 'meteor.datasets',
+                         follow=False)
+        finally:
+            consumer.close()
+
+        self.assertEqual(failures, ['a'])
+        self.assertEqual(sorted(self.processed), ['a', 'b'])
+        self.assertEqual(consumer.resume_ts, Timestamp(1000, 2))
+
+    def test_restart_after_failure(self):
+        """ Test that a restarted consumer retries a failed dataset. """
+        def handler(dataset_id):
+            if dataset_id == 'b':
+                raise ValueError("Invalid dataset.")
+            self.handler(dataset_id)
+
+        self.db[platypus.io.db.STATE_COLLECTION].insert_one(
+            {'_id': 'oplog', 'ts': Timestamp(1000, 0)})
+        oplog = make_oplog(['a', 'b', 'c'])
+        consumer = platypus.io.db.DatasetConsumer(
+            self.db, window=0, handler=handler)
+        try:
+            consumer.run(oplog, 'meteor.datasets', follow=False)
+        finally:
+            consumer.close()
+
+        self.assertEqual(sorted(self.processed), ['a', 'c'])
+        self.assertEqual(
+            self.db[platypus.io.db.STATE_COLLECTION].find_one()['ts'],
+            Timestamp(1000, 1))
+
+        # Test that the restarted consumer resumes from the failed dataset.
+        self.processed = []
+        consumer = platypus.io.db.DatasetConsumer(
+            self.db, window=0, handler=self.handler)
+        try:
+            consumer.run(oplog, 'meteor.datasets', follow=False)
+        finally:
+            consumer.close()
+
+        self.assertEqual(sorted(self.processed), ['b', 'c'])
+        self.assertEqual(
+            self.db[platypus.io.db.STATE_COLLECTION].find_one()['ts'],
+            Timestamp(1000, 3))
+
+    @unittest.skipIf(not hasattr(multiprocessing, 'get_start_method') or
+                     multiprocessing.get_start_method() != 'fork',
+                     "requires forked processes")
+    def test_worker_pool(self):
+        """ Test that jobs parse logs using a shared pool of workers. """
+        db, dataset_id = make_database(TEST_LOG_FILENAMES)
+        manager = platypus.io.connection.ConnectionManager(
+            database=db.name, client_factory=lambda **kwargs: db.client)
+        consumer = platypus.io.db.DatasetConsumer(manager, window=0,
+                                                  workers=2)
+        consumer.resume_ts = Timestamp(0, 0)
+        try:
+            self.assertIsNotNone(consumer._workers)
+            consumer.run(make_oplog([dataset_id]), 'meteor.datasets',
+                         follow=False)
+        finally:
+            consumer.close()
+
+        self.assertEqual(consumer.resume_ts, Timestamp(1000, 1))
+        self.assertEqual(db['datasets'].find_one(dataset_id)['processed'], 1.0)
+
+    def test_jobs(self):
+        """ Test that no more than the maximum number of jobs run at once. """
+        running = [0, 0]
+
+        def handler(dataset_id):
+            with self.lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.05)
+            with self.lock:
+                running[0] -= 1
+            self.handler(dataset_id)
+
+        consumer = platypus.io.db.DatasetConsumer(
+            self.db, jobs=2, window=0, handler=handler)
+        consumer.resume_ts = Timestamp(0, 0)
+        try:
+            consumer.run(make_oplog(['a', 'b', 'c', 'd', 'e']),
+                         'meteor.datasets', follow=False)
+        finally:
+            consumer.close()
+
+        self.assertEqual(sorted(self.processed), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(running[1], 2)
@@ -1,4 +1,5 @@
 import platypus.io.logs
+import platypus.util.conversions
 import os
 from unittest import TestCase
 
@@ -18,9 +19,72 @@ TEST_LOG_V4_2_0_FILENAME = os.path.join(
 class LogsTest(TestCase):
     def test_load(self):
         """ Test auto-sensing version of log loader. """
-        platypus.io.logs.load(TEST_LOG_V4_0_0_FILENAME)
-        platypus.io.logs.load(TEST_LOG_V4_1_0_FILENAME)
-        platypus.io.logs.load(TEST_LOG_V4_2_0_FILENAME)
+        platypus.io.logs.load(TEST_LOG_V4_0_0_FILENAME, cache=False)
+        platypus.io.logs.load(TEST_LOG_V4_1_0_FILENAME, cache=False)
+        platypus.io.logs.load(TEST_LOG_V4_2_0_FILENAME, cache=False)
+
+    def test_load_index(self):
+        """ Test that every reader returns a nanosecond time index. """
+        for filename in (TEST_LOG_V4_0_0_FILENAME,
+                         TEST_LOG_V4_1_0_FILENAME,
+                         TEST_LOG_V4_2_0_FILENAME):
+            log = platypus.io.logs.load(filename, cache=False)
+            for v in log.values():
+                self.assertEqual(v.index.dtype, 'datetime64[ns]')
+                self.assertEqual(v.index.name, 'time')
+
+    def test_load_memory_map(self):
+        """ Test that memory-mapped loading matches the line iterator. """
+        for filename in (TEST_LOG_V4_0_0_FILENAME,
+                         TEST_LOG_V4_0_0_SENSOR_FILENAME,
+                         TEST_LOG_V4_1_0_FILENAME,
+                         TEST_LOG_V4_2_0_FILENAME):
+            log = platypus.io.logs.load(filename, cache=False)
+            log_mmap = platypus.io.logs.load(filename, cache=False,
+                                             memory_map=True)
+            self.assertEqual(set(log), set(log_mmap))
+            for k, v in log.items():
+                self.assertTrue(v.equals(log_mmap[k]))
+
+    def test_load_parallel(self):
+        """ Test that parsing byte ranges in parallel matches serial load. """
+        for filename in (TEST_LOG_V4_0_0_FILENAME,
+                         TEST_LOG_V4_0_0_SENSOR_FILENAME,
+                         TEST_LOG_V4_1_0_FILENAME,
+                         TEST_LOG_V4_2_0_FILENAME):
+            log = platypus.io.logs.load(filename, cache=False)
+            log_parallel = platypus.io.logs.load(filename, cache=False,
+                                                 workers=3)
+            self.assertEqual(set(log), set(log_parallel))
+            for k, v in log.items():
+                self.assertTrue(v.equals(log_parallel[k]))
+
+    def test_load_parallel_date(self):
+        """ Test that parallel ranges use the start time of earlier ranges. """
+        import shutil
+        import tempfile
+
+        lines = []
+        for i in range(20):
+            if i % 7 == 0:
+                lines.append('{:d}\tI\t{{"date":"","time":{:d}}}\n'
+                             .format(i * 10, 1000000 * i))
+            lines.append('{:d}\tI\t{{"sensor":{{"type":"ATLAS_DO",'
+                         '"data":[{:d}]}}}}\n'.format(i * 10 + 5, i))
+
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'platypus.txt')
+            with open(filename, 'w') as log_file:
+                log_file.writelines(lines)
+            log = platypus.io.logs.load(filename, cache=False)
+            log_parallel = platypus.io.logs.load(filename, cache=False,
+                                                 workers=6)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(log['ATLAS_DO'].index[7].value // 1000000, 7000005)
+        self.assertTrue(log['ATLAS_DO'].equals(log_parallel['ATLAS_DO']))
 
     def test_read_v4_0_0(self):
         """ Test reading a v4.0.0 logfile. """
@@ -74,6 +138,67 @@ class LogsTest(TestCase):
         self.assertAlmostEqual(log_v4_0_0['pose']['latitude'][-1],
                                42.1927343)
 
+    def test_parse_messages_v4_0_0(self):
+        """ Test parsing each type of v4.0.0 message. """
+        parsers = platypus.io.logs._MESSAGE_PARSERS_V4_0_0
+        self.assertEqual(
+            parsers['POSE:']("POSE: {476608.34, 4671214.4, 172.35, "
+                             "Q[0.0,0.0,-1.15]} @ 17North"),
+            ('pose', [476608.34, 4671214.4, 172.35, 17, True]))
+        self.assertEqual(
+            parsers['POSE:']("POSE: {476608.34, 4671214.4, 172.35, "
+                             "Q[0.0,0.0,0.0]} @ 17South"),
+            ('pose', [476608.34, 4671214.4, 172.35, 17, False]))
+        self.assertEqual(parsers['ES2:']("ES2: [e, 9.000000, 10.000000]"),
+                         ('es2', [9.0, 10.0]))
+        self.assertEqual(
+            parsers['SENSOR']('SENSOR4: {"data":"12.463 0.000000 15.151515",'
+                              '"type":"battery"}'),
+            ('battery', [12.463, 0.0, 15.151515]))
+
+        # Test that malformed messages are not parsed.
+        for token, message in (
+                ('POSE:', "POSE: {476608.34, 4671214.4} @ 17North"),
+                ('POSE:', "POSE: {476608.34, 4671214.4, 172.35, "
+                          "Q[0.0,0.0,0.0]} @ 17East"),
+                ('ES2:', "ES2: [e, 9.000000]"),
+                ('ES2:', "ES2: [x, 9.000000, 10.000000]"),
+                ('SENSOR', 'SENSOR1: {"data":"7.78"}'),
+                ('SENSOR', 'SENSOR: {"data":"7.78","type":"atlas_do"}')):
+            self.assertIsNone(parsers[token](message))
+
+    def test_parse_v4_0_0(self):
+        """ Test that v4.0.0 records are dispatched on their tokens. """
+        filename = 'airboat_20150101_000000.txt'
+        lines = [
+            "100 00:00:00,100 POSE: {476608.34, 4671214.4, 172.35, "
+            "Q[0.0,0.0,0.0]} @ 17North \n",
+            "200 00:00:00,200 VEL: Twist[0.0, 0.0, 0.0, 0.0, 0.0, 0.0] \n",
+            "300 00:00:00,300 COMPASS: -1.1596480909789746 \n",
+            "400 00:00:00,400 ES2: [e, 9.000000, 10.000000] \n",
+            '500 00:00:00,500 SENSOR1: {"data":"7.78","type":"atlas_do"} \n',
+            "600 00:00:00,600 POSE: {476608.34} @ 17North \n",
+            "700 00:00:00,700 ES2: [e, 9.000000] \n",
+            '800 00:00:00,800 SENSOR1: {"data":"7.78"} \n',
+        ]
+
+        # Test that unknown tokens and malformed messages are skipped.
+        data = platypus.io.logs._parse_v4_0_0(lines, filename)
+        self.assertEqual(sorted(data), ['atlas_do', 'es2', 'pose'])
+        for k, time_ms in (('pose', 100), ('es2', 400), ('atlas_do', 500)):
+            self.assertEqual(len(data[k]), 1)
+            self.assertEqual(data[k].index[0].value // 1000000,
+                             1420070400000 + time_ms)
+
+        # Test that records with a malformed timestamp or time are rejected.
+        for line in ("x00 00:00:00,100 ES2: [e, 9.000000, 10.000000]\n",
+                     "100 00:00,100 ES2: [e, 9.000000, 10.000000]\n",
+                     "100 ES2: [e, 9.000000, 10.000000]\n",
+                     "100\n"):
+            with self.assertLogs('platypus.io.logs', 'WARNING'):
+                data = platypus.io.logs._parse_v4_0_0([line], filename)
+            self.assertNotIn('es2', data)
+
     def test_read_v4_1_0(self):
         """ Test reading a v4.1.0 logfile. """
         with open(TEST_LOG_V4_1_0_FILENAME) as log_file:
@@ -127,3 +252,147 @@ class LogsTest(TestCase):
         self.assertAlmostEqual(log['pose']['northing'][0], 4481766.791869606)
         self.assertAlmostEqual(log['pose']['easting'][-1], 592300.9984074512)
         self.assertAlmostEqual(log['pose']['northing'][-1], 4481762.477492471),
+
+    def test_iter_v4_2_0(self):
+        """ Test iteratively reading a v4.2.0 logfile in chunks. """
+        import pandas
+
+        with open(TEST_LOG_V4_2_0_FILENAME) as log_file:
+            log_str = log_file.readlines()
+        log = platypus.io.logs.read_v4_2_0(log_str)
+        chunks = list(platypus.io.logs.iter_v4_2_0(log_str, chunk_rows=100))
+
+        # Test that every chunk is bounded by the chunk size.
+        self.assertEqual(len(chunks), 8)
+        for chunk in chunks:
+            self.assertLessEqual(sum(len(v) for v in chunk.values()), 100)
+
+        # Test that the chunks contain the same data as the whole log.
+        battery = pandas.concat([c['BATTERY'] for c in chunks
+                                 if 'BATTERY' in c])
+        self.assertTrue(battery.equals(log['BATTERY']))
+
+        # Test that outliers are not removed from the pose chunks.
+        pose = pandas.concat([c['pose'] for c in chunks if 'pose' in c])
+        self.assertEqual(pose.shape, (600, 7))
+        self.assertTrue(platypus.util.conversions
+                        .remove_outliers_from_pose_dataframe(pose)
+                        .equals(log['pose']))
+
+    def test_iter_v4_2_0_date(self):
+        """ Test that timestamps are re-anchored across chunks. """
+        log_str = [
+            '0\tI\t{"date":"Thu Jan 01 00:00:01 UTC 1970","time":1000}\n',
+            '10\tI\t{"sensor":{"type":"ATLAS_DO","data":[1.0]}}\n',
+            '20\tI\t{"sensor":{"type":"ATLAS_DO","data":[2.0]}}\n',
+            '30\tI\t{"date":"Thu Jan 01 00:00:10 UTC 1970","time":10000}\n',
+            '40\tI\t{"sensor":{"type":"ATLAS_DO","data":[3.0]}}\n',
+        ]
+        chunks = list(platypus.io.logs.iter_v4_2_0(log_str, chunk_rows=1))
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual([c['ATLAS_DO'].index[0].value // 1000000
+                          for c in chunks], [1010, 1020, 10010])
+
+    def test_read_v4_2_0_unknown_sensor(self):
+        """ Test reading unknown sensors with varying numbers of values. """
+        import numpy
+
+        log_str = [
+            '10\tI\t{"sensor":{"type":"UNKNOWN","data":[1.0]}}\n',
+            '20\tI\t{"sensor":{"type":"UNKNOWN","data":[2.0, 3.0]}}\n',
+            '30\tI\t{"sensor":{"type":"UNKNOWN","data":[4.0, "x"]}}\n',
+        ]
+        log = platypus.io.logs.read_v4_2_0(log_str)
+
+        self.assertEqual(log['UNKNOWN'].shape, (3, 2))
+        self.assertEqual(list(log['UNKNOWN'][1]), [1.0, 2.0, 4.0])
+        self.assertTrue(numpy.isnan(log['UNKNOWN'][2].iloc[0]))
+        self.assertEqual(list(log['UNKNOWN'][2].iloc[1:]), [3.0, 'x'])
+        self.assertEqual(log['UNKNOWN'].index[-1].value // 1000000, 30)
+
+    def test_read_v4_2_0_skip_unused(self):
+        """ Test that unused log entries are skipped without decoding. """
+        log_str = [
+            '0\tI\t{"date":"Thu Jan 01 00:00:01 UTC 1970","time":1000}\n',
+            '10\tI\t{"cmd":<not decoded>}\n',
+            '20\tI\t{"sensor":{"type":"ATLAS_DO","data":[1.0]}}\n',
+        ]
+        log = platypus.io.logs.read_v4_2_0(log_str)
+
+        self.assertEqual(list(log.keys()), ['ATLAS_DO'])
+        self.assertEqual(log['ATLAS_DO'].index[0].value // 1000000, 1020)
+
+        # Test that entries which are used must still be valid JSON.
+        with self.assertRaises(ValueError):
+            platypus.io.logs.read_v4_2_0(['10\tI\t{"pose":<invalid>}\n'])
+
+    def test_merge(self):
+        """ Test merging overlapping logs into a single dataset. """
+        with open(TEST_LOG_V4_2_0_FILENAME) as log_file:
+            log_str = log_file.readlines()
+        log = platypus.io.logs.read_v4_2_0(log_str)
+        log_start = platypus.io.logs.read_v4_2_0(log_str[:800])
+        log_end = platypus.io.logs.read_v4_2_0(log_str[:1] + log_str[600:])
+
+        # Test that records which appear in both logs are only merged once.
+        merged = platypus.io.logs.merge([log_end, log_start])
+        self.assertEqual(set(merged), set(log))
+        for k in ('BATTERY', 'ATLAS_DO', 'ATLAS_PH', 'ES2'):
+            self.assertTrue(merged[k].equals(log[k]))
+        self.assertTrue(merged['pose'].index.is_monotonic_increasing)
+
+        # Test that identical records within a single log are all kept.
+        duplicated = log['pose'].reset_index().duplicated().values
+        self.assertTrue(duplicated.any())
+        merged = platypus.io.logs.merge([log, log_start])
+        self.assertTrue(merged['pose'].equals(log['pose']))
+
+    def test_log_follower(self):
+        """ Test following a logfile while it is being written. """
+        import pandas
+        import shutil
+        import tempfile
+
+        with open(TEST_LOG_V4_2_0_FILENAME) as log_file:
+            content = log_file.read()
+        log = platypus.io.logs.read_v4_2_0(content.splitlines(True))
+
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'platypus.txt')
+            open(filename, 'w').close()
+            follower = platypus.io.logs.LogFollower(filename)
+            self.assertEqual(follower.poll(), {})
+
+            # Append the log in pieces that split lines, polling each time.
+            polls = []
+            for start in range(0, len(content), 10000):
+                with open(filename, 'a') as log_file:
+                    log_file.write(content[start:start + 10000])
+                polls.append(follower.poll())
+            self.assertEqual(follower.poll(), {})
+        finally:
+            shutil.rmtree(directory)
+
+        battery = pandas.concat([p['BATTERY'] for p in polls
+                                 if 'BATTERY' in p])
+        self.assertTrue(battery.equals(log['BATTERY']))
+
+        pose = pandas.concat([p['pose'] for p in polls if 'pose' in p])
+        self.assertTrue(platypus.util.conversions
+                        .remove_outliers_from_pose_dataframe(pose)
+                        .equals(log['pose']))
+
+    def test_iter_v4_2_0_remove_outliers(self):
+        """ Test removing outliers while iteratively reading a logfile. """
+        import pandas
+
+        with open(TEST_LOG_V4_2_0_FILENAME) as log_file:
+            log_str = log_file.readlines()
+        log = platypus.io.logs.read_v4_2_0(log_str)
+        chunks = platypus.io.logs.iter_v4_2_0(log_str, chunk_rows=200,
+                                              remove_outliers=True)
+
+        pose = pandas.concat([c['pose'] for c in chunks if 'pose' in c])
+        self.assertTrue(pose.equals(log['pose']))
@@ -1,13 +1,219 @@
 import platypus.util.conversions
+import numpy
+import pandas
+import scipy.spatial
+import utm
 from unittest import TestCase
 
 
-class ConversionsTest:  # (TestCase):
+def make_pose_dataframe():
+    """ Creates a small pose dataframe that spans multiple UTM zones. """
+    return pandas.DataFrame({
+        'easting': [592295.40, 592300.99, 337185.12, 337679.21, 500000.0],
+        'northing': [4481766.79, 4481762.47, 4467663.66, 4467651.47, 10.0],
+        'altitude': [0.0, 0.0, 0.0, 0.0, 0.0],
+        'zone': [18, 18, 17, 17, 33],
+        'hemi': [True, True, True, True, False],
+    }, columns=('easting', 'northing', 'altitude', 'zone', 'hemi'))
+
+
+def region_contains(region, df):
+    """ Tests whether a counter-clockwise region contains every position. """
+    ring = numpy.array(region['coordinates'][0])
+    x, y = df['longitude'].values, df['latitude'].values
+    for (x1, y1), (x2, y2) in zip(ring[:-1], ring[1:]):
+        if ((x2 - x1) * (y - y1) - (y2 - y1) * (x - x1) < -1e-15).any():
+            return False
+    return True
+
+
+class ConversionsTest(TestCase):
     def test_add_ll_to_pose_dataframe(self):
-        self.fail("Test not implemented yet!")
+        """ Test batched conversion against per-pose UTM conversion. """
+        df = platypus.util.conversions.add_ll_to_pose_dataframe(
+            make_pose_dataframe())
+
+        for _, row in df.iterrows():
+            latitude, longitude = utm.to_latlon(
+                row['easting'], row['northing'],
+                int(row['zone']), northern=bool(row['hemi']))
+            self.assertAlmostEqual(row['latitude'], latitude)
+            self.assertAlmostEqual(row['longitude'], longitude)
+
+        # Test that the input coordinates were not modified.
+        self.assertTrue(numpy.allclose(
+            df[['easting', 'northing']].values,
+            make_pose_dataframe()[['easting', 'northing']].values))
+
+    def test_add_ll_to_empty_pose_dataframe(self):
+        """ Test conversion of a dataframe without any poses. """
+        df = platypus.util.conversions.add_ll_to_pose_dataframe(
+            make_pose_dataframe()[0:0])
+        self.assertEqual(df.shape, (0, 7))
+
+    def test_add_pose_to_sensor_dataframe(self):
+        """ Test that sensor readings are located between poses. """
+        pose = pandas.DataFrame({
+            'easting': [0.0, 10.0, 20.0, 500000.0, 500000.0],
+            'northing': [0.0, 0.0, 10.0, 0.0, 10000000.0],
+            'zone': [18, 18, 18, 17, 17],
+            'hemi': [True, True, True, True, False],
+            'latitude': [1.0, 2.0, 3.0, 4.0, 5.0],
+            'longitude': [5.0, 6.0, 7.0, 8.0, 9.0],
+        }, index=pandas.DatetimeIndex(
+            ['2016-05-19 13:36:00', '2016-05-19 13:36:02',
+             '2016-05-19 13:36:12', '2016-05-19 13:36:14',
+             '2016-05-19 13:36:16']))
+        time = pandas.DatetimeIndex(
+            ['2016-05-19 13:35:59', '2016-05-19 13:36:00',
+             '2016-05-19 13:36:01', '2016-05-19 13:36:05',
+             '2016-05-19 13:36:12.5', '2016-05-19 13:36:14',
+             '2016-05-19 13:36:14.5', '2016-05-19 13:36:17'])
+
+        # Test that the indices may have different units of time.
+        nan = float('nan')
+        for unit in ('ns', 'ms'):
+            df = pandas.DataFrame({'ec': range(8)}, index=time)
+            pose.index = pose.index.values.astype(
+                'datetime64[{:s}]'.format(unit))
+            df = platypus.util.conversions.add_pose_to_sensor_dataframe(
+                df, pose)
+            self.assertTrue(numpy.allclose(
+                df[['easting', 'northing', 'latitude', 'longitude']].values,
+                [[nan, nan, nan, nan],
+                 [0.0, 0.0, 1.0, 5.0],
+                 [5.0, 0.0, 1.5, 5.5],
+                 [nan, nan, nan, nan],  # The poses are more than 5s apart.
+                 [20.0, 10.0, 3.25, 7.25],  # The poses are in other zones.
+                 [500000.0, 0.0, 4.0, 8.0],
+                 [500000.0, 0.0, 4.25, 8.25],  # Other hemispheres.
+                 [nan, nan, nan, nan]], equal_nan=True))
+
+    def test_add_pose_to_sensor_dataframes(self):
+        """ Test that every sensor dataframe of a log is located. """
+        import os
+        import platypus.io.logs
+
+        filename = os.path.join(os.path.dirname(__file__), '..', 'io',
+                                'airboat_20130807_063622.txt')
+        data = platypus.io.logs.load(filename, cache=False)
+        data = platypus.util.conversions.add_pose_to_sensor_dataframes(
+            data, max_gap=60.0)
+
+        self.assertEqual(data['pose'].shape, (95, 7))
+        self.assertEqual(data['es2'].shape, (22, 6))
+        self.assertTrue(data['es2']['latitude'].notnull().any())
+
+    def test_add_pose_to_sensor_dataframes_without_poses(self):
+        """ Test that sensor dataframes are unchanged without pose data. """
+        data = {'es2': pandas.DataFrame(
+            {'ec': [1.0]},
+            index=pandas.DatetimeIndex(['2016-05-19 13:36:00']))}
+        with self.assertLogs('platypus.util.conversions', 'WARNING'):
+            data = platypus.util.conversions.add_pose_to_sensor_dataframes(
+                data)
+        self.assertEqual(list(data['es2'].columns), ['ec'])
+
+    def test_add_pose_without_poses(self):
+        """ Test that readings are not located without any poses. """
+        df = platypus.util.conversions.add_pose_to_sensor_dataframe(
+            pandas.DataFrame({'ec': [1.0]}, index=pandas.DatetimeIndex(
+                ['2016-05-19 13:36:00'])),
+            make_pose_dataframe()[0:0])
+        self.assertTrue(df['easting'].isnull().all())
 
     def test_region_from_points(self):
-        self.fail("Test not implemented yet!")
+        """ Test the convex hull of a set of positions. """
+        rng = numpy.random.RandomState(0)
+        df = pandas.DataFrame({
+            'longitude': numpy.append(rng.uniform(-79.0, -78.0, 10000),
+                                      [-79.0, -78.0, -78.0, -79.0]),
+            'latitude': numpy.append(rng.uniform(40.0, 41.0, 10000),
+                                     [40.0, 40.0, 41.0, 41.0]),
+        })
+        region = platypus.util.conversions.region_from_points(df)
+
+        self.assertEqual(region['type'], 'Polygon')
+        ring = numpy.array(region['coordinates'][0])
+        self.assertEqual(ring.shape, (5, 2))
+        self.assertTrue(numpy.allclose(
+            ring, [[-79.0, 40.0], [-78.0, 40.0], [-78.0, 41.0],
+                   [-79.0, 41.0], [-79.0, 40.0]],
+            atol=2 * platypus.util.conversions.REGION_RESOLUTION, rtol=0))
+        self.assertTrue(region_contains(region, df))
+
+    def test_region_from_repeated_points(self):
+        """ Test that repeated positions are thinned to a grid. """
+        df = pandas.DataFrame({
+            'longitude': [0.0, 1.0, 0.500002, 0.0, 0.500002, 0.5, 0.500004,
+                          float('nan')],
+            'latitude': [0.0, 0.0, 1.000002, 0.0, 1.000002, 0.5, 1.000004,
+                         0.0],
+        })
+        region = platypus.util.conversions.region_from_points(df)
+        self.assertTrue(len(region['coordinates'][0]) <= 8)
+        self.assertTrue(region_contains(region, df.dropna()))
+
+    def test_region_from_clustered_points(self):
+        """ Test that the region contains points clustered in cells. """
+        rng = numpy.random.RandomState(0)
+        centers = rng.uniform(0.0, 0.001, (100, 2))
+        points = (centers[rng.randint(0, 100, 10000)] +
+                  rng.normal(0.0, 1e-6, (10000, 2)))
+        df = pandas.DataFrame(points, columns=('longitude', 'latitude'))
+
+        region = platypus.util.conversions.region_from_points(df)
+        self.assertTrue(region_contains(region, df))
+        self.assertTrue(
+            scipy.spatial.ConvexHull(region['coordinates'][0]).volume <
+            scipy.spatial.ConvexHull(points).volume * 1.1)
+
+    def test_region_from_degenerate_points(self):
+        """ Test that positions that do not span a region are rejected. """
+        with self.assertRaises(ValueError):
+            platypus.util.conversions.region_from_points(
+                pandas.DataFrame({'longitude': [0.0, 1.0, 2.0],
+                                  'latitude': [0.0, 1.0, 2.0]}))
 
     def test_remove_outliers_from_pose_dataframe(self):
-        self.fail("Test not implemented yet!")
+        """ Test that poses far from the median pose are removed. """
+        df = make_pose_dataframe()
+        df['easting'] = [0.0, 1.0, 2.0, 3.0, 20000.0]
+        df['northing'] = [0.0, 1.0, 2.0, 3.0, 4.0]
+        df = platypus.util.conversions.remove_outliers_from_pose_dataframe(df)
+        self.assertEqual(df.shape, (4, 5))
+
+    def test_median_sketch(self):
+        """ Test the approximate median of a stream of values. """
+        sketch = platypus.util.conversions.MedianSketch(size=100)
+        self.assertTrue(numpy.isnan(sketch.median()))
+
+        # Test that the median is exact for small numbers of values.
+        sketch.update([5.0, 1.0, float('nan'), 3.0])
+        self.assertEqual(sketch.median(), 3.0)
+
+        # Test that the median is approximate for large numbers of values.
+        rng = numpy.random.RandomState(0)
+        values = rng.standard_normal(100000)
+        for chunk in numpy.array_split(values, 37):
+            sketch.update(chunk)
+        self.assertEqual(len(sketch.values), 100)
+        self.assertAlmostEqual(sketch.median(), numpy.median(values),
+                               places=1)
+
+    def test_pose_outlier_filter(self):
+        """ Test that streaming outlier removal matches the global median. """
+        import os
+        import platypus.io.logs
+
+        filename = os.path.join(os.path.dirname(__file__), '..', 'io',
+                                'platypus_20160519_013623.txt')
+        with open(filename) as log_file:
+            pose = platypus.io.logs._parse_v4_2_0(log_file)['pose']
+        expected = platypus.util.conversions \
+            .remove_outliers_from_pose_dataframe(pose)
+
+        outlier_filter = platypus.util.conversions.PoseOutlierFilter()
+        actual = pandas.concat([outlier_filter(pose[i:i + 100])
+                                for i in range(0, len(pose), 100)])
+        self.assertTrue(actual.equals(expected))
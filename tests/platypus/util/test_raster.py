@@ -0,0 +1,66 @@
+import platypus.util.raster
+import numpy
+import pandas
+from unittest import TestCase
+
+
+def make_sensor_dataframe():
+    """ Creates georeferenced readings of a smoothly varying field. """
+    rng = numpy.random.RandomState(0)
+    easting = rng.uniform(0.0, 100.0, 5000)
+    northing = rng.uniform(0.0, 100.0, 5000)
+    return pandas.DataFrame({
+        'easting': numpy.append(easting, [numpy.nan, 50.0]),
+        'northing': numpy.append(northing, [50.0, numpy.nan]),
+        'ec': numpy.append(easting + 2 * northing, [1e9, 1e9]),
+    }, columns=('easting', 'northing', 'ec'))
+
+
+class RasterTest(TestCase):
+    def test_interpolate_raster(self):
+        """ Test that each method approximates the sampled field. """
+        df = make_sensor_dataframe()
+        x, y = numpy.meshgrid(numpy.arange(10, 90) + 0.5,
+                              numpy.arange(10, 90) + 0.5)
+        for method, tolerance in (('idw', 5.0), ('nearest', 8.0),
+                                  ('linear', 1e-6)):
+            raster, bounds = platypus.util.raster.interpolate_raster(
+                df, 'ec', (80, 80), bounds=(10, 10, 90, 90), method=method)
+            self.assertEqual(raster.shape, (80, 80))
+            self.assertEqual(bounds, (10, 10, 90, 90))
+            self.assertTrue(numpy.allclose(raster, x + 2 * y,
+                                           atol=tolerance), method)
+
+    def test_interpolate_raster_bounds(self):
+        """ Test the default bounds and the maximum reading distance. """
+        df = pandas.DataFrame({'easting': [0.0, 100.0],
+                               'northing': [0.0, 100.0],
+                               'ec': [1.0, 3.0]})
+        raster, bounds = platypus.util.raster.interpolate_raster(
+            df, 'ec', (2, 2), max_distance=40.0)
+        self.assertEqual(bounds, (0.0, 0.0, 100.0, 100.0))
+        self.assertTrue(numpy.allclose(
+            raster, [[1.0, numpy.nan], [numpy.nan, 3.0]], equal_nan=True))
+
+        raster, _ = platypus.util.raster.interpolate_raster(
+            df, 'ec', (2, 2), max_distance=30.0)
+        self.assertTrue(numpy.isnan(raster).all())
+
+    def test_interpolate_raster_workers(self):
+        """ Test that tiles evaluated in worker processes are identical. """
+        df = make_sensor_dataframe()
+        expected, _ = platypus.util.raster.interpolate_raster(
+            df, 'ec', (300, 300))
+        actual, _ = platypus.util.raster.interpolate_raster(
+            df, 'ec', (300, 300), workers=2)
+        self.assertTrue(numpy.array_equal(expected, actual))
+
+    def test_interpolate_raster_invalid(self):
+        """ Test that invalid methods and readings are rejected. """
+        df = make_sensor_dataframe()
+        with self.assertRaises(ValueError):
+            platypus.util.raster.interpolate_raster(
+                df, 'ec', (10, 10), method='cubic')
+        with self.assertRaises(ValueError):
+            platypus.util.raster.interpolate_raster(
+                df[5000:], 'ec', (10, 10))
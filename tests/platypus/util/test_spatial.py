@@ -0,0 +1,65 @@
+import platypus.util.spatial
+import numpy
+import os
+import pandas
+import shutil
+import tempfile
+from unittest import TestCase
+
+
+def make_pose_dataframe():
+    """ Creates a random pose dataframe that spans two UTM zones. """
+    rng = numpy.random.RandomState(0)
+    return pandas.DataFrame({
+        'easting': numpy.append(rng.uniform(580000, 600000, 10000), numpy.nan),
+        'northing': numpy.append(rng.uniform(4470000, 4490000, 10000), 0.0),
+        'zone': rng.choice([17, 18], 10001),
+        'hemi': numpy.full(10001, True),
+    }, columns=('easting', 'northing', 'zone', 'hemi'))
+
+
+class SpatialTest(TestCase):
+    def setUp(self):
+        self.df = make_pose_dataframe()
+        self.index = platypus.util.spatial.PoseIndex(self.df, cell_size=50.0)
+
+    def test_query_bbox(self):
+        """ Test that poses within a bounding box are found. """
+        easting = self.df['easting'].values
+        northing = self.df['northing'].values
+        inside = ((easting >= 585000) & (easting <= 586000) &
+                  (northing >= 4471000) & (northing <= 4475000))
+
+        self.assertEqual(len(self.index), 10000)
+        self.assertTrue(numpy.array_equal(
+            self.index.query_bbox(585000, 4471000, 586000, 4475000),
+            numpy.flatnonzero(inside)))
+        self.assertTrue(numpy.array_equal(
+            self.index.query_bbox(585000, 4471000, 586000, 4475000, zone=18),
+            numpy.flatnonzero(inside & (self.df['zone'].values == 18))))
+        self.assertEqual(len(self.index.query_bbox(
+            585000, 4471000, 586000, 4475000, hemi=False)), 0)
+        self.assertEqual(len(self.index.query_bbox(0, 0, 100, 100)), 0)
+
+    def test_query_radius(self):
+        """ Test that poses within a radius of a position are found. """
+        inside = numpy.hypot(self.df['easting'].values - 590000,
+                             self.df['northing'].values - 4480000) <= 500
+        self.assertTrue(numpy.array_equal(
+            self.index.query_radius(590000, 4480000, 500),
+            numpy.flatnonzero(inside)))
+
+    def test_save(self):
+        """ Test that a saved index answers the same queries. """
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'index.npz')
+            self.index.save(filename)
+            index = platypus.util.spatial.PoseIndex.load(filename)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(index.cell_size, 50.0)
+        self.assertTrue(numpy.array_equal(
+            index.query_radius(590000, 4480000, 500, zone=17),
+            self.index.query_radius(590000, 4480000, 500, zone=17)))
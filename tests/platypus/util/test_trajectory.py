@@ -0,0 +1,102 @@
+import platypus.util.conversions
+import platypus.util.trajectory
+import numpy
+import pandas
+from unittest import TestCase
+
+
+def make_pose_dataframe():
+    """ Creates a pose dataframe with a trajectory that crosses UTM zones. """
+    return platypus.util.conversions.add_ll_to_pose_dataframe(
+        pandas.DataFrame({
+            'easting': [500000.0, 500030.0, 500030.0, 500030.0, 833978.6],
+            'northing': [4400000.0, 4400040.0, 4400040.0, 4400000.0,
+                         4400000.0],
+            'altitude': [0.0, 0.0, 0.0, 0.0, 0.0],
+            'zone': [18, 18, 18, 18, 17],
+            'hemi': [True, True, True, True, True],
+        }, columns=('easting', 'northing', 'altitude', 'zone', 'hemi'),
+            index=pandas.DatetimeIndex(
+                ['2016-05-19 13:36:20', '2016-05-19 13:36:30',
+                 '2016-05-19 13:36:40', '2016-05-19 13:36:40',
+                 '2016-05-19 13:36:50'], name='time')))
+
+
+class TrajectoryTest(TestCase):
+    def test_add_trajectory_to_pose_dataframe(self):
+        """ Test the segment metrics of a trajectory. """
+        df = platypus.util.trajectory.add_trajectory_to_pose_dataframe(
+            make_pose_dataframe())
+
+        self.assertTrue(numpy.allclose(
+            df['distance'].values[:4], [numpy.nan, 50.0, 0.0, 40.0],
+            equal_nan=True))
+        self.assertTrue(numpy.allclose(
+            df['speed'].values[:4], [numpy.nan, 5.0, 0.0, numpy.nan],
+            equal_nan=True))
+        self.assertTrue(numpy.allclose(
+            df['heading'].values[:4],
+            [numpy.nan, numpy.degrees(numpy.arctan2(3, 4)), numpy.nan, 180.0],
+            equal_nan=True))
+        self.assertTrue(numpy.allclose(
+            df['cumulative_distance'].values[:4], [0.0, 50.0, 50.0, 90.0]))
+
+        # Test that speeds do not depend on the unit of the time index.
+        ms_df = make_pose_dataframe()
+        ms_df.index = ms_df.index.values.astype('datetime64[ms]')
+        ms_df = platypus.util.trajectory.add_trajectory_to_pose_dataframe(
+            ms_df)
+        self.assertTrue(numpy.allclose(ms_df['speed'].values,
+                                       df['speed'].values, equal_nan=True))
+
+        # Test that the segment between UTM zones is measured on a sphere.
+        self.assertTrue(df['distance'].values[-1] > 0)
+        self.assertTrue(numpy.isclose(
+            df['cumulative_distance'].values[-1], df['distance'].sum()))
+
+    def test_path_length(self):
+        """ Test the total length of a trajectory. """
+        df = make_pose_dataframe()
+        self.assertAlmostEqual(
+            platypus.util.trajectory.path_length(df),
+            platypus.util.trajectory.add_trajectory_to_pose_dataframe(df)
+            ['distance'].sum())
+        self.assertEqual(platypus.util.trajectory.path_length(df[:1]), 0.0)
+
+    def test_simplify_path(self):
+        """ Test that poses within the tolerance of the path are removed. """
+        # Create a path along the equator with a single 100m detour.
+        df = pandas.DataFrame({
+            'latitude': [0.0, 0.0, 0.0, 0.0009, 0.0, 0.0, float('nan')],
+            'longitude': [0.0, 0.001, 0.002, 0.003, 0.004, 0.005, 0.006],
+        })
+        self.assertEqual(
+            list(platypus.util.trajectory.simplify_path(df).index),
+            [0, 2, 3, 4, 5])
+        self.assertEqual(
+            list(platypus.util.trajectory.simplify_path(df, 200.0).index),
+            [0, 5])
+        self.assertEqual(
+            list(platypus.util.trajectory.simplify_path(
+                df, max_vertices=3).index),
+            [0, 3, 5])
+        self.assertEqual(len(platypus.util.trajectory.simplify_path(df[:0])),
+                         0)
+
+    def test_simplify_path_levels(self):
+        """ Test that each level of detail matches a simplified path. """
+        rng = numpy.random.RandomState(0)
+        df = pandas.DataFrame({
+            'latitude': 40.0 + numpy.cumsum(rng.normal(0, 1e-5, 10000)),
+            'longitude': -80.0 + numpy.cumsum(rng.normal(0, 1e-5, 10000)),
+        })
+        tolerances = [1.0, 5.0, 20.0]
+        levels = platypus.util.trajectory.simplify_path_levels(
+            df, tolerances, max_vertices=1000)
+
+        for tolerance, level in zip(tolerances, levels):
+            self.assertTrue(level.equals(
+                platypus.util.trajectory.simplify_path(
+                    df, tolerance, max_vertices=1000)))
+        self.assertEqual(len(levels[0]), 1000)
+        self.assertTrue(len(levels[1]) > len(levels[2]) > 2)